@@ -0,0 +1,520 @@
+"""
+Starts a Pyro name server, RMs and FEs on localhost, drives them with concurrent clients, and reports throughput,
+latency per operation, and gossip traffic. Movies and users are chosen with Zipfian popularity, ranked by their number
+of ratings in database/ratings.csv. Run with python -m benchmarks.bench_cluster [options], from the base repository, on
+Linux. Results are saved as JSON, and may be compared with an earlier run with --baseline.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, List, Any, Optional, Hashable
+
+import Pyro4
+from Pyro4.errors import NamingError
+
+from enums import Operation
+from requests import ClientRequest
+
+NS_PORT = 9190  # Not Pyro's default, so a name server already running isn't used
+REPLICAS = 3
+FRONTENDS = 1
+CLIENTS = 8  # Each sends its next request as soon as the last is answered
+DURATION = 30.0  # Seconds measured
+WARMUP = 3.0  # Seconds run before measuring, while the RMs load their databases
+MIX = "READ=45,AVERAGE=35,ALL=10,CREATE=3,UPDATE=5,DELETE=2"  # Relative weight of each operation
+ZIPF_EXPONENT = 1.0  # The probability of the item of rank k is proportional to 1 / k ** ZIPF_EXPONENT
+RATINGS_PATH = "./database/ratings.csv"
+OUTPUT_PATH = "./bench_cluster.json"
+STARTUP_TIMEOUT = 60.0  # Seconds to wait for every RM and FE to register
+
+PERCENTILES = [50, 95, 99]
+
+# Metrics that are current values rather than running totals, so are reported as they are at the end of the run
+GAUGES = ["update_log", "executed_operation_table", "query_cache_hit_ratio", "query_cache_entries", "query_cache_bytes",
+          "gossip_compression_ratio", "connections_per_request", "query_latency_p50", "query_latency_p99"]
+
+
+class Zipf:
+    """
+    Chooses items with Zipfian popularity: the most popular item is chosen most often, the second half as often, and
+    so on.
+    """
+
+    def __init__(self, counts: Counter, exponent: float = ZIPF_EXPONENT):
+        """
+        :param counts: The number of times each item occurs, by which the items are ranked
+        :param exponent: The exponent of the distribution. 0 chooses every item equally often.
+        """
+
+        self.items: List[Hashable] = [item for (item, _) in counts.most_common()]
+        self.cum_weights: List[float] = list(accumulate(1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def sample(self, rng: random.Random) -> Hashable:
+
+        return rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+
+class Workload:
+    """
+    Builds the requests the clients send.
+    """
+
+    def __init__(self, mix: Dict[Operation, float], users: Zipf, movies: Zipf):
+
+        self.operations = list(mix.keys())
+        self.cum_weights = list(accumulate(mix.values()))
+        self.users = users
+        self.movies = movies
+
+    @staticmethod
+    def load(mix: Dict[Operation, float], path: str = RATINGS_PATH, exponent: float = ZIPF_EXPONENT) -> 'Workload':
+        """
+        :param mix: The relative weight of each operation
+        :param path: The path of the MovieLens ratings, by which users and movies are ranked
+        :param exponent: The exponent of the Zipfian distributions
+        :return: A Workload
+        """
+
+        users: Counter = Counter()
+        movies: Counter = Counter()
+
+        with open(path, newline="") as file:
+
+            for row in csv.DictReader(file):
+
+                users[row["userId"]] += 1
+                movies[row["movieId"]] += 1
+
+        return Workload(mix, Zipf(users, exponent), Zipf(movies, exponent))
+
+    def request(self, rng: random.Random) -> ClientRequest:
+        """
+        :param rng: The calling client's random number generator
+        :return: The next request, with the same params as the client would send
+        """
+
+        operation = rng.choices(self.operations, cum_weights=self.cum_weights)[0]
+
+        if operation is Operation.AVERAGE:
+            return ClientRequest(operation, {"movie_id": self.movies.sample(rng)})
+
+        params = {"user_id": self.users.sample(rng)}
+
+        if operation is not Operation.ALL:
+            params["movie_id"] = self.movies.sample(rng)
+
+        if operation in [Operation.CREATE, Operation.UPDATE]:
+            params["rating"] = rng.randint(1, 5)
+
+        return ClientRequest(operation, params)
+
+
+class Cluster:
+    """
+    A Pyro name server, RMs and FEs, each in a process of its own, whose output is kept in a log file per process.
+    """
+
+    def __init__(self, replicas: int, frontends: int, port: int = NS_PORT, logs: str = None):
+
+        self.replicas = replicas
+        self.frontends = frontends
+        self.port = port
+        self.logs = logs if logs is not None else tempfile.mkdtemp(prefix="bench_cluster-")
+
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.env = dict(os.environ, PYRO_NS_HOST="localhost", PYRO_NS_PORT=str(port))
+
+        Pyro4.config.NS_HOST = "localhost"
+        Pyro4.config.NS_PORT = port
+
+    def __enter__(self):
+
+        self.start()
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.stop()
+
+    def spawn(self, name: str, args: List[str], env: Dict[str, str] = None) -> None:
+
+        with open(os.path.join(self.logs, name + ".log"), "w") as log:
+            self.processes[name] = subprocess.Popen([sys.executable] + args, stdout=log, stderr=subprocess.STDOUT,
+                                                    env=dict(self.env, **(env or {})))
+
+    def start(self) -> None:
+        """
+        Start the name server, then the RMs, then the FEs, waiting for each to register.
+        :return: None
+        """
+
+        os.makedirs(self.logs, exist_ok=True)
+
+        self.spawn("ns", ["-m", "Pyro4.naming", "-n", "localhost", "-p", str(self.port), "-x"])  # No broadcast server
+        self.wait(lambda ns: True)
+
+        for n in range(self.replicas):
+            self.spawn("replica-{0}".format(n), ["-m", "replica"])
+
+        self.wait(lambda ns: len(ns.list(metadata_all={"resource:replica"})) >= self.replicas)
+
+        for n in range(self.frontends):
+            self.spawn("frontend-{0}".format(n), ["-m", "frontend"])
+
+        self.wait(lambda ns: len(ns.list(metadata_all={"resource:frontend"})) >= self.frontends)
+
+    def wait(self, ready) -> None:
+        """
+        Wait for `ready` to return True, given a name server proxy.
+        :param ready: A function of a name server proxy
+        :return: None
+        """
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+
+        while time.monotonic() < deadline:
+
+            for (name, process) in self.processes.items():
+
+                if process.poll() is not None:
+                    raise RuntimeError("{0} exited; see {1}".format(name, os.path.join(self.logs, name + ".log")))
+
+            try:
+
+                with Pyro4.locateNS() as ns:
+
+                    if ready(ns):
+                        return
+
+            except NamingError:
+
+                pass
+
+            time.sleep(0.2)
+
+        raise TimeoutError("Cluster didn't start within {0}s; see {1}".format(STARTUP_TIMEOUT, self.logs))
+
+    def stop(self) -> None:
+
+        for process in reversed(list(self.processes.values())):
+            process.terminate()
+
+        for process in self.processes.values():
+
+            try:
+
+                process.wait(timeout=5)
+
+            except subprocess.TimeoutExpired:
+
+                process.kill()
+
+    def uris(self, resource: str) -> Dict[str, str]:
+        """
+        :param resource: "replica" or "frontend"
+        :return: The URI of every registered RM or FE, by ID
+        """
+
+        with Pyro4.locateNS() as ns:
+            return ns.list(metadata_all={"resource:" + resource})
+
+    def metrics(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        :return: The metrics of every RM and FE, by ID
+        """
+
+        metrics = {}
+
+        for resource in ["replica", "frontend"]:
+
+            metrics[resource] = {}
+
+            for (id, uri) in self.uris(resource).items():
+
+                with Pyro4.Proxy(uri) as proxy:
+                    metrics[resource][id] = proxy.get_metrics()
+
+        return metrics
+
+
+class Client(threading.Thread):
+    """
+    Sends requests to a FE one at a time, recording the latency of each request sent after the warmup.
+    """
+
+    def __init__(self, uri: str, workload: Workload, seed: int, measure_from: float, end: float):
+
+        super().__init__(daemon=True)
+
+        self.uri = uri
+        self.workload = workload
+        self.rng = random.Random(seed)
+        self.measure_from = measure_from  # perf_counter times
+        self.end = end
+
+        self.latencies: Dict[Operation, List[float]] = {operation: [] for operation in Operation}
+        self.errors: Counter = Counter()  # The number of failed requests, by operation
+        self.reasons: Counter = Counter()  # The number of failed requests, by exception
+
+    def run(self) -> None:
+
+        with Pyro4.Proxy(self.uri) as frontend:
+
+            while True:
+
+                request = self.workload.request(self.rng)
+                start = time.perf_counter()
+
+                if start >= self.end:
+                    return
+
+                try:
+
+                    frontend.request(request)
+
+                except Exception as e:
+
+                    if start >= self.measure_from:
+
+                        self.errors[request.method] += 1
+                        self.reasons["{0}: {1}".format(type(e).__name__, e)] += 1
+
+                    continue
+
+                if start >= self.measure_from:
+                    self.latencies[request.method].append(time.perf_counter() - start)
+
+
+def percentile(latencies: List[float], p: float) -> Optional[float]:
+    """
+    :param latencies: Sorted latencies
+    :param p: The percentile, from 0 to 100
+    :return: The latency at that percentile, or None if there are none
+    """
+
+    if len(latencies) == 0:
+        return None
+
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+def difference(after: Dict[str, Any], before: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    :return: The change in each running total between two sets of metrics, along with the GAUGES in `after`
+    """
+
+    return {key: value if key in GAUGES else value - before.get(key, 0) for (key, value) in after.items()}
+
+
+def summarise(clients: List[Client], elapsed: float, before: Dict, after: Dict) -> Dict[str, Any]:
+    """
+    :return: Throughput and latency per operation, in requests per second and milliseconds, and gossip traffic
+    """
+
+    operations = {}
+    total = 0
+
+    for operation in Operation:
+
+        latencies = sorted(latency for client in clients for latency in client.latencies[operation])
+        errors = sum(client.errors[operation] for client in clients)
+
+        total += len(latencies)
+
+        summary = {
+            "count": len(latencies),
+            "errors": errors,
+            "throughput": len(latencies) / elapsed,
+            "mean": sum(latencies) / len(latencies) * 1000 if len(latencies) > 0 else None
+        }
+
+        for p in PERCENTILES:
+
+            latency = percentile(latencies, p)
+            summary["p{0}".format(p)] = latency * 1000 if latency is not None else None
+
+        operations[operation.name] = summary
+
+    replicas = {id: difference(metrics, before["replica"].get(id, {})) for (id, metrics) in after["replica"].items()}
+    frontends = {id: difference(metrics, before["frontend"].get(id, {})) for (id, metrics) in after["frontend"].items()}
+
+    gossip = {key: sum(metrics.get(key, 0) for metrics in replicas.values())
+              for key in ["gossip_rounds", "gossip_packed_bytes_sent", "gossip_bytes_sent", "gossip_compression_cpu",
+                          "blocked_queries", "blocked_updates"]}
+
+    gossip["gossip_bytes_per_second"] = gossip["gossip_bytes_sent"] / elapsed
+
+    reasons = sum((client.reasons for client in clients), Counter())
+
+    return {
+        "elapsed": elapsed,
+        "requests": total,
+        "throughput": total / elapsed,
+        "operations": operations,
+        "errors": dict(reasons.most_common()),
+        "gossip": gossip,
+        "replicas": replicas,
+        "frontends": frontends
+    }
+
+
+def report(result: Dict[str, Any]) -> None:
+
+    print("\n{0} requests in {1:.1f}s: {2:.1f} requests/s\n".format(result["requests"], result["elapsed"],
+                                                                  result["throughput"]))
+    print("{0:<10}{1:>8}{2:>8}{3:>12}{4:>10}{5:>10}{6:>10}".format("operation", "count", "errors", "req/s", "p50 (ms)",
+                                                                  "p95 (ms)", "p99 (ms)"))
+
+    for (name, summary) in result["operations"].items():
+
+        if summary["count"] == 0 and summary["errors"] == 0:
+            continue
+
+        print("{0:<10}{1:>8}{2:>8}{3:>12.1f}{4:>10}{5:>10}{6:>10}".format(
+            name, summary["count"], summary["errors"], summary["throughput"],
+            *["{0:.2f}".format(summary[p]) if summary[p] is not None else "-" for p in ["p50", "p95", "p99"]]))
+
+    for (reason, count) in result["errors"].items():
+        print("{0} failed: {1}".format(count, reason))
+
+    print("\nGossip: {gossip_rounds} background rounds, {gossip_bytes_sent} bytes sent ({gossip_packed_bytes_sent} "
+          "before compression), {blocked_queries} queries and {blocked_updates} updates waited for gossip"
+          .format(**result["gossip"]))
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Print the change in throughput and latency percentiles since an earlier run.
+    """
+
+    def change(now: Optional[float], then: Optional[float]) -> str:
+        return "{0:+.1f}%".format((now - then) / then * 100) if now is not None and then else "-"
+
+    print("\nChange since baseline ({0}):".format(baseline["config"].get("commit")))
+    print("{0:<10}{1:>12}".format("throughput", change(result["throughput"], baseline["throughput"])))
+
+    for (name, summary) in result["operations"].items():
+
+        then = baseline["operations"].get(name)
+
+        if then is None or summary["count"] == 0:
+            continue
+
+        print("{0:<10}{1}".format(name, "".join("{0:>6}{1:>9}".format(p, change(summary[p], then[p]))
+                                                for p in ["p50", "p95", "p99"])))
+
+
+def parse_mix(text: str) -> Dict[Operation, float]:
+    """
+    :param text: Comma separated weights, e.g. "READ=9,UPDATE=1"
+    :return: The weight of each operation
+    """
+
+    mix = {}
+
+    for item in text.split(","):
+
+        name, _, weight = item.partition("=")
+        mix[Operation[name.strip().upper()]] = float(weight)
+
+    return mix
+
+
+def commit() -> Optional[str]:
+    """
+    :return: The commit being benchmarked, if known
+    """
+
+    try:
+
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+
+        return None
+
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_cluster", description=__doc__)
+    parser.add_argument("--replicas", type=int, default=REPLICAS)
+    parser.add_argument("--frontends", type=int, default=FRONTENDS)
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--warmup", type=float, default=WARMUP)
+    parser.add_argument("--mix", default=MIX, help="relative weight of each operation, default " + MIX)
+    parser.add_argument("--zipf", type=float, default=ZIPF_EXPONENT, help="exponent of user and movie popularity")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=NS_PORT, help="port of the name server started")
+    parser.add_argument("--logs", help="directory for the output of each process, by default a temporary one")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="JSON file the results are saved to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+
+    args = parser.parse_args(argv)
+
+    config = {key: value for (key, value) in vars(args).items() if key not in ["logs", "output", "baseline"]}
+    config["commit"] = commit()
+
+    workload = Workload.load(parse_mix(args.mix), exponent=args.zipf)
+
+    with Cluster(args.replicas, args.frontends, args.port, args.logs) as cluster:
+
+        print("Started {0} RMs and {1} FEs, logging to {2}".format(args.replicas, args.frontends, cluster.logs))
+
+        frontends = list(cluster.uris("frontend").values())
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        end = measure_from + args.duration
+
+        clients = [Client(frontends[n % len(frontends)], workload, args.seed + n, measure_from, end)
+                   for n in range(args.clients)]
+
+        for client in clients:
+            client.start()
+
+        time.sleep(max(0.0, measure_from - time.perf_counter()))
+
+        before = cluster.metrics()
+
+        for client in clients:
+            client.join()
+
+        elapsed = time.perf_counter() - measure_from
+        after = cluster.metrics()
+
+    result = summarise(clients, elapsed, before, after)
+    result["config"] = config
+
+    report(result)
+
+    if args.baseline is not None:
+
+        with open(args.baseline) as file:
+            compare(result, json.load(file))
+
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    print("\nSaved results to {0}".format(args.output))
+
+    if args.logs is None:
+        shutil.rmtree(cluster.logs, ignore_errors=True)
+
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures the latency of each DB operation on the full MovieLens data. Run with python -m benchmarks.bench_db [n], from
+the base repository.
+"""
+
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Dict, List, Callable
+
+from db import DB
+
+OPERATIONS = 1000  # The number of times each operation is timed
+
+
+def measure(operation: Callable[[int], None], n: int) -> Dict[str, float]:
+    """
+    :param operation: Called with 0..n-1
+    :param n: The number of calls to time
+    :return: The mean, median and 99th percentile latency of a call, in microseconds
+    """
+
+    latencies: List[float] = []
+
+    for i in range(n):
+
+        start = time.perf_counter()
+
+        operation(i)
+
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    latencies.sort()
+
+    return {
+        "mean": sum(latencies) / n,
+        "p50": latencies[n // 2],
+        "p99": latencies[min(n - 1, int(n * 0.99))]
+    }
+
+
+def main(n: int = OPERATIONS) -> None:
+
+    random.seed(0)
+
+    start = time.perf_counter()
+
+    db = DB()
+    ratings = db.connection.execute("SELECT userId, movieId FROM ratings").fetchall()
+
+    print("Loaded {0} ratings in {1:.3f}s\n".format(len(ratings), time.perf_counter() - start))
+
+    sample = random.sample(ratings, n)  # Existing (userId, movieId) pairs
+    new = [(str(1000 + i), movie_id) for (i, (_, movie_id)) in enumerate(sample)]  # Pairs with no rating yet
+
+    operations = {
+        "read": lambda i: db.read(*sample[i]),
+        "average": lambda i: db.average(sample[i][1]),
+        "all": lambda i: db.all(sample[i][0]),
+        "create": lambda i: db.create(new[i][0], new[i][1], "4"),
+        "update": lambda i: db.update(sample[i][1], sample[i][0], "3"),
+        "delete": lambda i: db.delete(new[i][1], new[i][0]),
+    }
+
+    print("{0:<10}{1:>12}{2:>12}{3:>12}".format("operation", "mean (us)", "p50 (us)", "p99 (us)"))
+
+    for (name, operation) in operations.items():
+
+        with redirect_stdout(StringIO()):
+            result = measure(operation, n)
+
+        print("{0:<10}{1:>12.1f}{2:>12.1f}{3:>12.1f}".format(name, result["mean"], result["p50"], result["p99"]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) >= 2 else OPERATIONS)
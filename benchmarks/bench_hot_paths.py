@@ -0,0 +1,331 @@
+"""
+Microbenchmarks of the Timestamp and Log methods run on every request and every round of gossip, swept over the number
+of RMs and the size of the Log. Run with python -m benchmarks.bench_hot_paths [options], from the base repository.
+
+Results may be saved with --output, and a later run checked against them with --baseline: it exits with status 1 if any
+benchmark is more than --threshold percent slower, so a change to a hot path can be checked before it is merged. Compare
+runs on the same idle machine, with the same PYTHONHASHSEED, as string hashing changes the cost of the dicts these
+methods use. Timings of the same code vary between runs, more so on shared machines; run the baseline twice, and set
+--threshold above the difference between them.
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List, Callable, Any, Tuple
+
+from enums import Operation
+from replica_classes import Record, Log
+from requests import ClientRequest
+from timestamp import Timestamp
+
+REPLICA_COUNTS = [3, 10, 50]
+LOG_SIZES = [100, 1000, 10000]
+REPEATS = 10  # Each benchmark is timed this many times, and the median is reported
+MIN_TIME = 0.02  # Seconds each timing runs for, at least
+THRESHOLD = 25.0  # Percent slower than the baseline at which a benchmark fails
+RETRIES = 3  # Times a benchmark over the threshold is measured again before it fails, as timings are noisy
+
+# A benchmark's setup builds its inputs, then returns the call to time. Benchmarks whose call changes their inputs are
+# set up again before every call, outside the time measured.
+Benchmark = Tuple[Callable[[], Callable[[], Any]], bool]
+
+
+def replica_ids(replicas: int) -> List[str]:
+
+    return ["replica-{0}".format(n) for n in range(replicas)]
+
+
+def records(replicas: int, size: int) -> List[Record]:
+    """
+    :return: `size` Records accepted in turn by `replicas` RMs, with Timestamps as those RMs would give them
+    """
+
+    ids = replica_ids(replicas)
+    replica_ts = Timestamp({id: 0 for id in ids})
+    result = []
+
+    for n in range(size):
+
+        i = ids[n % replicas]
+        prev = replica_ts.copy()
+
+        replica_ts[i] += 1
+
+        ts = prev.copy()
+        ts[i] = replica_ts[i]
+
+        request = ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": str(n), "rating": 4})
+        result.append(Record(i, ts, request, prev, "frontend-1:{0}".format(n + 1)))
+
+    return result
+
+
+def timestamps(replicas: int) -> Tuple[Timestamp, Timestamp]:
+    """
+    :return: Two Timestamps with an entry for each RM, the first <= the second and less in every other entry
+    """
+
+    ids = replica_ids(replicas)
+    smaller = Timestamp({id: 100 + n for (n, id) in enumerate(ids)})
+    larger = Timestamp({id: 100 + n + n % 2 for (n, id) in enumerate(ids)})
+
+    return smaller, larger
+
+
+def timestamp_benchmarks(replicas: int) -> Dict[str, Benchmark]:
+
+    def le():
+        smaller, larger = timestamps(replicas)
+        return lambda: smaller <= larger  # Every entry is compared
+
+    def merge():
+        smaller, larger = timestamps(replicas)
+        return lambda: smaller.copy().merge(larger)
+
+    def compare():
+        smaller, larger = timestamps(replicas)
+        return lambda: list(smaller.compare(larger))
+
+    def copy():
+        smaller, _ = timestamps(replicas)
+        return smaller.copy
+
+    suffix = " (replicas={0})".format(replicas)
+
+    return {
+        "Timestamp.__le__" + suffix: (le, False),
+        "Timestamp.merge" + suffix: (merge, False),  # Includes a copy, so that each merge changes the Timestamp
+        "Timestamp.compare" + suffix: (compare, False),
+        "Timestamp.copy" + suffix: (copy, False)
+    }
+
+
+def log_benchmarks(replicas: int, size: int) -> Dict[str, Benchmark]:
+
+    received = records(replicas, size)
+    replica_ts = Timestamp({id: size for id in replica_ids(replicas)})  # Every Record is stable
+
+    def merge():
+        log, incoming = Log(received[:size // 2]), Log(received)  # Half the incoming Records are new
+        return lambda: log.merge(incoming, Timestamp())
+
+    def stable():
+        log = Log(received)
+        return lambda: log.stable(replica_ts)
+
+    def contains():
+        log = Log(received)
+        hits = [record.id for record in received[::max(1, size // 100)]]
+        misses = ["frontend-2:{0}".format(n) for n in range(len(hits))]
+        return lambda: [id in log for id in hits + misses]
+
+    suffix = " (replicas={0}, records={1})".format(replicas, size)
+
+    return {
+        "Log.merge" + suffix: (merge, True),
+        "Log.stable" + suffix: (stable, True),
+        "Log.__contains__" + suffix: (contains, False)  # 100 hits and 100 misses
+    }
+
+
+def measure(benchmark: Benchmark, repeats: int = REPEATS) -> float:
+    """
+    :param benchmark: The setup of the benchmark, and whether it must be set up again before every call
+    :param repeats: The number of timings
+    :return: The median time per call, in seconds, of `repeats` timings of at least MIN_TIME each
+    """
+
+    setup, fresh = benchmark
+    call = setup()
+    calls = 0
+    timed = 0.0
+
+    while timed < MIN_TIME / 10:  # Find the number of calls that take MIN_TIME
+
+        if fresh:
+            call = setup()
+
+        start = time.perf_counter()
+
+        call()
+
+        timed += time.perf_counter() - start
+        calls += 1
+
+    number = max(1, int(calls * MIN_TIME / timed))
+    enabled = gc.isenabled()
+
+    gc.disable()  # As timeit does, so that a collection triggered by one benchmark isn't timed in another
+
+    try:
+
+        times = [timing(setup, call, fresh, number) for _ in range(repeats)]
+
+    finally:
+
+        if enabled:
+            gc.enable()
+
+    return statistics.median(times)
+
+
+def timing(setup: Callable[[], Callable[[], Any]], call: Callable[[], Any], fresh: bool, number: int) -> float:
+    """
+    :return: The mean time of `number` calls, in seconds
+    """
+
+    if not fresh:
+
+        start = time.perf_counter()
+
+        for _ in range(number):
+            call()
+
+        return (time.perf_counter() - start) / number
+
+    elapsed = 0.0
+
+    for _ in range(number):
+
+        call = setup()
+        start = time.perf_counter()
+
+        call()
+
+        elapsed += time.perf_counter() - start
+
+    return elapsed / number
+
+
+def change(seconds: float, then: float) -> float:
+    """
+    :return: The percentage by which `seconds` is slower than `then`
+    """
+
+    return (seconds - then) / then * 100
+
+
+def regressions(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """
+    :param results: The time per call of each benchmark, in seconds
+    :param baseline: The same, from an earlier run
+    :param threshold: The percentage slower at which a benchmark fails
+    :return: The names of the benchmarks more than `threshold` percent slower than the baseline
+    """
+
+    return [name for (name, seconds) in results.items() if name in baseline and
+            change(seconds, baseline[name]) > threshold]
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> None:
+    """
+    Print the change in each benchmark since the baseline.
+    """
+
+    failed = regressions(results, baseline, threshold)
+
+    print("\n{0:<50}{1:>14}{2:>14}{3:>10}".format("benchmark", "baseline (us)", "now (us)", "change"))
+
+    for (name, seconds) in results.items():
+
+        if name not in baseline:
+            continue
+
+        print("{0:<50}{1:>14.2f}{2:>14.2f}{3:>+9.1f}%{4}".format(name, baseline[name] * 1e6, seconds * 1e6,
+                                                               change(seconds, baseline[name]),
+                                                               "  REGRESSION" if name in failed else ""))
+
+
+def main(argv: List[str] = None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_hot_paths", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", default=",".join(map(str, REPLICA_COUNTS)), help="comma separated RM counts")
+    parser.add_argument("--sizes", default=",".join(map(str, LOG_SIZES)), help="comma separated Log sizes")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose names contain this")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--output", help="JSON file the results are saved to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to check against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="percent slower than the baseline at which a benchmark fails, default %(default)s")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+                        help="times a benchmark slower than the threshold is measured again, default %(default)s")
+
+    args = parser.parse_args(argv)
+
+    replica_counts = [int(n) for n in args.replicas.split(",")]
+    sizes = [int(n) for n in args.sizes.split(",")]
+
+    benchmarks: Dict[str, Benchmark] = {}
+
+    for replicas in replica_counts:
+        benchmarks.update(timestamp_benchmarks(replicas))
+
+    for replicas in replica_counts:
+
+        for size in sizes:
+            benchmarks.update(log_benchmarks(replicas, size))
+
+    results: Dict[str, float] = {}
+
+    print("{0:<50}{1:>14}".format("benchmark", "time (us)"))
+
+    for (name, benchmark) in benchmarks.items():
+
+        if args.filter not in name:
+            continue
+
+        results[name] = measure(benchmark, args.repeats)
+
+        print("{0:<50}{1:>14.2f}".format(name, results[name] * 1e6))
+
+    baseline: Dict[str, float] = {}
+
+    if args.baseline is not None:
+
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    for _ in range(args.retries):
+
+        failed = regressions(results, baseline, args.threshold)
+
+        if len(failed) == 0:
+            break
+
+        print("\nMeasuring {0} benchmark(s) slower than the baseline again".format(len(failed)))
+
+        for name in failed:  # Noise mostly adds time, so the fastest measurement is kept
+            results[name] = min(results[name], measure(benchmarks[name], args.repeats))
+
+    if args.output is not None:
+
+        with open(args.output, "w") as file:
+            json.dump({"unit": "seconds per call", "results": results}, file, indent=2)
+
+        print("\nSaved results to {0}".format(args.output))
+
+    if args.baseline is None:
+        return 0
+
+    compare(results, baseline, args.threshold)
+
+    failed = regressions(results, baseline, args.threshold)
+
+    if len(failed) > 0:
+
+        print("\n{0} benchmark(s) more than {1}% slower than the baseline".format(len(failed), args.threshold))
+
+        return 1
+
+    print("\nNo benchmark more than {0}% slower than the baseline".format(args.threshold))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Compares the packed wire format with the readable serpent form it replaced, on the transfer of a Log, as when a RM
+catches up through gossip. Run with python -m benchmarks.bench_wire [n], from the base repository.
+"""
+
+import random
+import sys
+import time
+import uuid
+from typing import Dict, Callable, Any
+
+import serpent
+from Pyro4.util import get_serializer
+
+from enums import Operation
+from replica_classes import Record, Log
+from requests import ClientRequest
+from timestamp import Timestamp
+
+RECORDS = 100000  # The number of Records in the Log transferred
+REPLICAS = 3
+FRONTENDS = 4
+REPEATS = 3  # Each transfer is timed this many times, and the fastest is reported
+
+serializer = get_serializer("serpent")
+
+
+def make_log(n: int) -> Log:
+    """
+    :param n: The number of Records
+    :return: A Log of updates accepted by REPLICAS RMs from FRONTENDS FEs, as a RM builds it
+    """
+
+    random.seed(0)
+
+    replicas = ["replica-" + str(uuid.uuid4()) for _ in range(REPLICAS)]
+    frontends = ["frontend-" + str(uuid.uuid4()) for _ in range(FRONTENDS)]
+    sequences = [0] * FRONTENDS
+    replica_ts = Timestamp({replica: 0 for replica in replicas})
+    records = []
+
+    for _ in range(n):
+
+        replica = random.choice(replicas)
+        frontend = random.randrange(FRONTENDS)
+        prev = replica_ts.copy()
+
+        replica_ts[replica] += 1
+        sequences[frontend] += 1
+
+        ts = prev.copy()
+        ts[replica] = replica_ts[replica]
+
+        params = {"user_id": str(random.randint(1, 610)), "movie_id": str(random.randint(1, 9742)),
+                  "rating": str(random.randint(1, 10) / 2)}
+        request = ClientRequest(random.choice([Operation.CREATE, Operation.UPDATE]), params)
+
+        records.append(Record(replica, ts, request, prev, "{0}:{1}".format(frontends[frontend], sequences[frontend])))
+
+    return Log(records)
+
+
+def fastest(operation: Callable[[], Any]) -> float:
+    """
+    :param operation: The operation to time
+    :return: The fastest of REPEATS runs, in seconds
+    """
+
+    times = []
+
+    for _ in range(REPEATS):
+
+        start = time.perf_counter()
+
+        operation()
+
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main(n: int = RECORDS) -> None:
+
+    log = make_log(n)
+
+    readable = serpent.dumps(log.to_dict(), module_in_classname=True)  # As Logs were sent before they were packed
+    packed = serializer.dumps(log)
+
+    results: Dict[str, Dict[str, float]] = {
+        "serpent": {
+            "bytes": len(readable),
+            "encode": fastest(lambda: serpent.dumps(log.to_dict(), module_in_classname=True)),
+            "decode": fastest(lambda: serializer.loads(readable))
+        },
+        "packed": {
+            "bytes": len(packed),
+            "encode": fastest(lambda: serializer.dumps(log)),
+            "decode": fastest(lambda: serializer.loads(packed))
+        }
+    }
+
+    assert [record.id for record in serializer.loads(packed)] == [record.id for record in log]
+
+    print("Transfer of a Log of {0} Records\n".format(n))
+    print("{0:<10}{1:>14}{2:>16}{3:>14}{4:>14}".format("format", "bytes", "bytes/record", "encode (s)", "decode (s)"))
+
+    for (name, result) in results.items():
+
+        print("{0:<10}{1:>14}{2:>16.1f}{3:>14.3f}{4:>14.3f}".format(name, result["bytes"], result["bytes"] / n,
+                                                                  result["encode"], result["decode"]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) >= 2 else RECORDS)
@@ -1,26 +1,231 @@
 import sqlite3
+import threading
 import time
-from typing import Any
+from typing import Any, List, Dict
 
 from enums import Operation
 from requests import ClientRequest
 
+DATABASE_PATH = "./database/data.sqlite"
+
+# Built on the in-memory copy, so that lookups of a rating, or of a user's ratings, don't scan every rating. A movie's
+# ratings are summarised in movie_ratings, below, so they are never looked up by movie alone.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ratings_user_movie ON ratings (userId, movieId)"  # Also serves lookups by userId
+]
+
+# The sum and count of each movie's ratings, from which its average is found without reading its ratings. Built when
+# the in-memory copy is made, then kept up to date by triggers as ratings are created, updated and deleted. The triggers
+# run in the same transaction as the change to the rating, so the aggregates always match the ratings they summarise.
+AGGREGATES = [
+    "CREATE TABLE movie_ratings (movieId PRIMARY KEY, total REAL NOT NULL, count INTEGER NOT NULL)",
+    "INSERT INTO movie_ratings SELECT movieId, TOTAL(rating), COUNT(rating) FROM ratings GROUP BY movieId",
+    """CREATE TRIGGER ratings_insert AFTER INSERT ON ratings BEGIN
+        INSERT OR IGNORE INTO movie_ratings VALUES (NEW.movieId, 0, 0);
+        UPDATE movie_ratings SET total = total + COALESCE(NEW.rating, 0), count = count + (NEW.rating IS NOT NULL)
+            WHERE movieId = NEW.movieId;
+    END""",
+    """CREATE TRIGGER ratings_update AFTER UPDATE OF movieId, rating ON ratings BEGIN
+        UPDATE movie_ratings SET total = total - COALESCE(OLD.rating, 0), count = count - (OLD.rating IS NOT NULL)
+            WHERE movieId = OLD.movieId;
+        INSERT OR IGNORE INTO movie_ratings VALUES (NEW.movieId, 0, 0);
+        UPDATE movie_ratings SET total = total + COALESCE(NEW.rating, 0), count = count + (NEW.rating IS NOT NULL)
+            WHERE movieId = NEW.movieId;
+    END""",
+    """CREATE TRIGGER ratings_delete AFTER DELETE ON ratings BEGIN
+        UPDATE movie_ratings SET total = total - COALESCE(OLD.rating, 0), count = count - (OLD.rating IS NOT NULL)
+            WHERE movieId = OLD.movieId;
+    END"""
+]
+
+# The fixed set of statements the DB runs. Each is compiled once, then reused from the connection's statement cache.
+STATEMENTS = {
+    "create": "INSERT INTO ratings VALUES (?, ?, ?, ?)",
+    "read": "SELECT rating FROM ratings WHERE (userId=? AND movieId=?)",
+    "update": "UPDATE ratings SET rating=?, timestamp=? WHERE (movieId=? AND userId=?)",
+    "delete": "DELETE FROM ratings WHERE (movieId=? AND userId=?)",
+    "average": "SELECT CASE WHEN count > 0 THEN ROUND(total / count) END FROM movie_ratings WHERE (movieId=?)",
+    "all": "SELECT movieId, rating FROM ratings WHERE (userId=?)",
+    "titles": "SELECT movieId, title FROM movies"
+}
+
 
 class DB:
-    def __init__(self):
+    def __init__(self, path: str = DATABASE_PATH):
+
+        self.path = path
+
+        self._connection: sqlite3.Connection = None  # The in-memory copy, created on first use
+        self._titles: Dict[str, str] = None  # The title of every movie, keyed by movie ID, read along with the copy
+        self._lock = threading.Lock()  # Ensures the copy is only made once
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The in-memory copy of the database on file. It is made the first time it is needed, with SQLite's backup API,
+        which copies the file page by page rather than replaying it as SQL, then indexed. The file is opened read-only,
+        so it is never modified.
+        :return: A connection to the in-memory copy
+        """
+
+        if self._connection is None:
+            self.load()
+
+        return self._connection
+
+    @property
+    def titles(self) -> Dict[str, str]:
+        """
+        The movie catalogue. Movies are never changed, so they are read once, when the in-memory copy is made, and
+        titles are looked up here rather than with a query per movie.
+        :return: The title of every movie, keyed by movie ID
+        """
+
+        if self._titles is None:
+            self.load()
+
+        return self._titles
+
+    def load(self) -> None:
+        """
+        Make the in-memory copy and read the movie catalogue, unless that has already been done.
+        :return: None
+        """
+
+        with self._lock:
+
+            if self._connection is not None:
+                return
+
+            start = time.perf_counter()
+
+            source = sqlite3.connect("file:{0}?mode=ro".format(self.path), uri=True)  # Open the file read-only
+            connection = sqlite3.connect(":memory:", check_same_thread=False,
+                                         cached_statements=len(STATEMENTS) + 16)  # Connect to an in-memory DB
+
+            try:
+
+                source.backup(connection)  # Copy the file database into it
+
+            finally:
+
+                source.close()
+
+            for index in INDEXES:
+                connection.execute(index)
 
-        self.path = "./database/data.sqlite"
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'movie_ratings'").fetchone() is None:
 
-        connection = sqlite3.connect(self.path)  # Load the database on file
-        script = "".join(connection.iterdump())  # Convert it into a script
+                for statement in AGGREGATES:  # Unless loading a checkpoint, which already has them
+                    connection.execute(statement)
 
-        self.connection = sqlite3.connect(":memory:", check_same_thread=False)  # Connect to an in-memory DB
-        self.connection.executescript(script)  # Load the file database into it
+            connection.commit()
+
+            self._titles = dict(connection.execute(STATEMENTS["titles"]))
+
+            print("Loaded {0} in {1:.3f}s".format(self.path, time.perf_counter() - start))
+
+            self._connection = connection
+
+    def copy(self) -> sqlite3.Connection:
+        """
+        Take a snapshot of the in-memory copy, e.g. to write to a checkpoint. Only the committed state is copied.
+        :return: A connection to a new in-memory database holding the snapshot
+        """
+
+        snapshot = sqlite3.connect(":memory:", check_same_thread=False)
+
+        self.connection.backup(snapshot)
+
+        return snapshot
 
     def execute_request(self, request: ClientRequest) -> Any:
+        """
+        Execute a request in a transaction of its own. If it fails, it doesn't take effect.
+        :param request: The ClientRequest to execute
+        :return: The value of the request
+        """
 
         print("Executing request", request)
 
+        try:
+
+            value = self.execute(request)
+
+            self.connection.commit()
+
+        except Exception:
+
+            self.connection.rollback()
+
+            raise
+
+        print(value, end="\n\n")
+
+        return value
+
+    def execute_batch(self, requests: List[ClientRequest]) -> List[Any]:
+        """
+        Execute several requests, in order, in a single transaction. If any fails, none of them take effect.
+        :param requests: The ClientRequests to execute
+        :return: The value of each request
+        """
+
+        print("Executing {0} requests".format(len(requests)))
+
+        try:
+
+            values = [self.execute(request) for request in requests]
+
+            self.connection.commit()
+
+        except Exception:
+
+            self.connection.rollback()
+
+            raise
+
+        return values
+
+    def apply_batch(self, requests: List[ClientRequest]) -> List[Any]:
+        """
+        Apply a batch of updates, in order, in a single transaction. If one fails, the transaction is rolled back and
+        the updates are applied again one at a time, each in a transaction of its own, so that only the updates that
+        fail don't take effect. Each update has the same effect however it is batched, so RMs applying the same updates
+        in different batches reach the same value.
+        :param requests: The ClientRequests of the updates
+        :return: The value of each update, or a message saying why it failed
+        """
+
+        try:
+
+            return self.execute_batch(requests)
+
+        except Exception as e:
+
+            print("Batch failed ({0}: {1}), applying one at a time".format(type(e).__name__, e))
+
+        values: List[Any] = []
+
+        for request in requests:
+
+            try:
+
+                values.append(self.execute_request(request))
+
+            except Exception as e:
+
+                values.append("Update failed ({0}: {1})".format(type(e).__name__, e))
+
+        return values
+
+    def execute(self, request: ClientRequest) -> Any:
+        """
+        Execute a request without committing it.
+        :param request: The ClientRequest to execute
+        :return: The value of the request
+        """
+
         method: Operation = request.method
         params = request.params
         value = None
@@ -49,59 +254,36 @@ class DB:
 
             value = self.all(**params)
 
-        print(value, end="\n\n")
-
         return value
 
     def create(self, user_id, movie_id, rating) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("INSERT INTO ratings VALUES (?, ?, ?, ?)", (user_id, movie_id, rating, time.time(),))
-
-        self.connection.commit()
+        self.connection.execute(STATEMENTS["create"], (user_id, movie_id, rating, time.time(),))
 
         return "Rating for " + self.title(movie_id) + " created: " + str(rating)
 
     def read(self, user_id: str, movie_id: str) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("SELECT rating FROM ratings WHERE (userId=? AND movieId=?)", (user_id, movie_id))
-
-        result = cursor.fetchone()
+        result = self.connection.execute(STATEMENTS["read"], (user_id, movie_id)).fetchone()
         rating = result[0] if result is not None else None
 
         return "Rating for " + self.title(movie_id) + ": " + str(rating)
 
     def update(self, movie_id: str, user_id: str, rating) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("UPDATE ratings SET rating=?, timestamp=? WHERE (movieId=? AND userId=?)", (rating, time.time(),
-                                                                                                   movie_id, user_id,))
-
-        self.connection.commit()
+        self.connection.execute(STATEMENTS["update"], (rating, time.time(), movie_id, user_id,))
 
         return "Rating for " + self.title(movie_id) + " updated: " + str(rating)
 
     def delete(self, movie_id: str, user_id: str) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("DELETE FROM ratings WHERE (movieId=? AND userId=?)", (movie_id, user_id,))
-
-        self.connection.commit()
+        self.connection.execute(STATEMENTS["delete"], (movie_id, user_id,))
 
         return "Rating for " + self.title(movie_id) + " deleted"
 
     def average(self, movie_id: str) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("SELECT ROUND(AVG(rating)) FROM ratings WHERE (movieId=?)", (movie_id,))
-
-        result = cursor.fetchone()
+        result = self.connection.execute(STATEMENTS["average"], (movie_id,)).fetchone()
 
         rating = result[0] if result is not None else None
 
@@ -109,20 +291,10 @@ class DB:
 
     def title(self, movie_id: str) -> str:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("SELECT title FROM movies WHERE (movieId=?)", (movie_id,))
-
-        result = cursor.fetchone()
-
-        return result[0] + " (" + movie_id + ")"
+        return self.titles[movie_id] + " (" + movie_id + ")"
 
     def all(self, user_id: str) -> Any:
 
-        cursor = self.connection.cursor()
-
-        cursor.execute("SELECT movieId, rating FROM ratings WHERE (userId=?)", (user_id,))
-
-        result = cursor.fetchall()
+        result = self.connection.execute(STATEMENTS["all"], (user_id,)).fetchall()
 
         return [self.title(rating[0]) + ": " + str(rating[1]) for rating in result]
@@ -44,3 +44,10 @@ class Operation(Enum):
     DELETE = "DELETE"
     AVERAGE = "AVERAGE"
     ALL = "All"
+
+
+class PeerSelection(Enum):
+    """Represents how a RM chooses which other RMs to gossip with in the background"""
+
+    RANDOM = "RANDOM"
+    ROUND_ROBIN = "ROUND_ROBIN"
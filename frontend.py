@@ -1,18 +1,27 @@
+import threading
+import time
 import uuid
-from typing import Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from itertools import count, groupby
+from typing import Any, List, Dict, Union, Set, Tuple
 
 import Pyro4
 from Pyro4.errors import CommunicationError
 
-from enums import Status, Operation
-from requests import ClientRequest, FrontendRequest, ReplicaResponse
+from enums import Operation
+from frontend_classes import Membership, ProxyPool, LatencyTracker
+from requests import ClientRequest, FrontendRequest, ReplicaResponse, FrontendBatchRequest, ReplicaBatchResponse
 from timestamp import Timestamp
 
 FAULT_TOLERANCE = 2
+QUERIES = [Operation.READ, Operation.AVERAGE, Operation.ALL]  # Operations that don't change the value at a RM
+WRITE_QUORUM = 1  # The number of RMs whose acknowledgements an update waits for, if they don't fail (1..f)
+REQUEST_WORKERS = 16  # The number of calls to RMs a FE makes at once
+HEDGE_PERCENTILE = 95  # A query is also sent to the next RM if the first takes longer than this percentile of queries
 
 
 class Frontend(object):
-    def __init__(self):
+    def __init__(self, write_quorum: int = WRITE_QUORUM):
 
         self.id = "frontend-" + str(uuid.uuid4())  # The ID of this FE
 
@@ -22,38 +31,49 @@ class Frontend(object):
         # timestamp is merged with the FE's previous timestamp to record the version the data observed by the client.
         self.prev = Timestamp()
 
-        self.ns = Pyro4.locateNS()  # The Pyro Name Server
-
-    def get_replica_uri(self) -> List[Pyro4.URI]:
-        """
-        Gets the Pyro URI of a suitable RM to send a request too. Replicas with an ACTIVE status take priority, followed
-        by OVERLOADED. An error is thrown if all replicas are OFFLINE.
-        :return: The Pyro URI of an RM
-        """
+        # Numbers this FE's updates. Each update's ID is "<FE ID>:<sequence number>", so that RMs can record the updates
+        # they have applied as a watermark per FE rather than as every ID.
+        self.sequence = count(1)
 
-        replicas = self.ns.list(metadata_all={"resource:replica"})  # Get all registered replicas
+        # The sequence numbers of this FE's updates that no RM has acknowledged yet, and that haven't been given up on.
+        # The lowest is sent with each update as its floor, so that RMs can skip over the gaps left by updates that
+        # failed. An update is only given up on if it never reached any RM.
+        self.outstanding: Set[int] = set()
 
-        uris = []
+        # Updates that may have reached a RM, but that no RM acknowledged. Each is sent again, under the same IDs,
+        # before this FE's next update, until a RM acknowledges it.
+        self.unsettled: List[Union[FrontendRequest, FrontendBatchRequest]] = []
 
-        for (name, uri) in replicas.items():
-
-            try:
+        self.ns = Pyro4.locateNS()  # The Pyro Name Server
 
-                with Pyro4.Proxy(uri) as replica:
+        # Persistent connections to RMs, shared by requests and status probes.
+        self.pool = ProxyPool()
 
-                    status: Status = Status(replica.get_status())
+        # The registered RMs and their statuses, kept up to date in the background so that requests don't have to ask.
+        self.membership = Membership(self.pool)
 
-                    print("{} reporting {}".format(name, status))
+        # Updates are sent to every chosen RM at once. The client gets a response as soon as write_quorum of them have
+        # acknowledged it, or every RM has answered, if some failed; the timestamps of the rest are merged into prev as
+        # they arrive. The quorum is best-effort: one acknowledgement is enough for the update not to be lost.
+        self.write_quorum = write_quorum
+        self.executor = ThreadPoolExecutor(max_workers=REQUEST_WORKERS)
 
-                    if status is not Status.OFFLINE:
-                        uris.append((name, uri))  # Add the replica to those we'll use
+        # Queries go to one RM, but if it takes longer than most queries do, the query is sent to the next RM as well,
+        # and the first valid response is used.
+        self.latency = LatencyTracker()
+        self.hedged = 0  # The number of queries sent to more than one RM
 
-                    if len(uris) >= FAULT_TOLERANCE:
-                        return uris  # We've found enough replicas: return those we already have
+        self.requests = 0  # The number of client requests received
+        self.lock = threading.Lock()  # Guards prev and requests, which are shared by the threads calling RMs
 
-            except CommunicationError:
+    def get_replica_uri(self) -> List[Pyro4.URI]:
+        """
+        Gets the Pyro URI of a suitable RM to send a request too. Replicas with an ACTIVE status take priority, followed
+        by OVERLOADED. An error is thrown if all replicas are OFFLINE.
+        :return: The Pyro URI of an RM
+        """
 
-                print("{} reporting Status.OFFLINE".format(name))  # The replica is offline!
+        uris = self.membership.available(FAULT_TOLERANCE)
 
         if len(uris) > 0:
             return uris  # We've found some!
@@ -63,54 +83,346 @@ class Frontend(object):
     @Pyro4.expose
     def request(self, request: ClientRequest) -> Any:
         """
-        Sends a client request to f RMs, and returns the most up-to-date response to the client
+        Sends a client request to f RMs, and returns the most up-to-date response to the client. An error is thrown if
+        no RM acknowledged an update, or gave a response to a query.
         :param request: A ClientRequest sent by a client
         :return: None if the request is an update, and a value if it is a read.
         """
 
         print("\nReceived request from client {0}\n".format(request))
 
-        frontend_request: FrontendRequest = FrontendRequest(self.prev, request)  # Build a frontend request
-        uris = self.get_replica_uri()  # Get the URIs of available replicas
-        responses: List[ReplicaResponse] = []
+        is_query = request.method in QUERIES
 
-        for (name, uri) in uris:  # Iterate through those URIs
+        with self.lock:
+            self.requests += 1
 
-            print("\nUsing {}\n".format(name))
+        uris = self.get_replica_uri()  # Get the URIs of available replicas
 
-            with Pyro4.Proxy(uri) as replica:
+        if not is_query:
+            self.resend(uris)
 
-                print("Sent timestamp {0}".format(self.prev))
+        with self.lock:
 
-                if request.method in [Operation.READ, Operation.AVERAGE, Operation.ALL]:
+            prev = self.prev.copy()
 
-                    response: ReplicaResponse = replica.query(frontend_request)  # Query the replica
+            if not is_query:
+                ids, floor = self.number(1)  # Only once the update is sure to be sent
 
-                    responses.append(response)  # Add the response to those received
+        if is_query:
 
-                    break
+            frontend_request: FrontendRequest = FrontendRequest(prev, request)  # Build a frontend request
+
+            responses = self.query(frontend_request, uris)
 
-                else:
+        else:
 
-                    response: ReplicaResponse = replica.update(frontend_request)  # Update the replica
+            frontend_request: FrontendRequest = FrontendRequest(prev, request, ids[0], floor)
 
-                    responses.append(response)  # Add the response to those received
+            responses = self.update(frontend_request, uris)
 
         value = None
 
         for response in responses:
 
-            self.prev.merge(response.label)  # Merge this FE's timestamp with the timestamp received
-
             if response.value is not None:
 
                 value = response.value   # Return the response of the first RM to execute the request
 
+                break
+
         print("\nNew timestamp  {0}".format(self.prev))
         print("Returning '{0}'".format(value))
 
         return value
 
+    @Pyro4.expose
+    def request_batch(self, requests: List[ClientRequest]) -> List[Any]:
+        """
+        Sends a batch of client requests to f RMs, and returns the most up-to-date response to each. Each run of
+        consecutive queries, and each run of consecutive updates, is sent in a single call to a RM under a single
+        timestamp, so the requests are executed in the order given. An error is thrown if no RM acknowledged a run of
+        updates, or gave a response to a run of queries.
+        :param requests: ClientRequests sent by a client
+        :return: The value of each request, in order
+        """
+
+        print("\nReceived {0} requests from client\n".format(len(requests)))
+
+        with self.lock:
+            self.requests += len(requests)
+
+        uris = self.get_replica_uri()  # Get the URIs of available replicas
+        values: List[Any] = []
+
+        for (is_query, group) in groupby(requests, key=lambda request: request.method in QUERIES):
+
+            group = list(group)
+
+            if not is_query:
+                self.resend(uris)
+
+            with self.lock:
+
+                prev = self.prev.copy()
+
+                if not is_query:
+                    ids, floor = self.number(len(group))
+
+            if is_query:
+
+                batch = FrontendBatchRequest(prev, group)
+
+                responses = self.query(batch, uris, "query_batch")
+
+            else:
+
+                batch = FrontendBatchRequest(prev, group, ids, floor)
+
+                responses = self.update(batch, uris, "update_batch")
+
+            values.extend(responses[0].values)
+
+        print("\nNew timestamp  {0}".format(self.prev))
+
+        return values
+
+    def number(self, n: int) -> Tuple[List[str], int]:
+        """
+        Number updates, and find the floor to send with them. Must be called with self.lock held, while taking the copy
+        of prev sent with them, so that every update below the floor that a RM acknowledged is reflected in that prev.
+        :param n: The number of updates
+        :return: The IDs of the updates, and the floor
+        """
+
+        sequences = [next(self.sequence) for _ in range(n)]
+
+        self.outstanding.update(sequences)
+
+        return ["{0}:{1}".format(self.id, sequence) for sequence in sequences], min(self.outstanding)
+
+    def settle(self, frontend_request: Union[FrontendRequest, FrontendBatchRequest]) -> None:
+        """
+        Stop counting updates as outstanding, once a RM has acknowledged them or every RM has failed to. Must be called
+        with self.lock held.
+        :param frontend_request: The FrontendRequest or FrontendBatchRequest of the updates
+        :return: None
+        """
+
+        ids = frontend_request.ids if isinstance(frontend_request, FrontendBatchRequest) else [frontend_request.id]
+
+        self.outstanding.difference_update(int(id.rpartition(":")[2]) for id in ids)
+
+    def resend(self, uris: List[Pyro4.URI]) -> None:
+        """
+        Send the unsettled updates again. A RM that has already seen one doesn't apply it again, but acknowledges it
+        with a timestamp that reflects it, so it can be settled.
+        :param uris: The IDs and Pyro URIs of the RMs to send them to
+        :return: None
+        """
+
+        with self.lock:
+            unsettled, self.unsettled = self.unsettled, []
+
+        for frontend_request in unsettled:
+
+            method = "update_batch" if isinstance(frontend_request, FrontendBatchRequest) else "update"
+
+            try:
+
+                self.update(frontend_request, uris, method)
+
+            except Exception as e:
+
+                print("Resending update failed ({0}: {1})".format(type(e).__name__, e))  # Still unsettled
+
+    def send(self, name: str, uri: Pyro4.URI, method: str,
+             frontend_request: Union[FrontendRequest, FrontendBatchRequest]) \
+            -> Union[ReplicaResponse, ReplicaBatchResponse]:
+        """
+        Sends a FrontendRequest to a RM, and merges the timestamp it responds with into this FE's timestamp. If the RM
+        can't be reached, it is evicted from this FE's membership.
+        :param name: The ID of the RM
+        :param uri: The Pyro URI of the RM
+        :param method: "query", "update", "query_batch" or "update_batch"
+        :param frontend_request: The FrontendRequest or FrontendBatchRequest to send
+        :return: The RM's ReplicaResponse or ReplicaBatchResponse
+        """
+
+        print("\nUsing {}\n".format(name))
+        print("Sent timestamp {0}".format(frontend_request.prev))
+
+        start = time.monotonic()
+
+        try:
+
+            with self.pool.proxy(uri) as replica:
+
+                response: ReplicaResponse = getattr(replica, method)(frontend_request)
+
+            if method == "query":
+                self.latency.record(time.monotonic() - start)
+
+        except CommunicationError:
+
+            print("{} reporting Status.OFFLINE".format(name))  # The replica is offline!
+
+            self.membership.evict(name)
+
+            raise
+
+        with self.lock:
+
+            self.prev.merge(response.label)  # Merge this FE's timestamp with the timestamp received
+
+            if method in ["update", "update_batch"]:
+                self.settle(frontend_request)  # Acknowledged, and reflected in prev
+
+        return response
+
+    def query(self, frontend_request: FrontendRequest, uris: List[Pyro4.URI], method: str = "query") \
+            -> List[ReplicaResponse]:
+        """
+        Sends a query to the first RM. If it hasn't responded within the HEDGE_PERCENTILE latency of recent queries, or
+        fails, the query is sent to the next RM as well, and so on. A response is only used if its timestamp is at
+        least as recent as the query's.
+        :param frontend_request: The query
+        :param uris: The IDs and Pyro URIs of the RMs to try, in order
+        :param method: "query", or "query_batch" for a FrontendBatchRequest
+        :return: A List holding the first valid response received. An error is thrown if no RM gave one.
+        """
+
+        remaining = list(uris)
+        delay = self.latency.percentile(HEDGE_PERCENTILE)
+        pending = set()
+
+        while len(remaining) > 0 or len(pending) > 0:
+
+            if len(remaining) > 0:
+
+                if len(pending) > 0:
+
+                    print("No response after {0:.3f}s: hedging".format(delay))
+
+                    with self.lock:
+                        self.hedged += 1
+
+                (name, uri) = remaining.pop(0)
+
+                pending.add(self.executor.submit(self.send, name, uri, method, frontend_request))  # Query the replica
+
+            # Wait for a response, or until it's time to hedge. Once there is no one left to hedge with, just wait.
+            done, pending = wait(pending, timeout=delay if len(remaining) > 0 else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                try:
+
+                    response: ReplicaResponse = future.result()
+
+                except CommunicationError:
+
+                    continue  # Try the next one
+
+                if frontend_request.prev <= response.label:
+                    return [response]
+
+        raise ConnectionRefusedError("No replica gave a response as recent as the query")
+
+    def update(self, frontend_request: FrontendRequest, uris: List[Pyro4.URI], method: str = "update") \
+            -> List[ReplicaResponse]:
+        """
+        Sends an update to every RM at once, and waits for write_quorum of them to acknowledge it. The quorum is
+        best-effort: if too many RMs fail to reach it, the update is returned once every RM has answered, as long as one
+        acknowledged it. Responses that arrive afterwards are still merged into this FE's timestamp.
+        :param frontend_request: The update
+        :param uris: The IDs and Pyro URIs of the RMs to update
+        :param method: "update", or "update_batch" for a FrontendBatchRequest
+        :return: A List of the responses received before the quorum was reached, which may be fewer than write_quorum
+        if RMs failed. An error is thrown if no RM acknowledged the update; unless it never reached any of them, it is
+        sent again before this FE's next update.
+        """
+
+        futures = [self.executor.submit(self.send, name, uri, method, frontend_request) for (name, uri) in uris]
+        quorum = max(1, min(self.write_quorum, len(futures)))
+        responses: List[ReplicaResponse] = []
+        errors: List[Exception] = []
+
+        try:
+
+            for future in as_completed(futures):
+
+                try:
+
+                    responses.append(future.result())  # Add the response to those received
+
+                except Exception as e:
+
+                    errors.append(e)
+
+                    continue  # Counts against the quorum: wait for the others
+
+                if len(responses) >= quorum:
+                    break
+
+        finally:
+
+            if len(responses) == 0:
+
+                with self.lock:
+
+                    if len(errors) == len(futures) and not any(self.delivered(e) for e in errors):
+
+                        self.settle(frontend_request)  # It never reached a RM: the update is given up on
+
+                    else:
+
+                        self.unsettled.append(frontend_request)  # A RM may have accepted it: send it again
+
+        if len(responses) == 0:
+
+            remote = [e for e in errors if not isinstance(e, CommunicationError)]
+
+            if len(remote) > 0:
+                raise remote[0]  # Raised by the RM
+
+            raise ConnectionRefusedError("No replica acknowledged the update")
+
+        return responses
+
+    @staticmethod
+    def delivered(error: Exception) -> bool:
+        """
+        Pyro raises a plain CommunicationError when it can't connect to a RM, and one of its subclasses, such as
+        ConnectionClosedError or TimeoutError, once a call has been sent. Any other error was raised by the RM itself.
+        :param error: The error a call to a RM failed with
+        :return: Whether the call may have reached the RM
+        """
+
+        return type(error) is not CommunicationError
+
+    @Pyro4.expose
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        :return: The number of client requests received, the number of connections made to RMs (including those used to
+        probe their statuses), the ratio between them, the number of hedged queries, and recent query latencies
+        """
+
+        with self.lock:
+
+            requests = self.requests
+            hedged = self.hedged
+
+        connections = self.pool.connections
+
+        return {
+            "requests": requests,
+            "connections": connections,
+            "connections_per_request": connections / requests if requests > 0 else 0.0,
+            "hedged_queries": hedged,
+            "query_latency_p50": self.latency.percentile(50),
+            "query_latency_p99": self.latency.percentile(99)
+        }
+
 
 if __name__ == '__main__':
     print("Creating frontend...")
@@ -124,4 +436,6 @@ if __name__ == '__main__':
 
     frontend.ns.register(frontend.id, uri, metadata={"resource:frontend"})
 
+    frontend.membership.start()
+
     daemon.requestLoop()
@@ -0,0 +1,336 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Iterator
+
+import Pyro4
+from Pyro4.errors import CommunicationError, NamingError
+
+from enums import Status
+
+MEMBERSHIP_TTL = 5.0  # Seconds a RM's reported status is trusted for
+PROBE_INTERVAL = 1.0  # Seconds between background probes of every registered RM
+PROBE_TIMEOUT = 1.0  # Seconds to wait for a RM to report its status
+IDLE_TIMEOUT = 30.0  # Seconds a pooled connection to a RM may go unused before it is closed
+MAX_IDLE = 4  # The most idle connections kept to any one RM. Each holds one of the RM's Pyro worker threads.
+LATENCY_WINDOW = 1000  # The number of recent latencies kept
+LATENCY_MIN_SAMPLES = 20  # The number of latencies needed before percentiles are trusted
+LATENCY_DEFAULT = 0.05  # Seconds reported as every percentile until enough latencies have been recorded
+
+
+class LatencyTracker:
+    """
+    The latencies of a FE's most recent calls to RMs. Used to decide how long to wait for a RM before hedging a query.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES,
+                 default: float = LATENCY_DEFAULT):
+
+        self.min_samples = min_samples
+        self.default = default
+
+        self.latencies = deque(maxlen=window)  # Seconds
+        self.lock = threading.Lock()
+
+    def __len__(self):
+
+        return len(self.latencies)
+
+    def record(self, latency: float) -> None:
+        """
+        :param latency: The number of seconds a call took
+        :return: None
+        """
+
+        with self.lock:
+            self.latencies.append(latency)
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: A percentile, from 0 to 100
+        :return: The latency that p percent of recent calls took no longer than, or the default if too few calls have
+        been recorded
+        """
+
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+        if len(latencies) < self.min_samples:
+            return self.default
+
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+class ProxyPool:
+    """
+    Persistent Pyro proxies to RMs, keyed by URI, so that requests don't pay for connecting to a RM every time. A Pyro
+    proxy makes one call at a time, so each caller checks a proxy out for the duration of its call, and another is
+    connected when every idle one is in use. A proxy whose connection fails is closed rather than returned, so the next
+    caller reconnects. Proxies left idle for longer than idle_timeout are closed, as are those returned when max_idle
+    are already idle, so that a burst of calls doesn't keep RMs' worker threads tied up once it is over.
+    """
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, max_idle: int = MAX_IDLE):
+
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+
+        self.idle: Dict[str, List[Tuple[Pyro4.Proxy, float]]] = {}  # Idle proxies and when they were last used, by URI
+        self.connections = 0  # The number of proxies created
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def proxy(self, uri: Pyro4.URI, timeout: float = None) -> Iterator[Pyro4.Proxy]:
+        """
+        Checks out a proxy to a RM, for use in a with statement.
+        :param uri: The Pyro URI of the RM
+        :param timeout: Seconds to wait for each call, or None to wait indefinitely
+        :return: A Pyro proxy to the RM
+        """
+
+        key = str(uri)
+        proxy = self.acquire(key)
+
+        proxy._pyroTimeout = timeout
+
+        try:
+
+            yield proxy
+
+        except CommunicationError:
+
+            proxy._pyroRelease()  # The connection may be broken: don't hand it to anyone else
+
+            raise
+
+        except BaseException:
+
+            self.release(key, proxy)
+
+            raise
+
+        self.release(key, proxy)
+
+    def acquire(self, key: str) -> Pyro4.Proxy:
+        """
+        :param key: The Pyro URI of a RM, as a string
+        :return: An idle proxy to the RM, or a new one if none are idle
+        """
+
+        with self.lock:
+
+            idle = self.idle.get(key)
+
+            if idle:
+                return idle.pop()[0]  # The most recently used, so that the others can go idle and be closed
+
+            self.connections += 1
+
+        return Pyro4.Proxy(key)
+
+    def release(self, key: str, proxy: Pyro4.Proxy) -> None:
+        """
+        Returns a proxy to the pool, and closes any that have been idle for too long, along with the oldest idle proxies
+        to the RM beyond max_idle.
+        :param key: The Pyro URI of the RM, as a string
+        :param proxy: A proxy checked out with acquire
+        :return: None
+        """
+
+        now = time.monotonic()
+        expired: List[Pyro4.Proxy] = []
+
+        with self.lock:
+
+            idle = self.idle.setdefault(key, [])
+            idle.append((proxy, now))
+
+            while len(idle) > self.max_idle:
+                expired.append(idle.pop(0)[0])
+
+            for idle in self.idle.values():
+
+                while len(idle) > 0 and idle[0][1] < now - self.idle_timeout:  # Oldest first
+                    expired.append(idle.pop(0)[0])
+
+        for proxy in expired:
+            proxy._pyroRelease()
+
+    def close(self) -> None:
+        """
+        Closes every idle proxy.
+        :return: None
+        """
+
+        with self.lock:
+
+            idle = [proxy for proxies in self.idle.values() for (proxy, _) in proxies]
+
+            self.idle.clear()
+
+        for proxy in idle:
+            proxy._pyroRelease()
+
+
+class Member:
+    """
+    Represents a RM, as last seen by a FE.
+    """
+
+    def __init__(self, name: str, uri: Pyro4.URI, status: Status, expires: float):
+        self.name = name  # ID of the RM
+        self.uri = uri  # Pyro URI of the RM
+        self.status = status  # Status the RM last reported
+        self.expires = expires  # Time after which the status is no longer trusted
+
+
+class Membership:
+    """
+    A FE's view of the registered RMs and their statuses. A background thread lists the RMs registered with the name
+    server and probes each one's status, so that choosing RMs for a request needs no discovery. A status is only trusted
+    until it expires, and a RM that fails during a request is evicted straight away.
+    """
+
+    def __init__(self, pool: ProxyPool = None, ttl: float = MEMBERSHIP_TTL, interval: float = PROBE_INTERVAL,
+                 timeout: float = PROBE_TIMEOUT):
+
+        self.pool = pool if pool is not None else ProxyPool()  # Connections to RMs
+        self.ttl = ttl
+        self.interval = interval
+        self.timeout = timeout
+
+        self.members: Dict[str, Member] = {}  # RMs, keyed by their ID
+        self.lock = threading.Lock()
+
+        self._refresh = threading.Event()  # Set to refresh before the next interval is up
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update(self, name: str, uri: Pyro4.URI, status: Status) -> None:
+        """
+        Records the status a RM has reported.
+        :param name: ID of the RM
+        :param uri: Pyro URI of the RM
+        :param status: Status the RM reported
+        :return: None
+        """
+
+        with self.lock:
+            self.members[name] = Member(name, uri, status, time.monotonic() + self.ttl)
+
+    def evict(self, name: str) -> None:
+        """
+        Treats a RM as OFFLINE until it is next probed, and probes every RM as soon as possible. Called when a request
+        to the RM fails.
+        :param name: ID of the RM
+        :return: None
+        """
+
+        with self.lock:
+
+            member = self.members.get(name)
+
+            if member is not None:
+                member.status = Status.OFFLINE
+
+        self._refresh.set()
+
+    def available(self, n: int) -> List[Tuple[str, Pyro4.URI]]:
+        """
+        Gets up to n RMs whose status is known and not OFFLINE. RMs reporting ACTIVE take priority, followed by those
+        reporting OVERLOADED. Does no I/O.
+        :param n: The number of RMs wanted
+        :return: A List of the IDs and Pyro URIs of those RMs
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+            members = [member for member in self.members.values()
+                       if member.status is not Status.OFFLINE and member.expires > now]
+
+        members.sort(key=lambda member: member.status is not Status.ACTIVE)
+
+        return [(member.name, member.uri) for member in members[:n]]
+
+    def probe(self, ns: Pyro4.Proxy) -> None:
+        """
+        Lists the RMs registered with the name server and asks each for its status. RMs that are no longer registered
+        are forgotten.
+        :param ns: The Pyro name server
+        :return: None
+        """
+
+        replicas = ns.list(metadata_all={"resource:replica"})  # Get all registered replicas
+
+        for (name, uri) in replicas.items():
+
+            try:
+
+                with self.pool.proxy(uri, self.timeout) as replica:
+
+                    status: Status = Status(replica.get_status())
+
+            except CommunicationError:
+
+                status = Status.OFFLINE  # The replica is offline!
+
+            self.update(name, uri, status)
+
+        with self.lock:
+
+            for name in [name for name in self.members.keys() if name not in replicas]:
+                del self.members[name]
+
+    def _probe_loop(self) -> None:
+        """
+        Probe every RM every interval seconds, or sooner if a RM has been evicted, until stop is called.
+        :return: None
+        """
+
+        ns = Pyro4.locateNS()  # A Pyro proxy makes one call at a time, so don't share the FE's
+
+        while not self._stop.is_set():
+
+            self._refresh.clear()
+
+            try:
+
+                self.probe(ns)
+
+            except (NamingError, CommunicationError) as e:
+
+                print("Probing replicas failed:", e)
+
+            self._refresh.wait(self.interval)
+
+    def start(self) -> None:
+        """
+        Probe every RM once, then keep probing in the background.
+        :return: None
+        """
+
+        if self._thread is not None:
+            return
+
+        with Pyro4.locateNS() as ns:
+            self.probe(ns)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop probing in the background.
+        :return: None
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._refresh.set()
+        self._thread.join()
+        self._thread = None
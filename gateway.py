@@ -0,0 +1,331 @@
+import asyncio
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import Any, List, Dict, Tuple
+
+import Pyro4
+from Pyro4.util import get_serializer
+
+from frontend import Frontend, QUERIES
+from requests import ClientRequest
+
+GATEWAY_HOST = "localhost"
+GATEWAY_PORT = 9091
+BATCH_WINDOW = 0.002  # Seconds to gather concurrent client requests into one batch
+MAX_BATCH = 256  # The most client requests sent to RMs in one batch
+GATEWAY_WORKERS = 8  # The number of batches a gateway has in flight at once
+
+serializer = get_serializer("serpent")  # Uses the same to_dict and from_dict registrations as Pyro
+header = struct.Struct(">I")  # Every message is preceded by its length
+
+
+def encode(message: Dict) -> bytes:
+    """
+    :param message: A dict of serialisable values
+    :return: The message, framed for sending to or from a gateway
+    """
+
+    data = serializer.dumps(message)
+
+    return header.pack(len(data)) + data
+
+
+async def decode(reader: asyncio.StreamReader) -> Dict:
+    """
+    Reads one framed message.
+    :param reader: The stream to read from
+    :return: The message
+    """
+
+    length, = header.unpack(await reader.readexactly(header.size))
+
+    return serializer.loads(await reader.readexactly(length))
+
+
+class Gateway:
+    """
+    An asyncio front end to a Frontend, for serving many concurrent clients. Each client connection carries any number
+    of requests at once, each tagged with an ID that its response carries back. Rather than holding a thread for every
+    request, the gateway gathers the requests that arrive within BATCH_WINDOW of each other, from every client, and
+    sends them to RMs with a single Frontend.request_batch. Only those batches need threads, and there are at most
+    GATEWAY_WORKERS of them. Every response timestamp is merged into the Frontend's timestamp under its lock.
+    """
+
+    def __init__(self, frontend, window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH,
+                 workers: int = GATEWAY_WORKERS):
+
+        self.frontend = frontend  # Sends requests to RMs
+        self.window = window
+        self.max_batch = max_batch
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = asyncio.Semaphore(workers)  # Limits the batches in flight to the threads available
+
+        self.queue: asyncio.Queue = None  # Requests waiting to be batched, with the futures their values go to
+        self.batches = 0  # The number of batches sent
+        self.requests = 0  # The number of client requests received
+
+    async def request(self, request: ClientRequest) -> Any:
+        """
+        Queue a client request to be sent in the next batch.
+        :param request: A ClientRequest
+        :return: The value of the request
+        """
+
+        future = asyncio.get_running_loop().create_future()
+
+        self.requests += 1
+
+        await self.queue.put((request, future))
+
+        return await future
+
+    async def batch_loop(self) -> None:
+        """
+        Gather queued requests into batches and send them.
+        :return: None
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+
+            batch = [await self.queue.get()]  # Wait for the first request
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch:  # Then gather any others that arrive in time
+
+                try:
+
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time())))
+
+                except asyncio.TimeoutError:
+
+                    break
+
+            await self.slots.acquire()
+
+            self.batches += 1
+
+            asyncio.ensure_future(self.send(batch))
+
+    async def send(self, batch: List[Tuple[ClientRequest, asyncio.Future]]) -> None:
+        """
+        Send a batch of requests to RMs, and resolve each request's future with its value. A batch holds requests from
+        many clients, so if a batch of queries fails, each query is sent again on its own, and only those that fail
+        again give their client an error. Updates may already have been applied, so aren't sent again: if a batch
+        holding updates fails, every request in it fails.
+        :param batch: Requests and their futures
+        :return: None
+        """
+
+        try:
+
+            try:
+
+                values = await self.request_batch(batch)
+
+            except Exception as e:
+
+                if len(batch) == 1 or any(request.method not in QUERIES for (request, _) in batch):
+                    raise
+
+                print("Batch failed ({0}: {1}), sending one at a time".format(type(e).__name__, e))
+
+                await asyncio.gather(*[self.send_alone(request, future) for (request, future) in batch])
+
+                return
+
+            for ((_, future), value) in zip(batch, values):
+
+                if not future.done():
+                    future.set_result(value)
+
+        except Exception as e:
+
+            for (_, future) in batch:
+
+                if not future.done():
+                    future.set_exception(e)
+
+        finally:
+
+            self.slots.release()
+
+    async def send_alone(self, request: ClientRequest, future: asyncio.Future) -> None:
+        """
+        Send a single request to RMs, and resolve its future with its value, or the error it failed with.
+        :param request: A ClientRequest
+        :param future: The future its value goes to
+        :return: None
+        """
+
+        try:
+
+            value, = await self.request_batch([(request, future)])
+
+            if not future.done():
+                future.set_result(value)
+
+        except Exception as e:
+
+            if not future.done():
+                future.set_exception(e)
+
+    async def request_batch(self, batch: List[Tuple[ClientRequest, asyncio.Future]]) -> List[Any]:
+        """
+        :param batch: Requests and their futures
+        :return: The value of each request, from a single Frontend.request_batch run on the gateway's threads
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.frontend.request_batch,
+                                                                [request for (request, _) in batch])
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one client connection until it closes. Requests are handled concurrently, and answered in the order they
+        complete.
+        :param reader: The client's stream
+        :param writer: The client's stream
+        :return: None
+        """
+
+        async def respond(id: int, request: ClientRequest) -> None:
+
+            try:
+
+                message = {"id": id, "value": await self.request(request)}
+
+            except Exception as e:
+
+                message = {"id": id, "error": "{0}: {1}".format(type(e).__name__, e)}
+
+            writer.write(encode(message))
+
+        try:
+
+            while True:
+
+                message = await decode(reader)
+
+                asyncio.ensure_future(respond(message["id"], message["request"]))
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+
+            pass  # The client has gone
+
+        finally:
+
+            writer.close()
+
+    async def start(self, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT) -> asyncio.AbstractServer:
+        """
+        Start serving clients.
+        :param host: The host to listen on
+        :param port: The port to listen on, or 0 for any
+        :return: The server
+        """
+
+        self.queue = asyncio.Queue()
+
+        asyncio.ensure_future(self.batch_loop())
+
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+class GatewayClient:
+    """
+    A client connection to a Gateway. Any number of requests may be made at once over the one connection.
+    """
+
+    def __init__(self):
+
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+
+        self.ids = count()
+        self.pending: Dict[int, asyncio.Future] = {}  # Futures awaiting a response, keyed by request ID
+
+    async def connect(self, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT) -> None:
+
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+        asyncio.ensure_future(self.receive_loop())
+
+    async def receive_loop(self) -> None:
+        """
+        Hand each response to the request waiting for it.
+        :return: None
+        """
+
+        try:
+
+            while True:
+
+                message = await decode(self.reader)
+                future = self.pending.pop(message["id"])
+
+                if "error" in message:
+
+                    future.set_exception(ConnectionRefusedError(message["error"]))
+
+                else:
+
+                    future.set_result(message["value"])
+
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+
+            for future in self.pending.values():
+                future.set_exception(ConnectionError(e))
+
+            self.pending.clear()
+
+    async def request(self, request: ClientRequest) -> Any:
+        """
+        :param request: A ClientRequest
+        :return: The value of the request
+        """
+
+        id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+
+        self.pending[id] = future
+        self.writer.write(encode({"id": id, "request": request}))
+
+        return await future
+
+    def close(self) -> None:
+
+        self.writer.close()
+
+
+if __name__ == '__main__':
+    print("Creating gateway...")
+
+    port = int(sys.argv[1]) if len(sys.argv) >= 2 else GATEWAY_PORT  # Get the port from command-line arguments
+
+    frontend = Frontend()
+    frontend.membership.start()
+
+    # The FE behind the gateway is also served by Pyro, so that the gateway's name server entry holds a real Pyro URI
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(frontend)
+
+    threading.Thread(target=daemon.requestLoop, daemon=True).start()
+
+    gateway = Gateway(frontend)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(gateway.start(GATEWAY_HOST, port))
+
+    # Register the gateway under a name of its own, with its address in its metadata, so that clients can find it
+    address = server.sockets[0].getsockname()
+    name = frontend.id.replace("frontend-", "gateway-", 1)
+
+    frontend.ns.register(name, uri, metadata={"resource:gateway", "address:{0}:{1}".format(address[0], address[1])})
+
+    print("{0} running on {1}:{2}".format(name, address[0], address[1]), end="\n\n")
+
+    loop.run_forever()
@@ -1,18 +1,38 @@
+import random
+import sys
+import threading
+import time
 import uuid
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError
+from typing import List, Dict, Tuple, Any, Optional
 
 import Pyro4
-from Pyro4.errors import CommunicationError
+from Pyro4.errors import CommunicationError, NamingError
 
+import wire
 from db import DB
-from enums import Status
-from replica_classes import Record, Log
-from requests import ClientRequest, FrontendRequest, ReplicaResponse
+from enums import Status, PeerSelection
+from replica_classes import Record, Log, Gossip, ExecutedOperationTable, QueryCache, CompressedGossip, CODECS
+from requests import ClientRequest, FrontendRequest, ReplicaResponse, FrontendBatchRequest, ReplicaBatchResponse
+from storage import Storage, encode
 from timestamp import Timestamp
 
+GOSSIP_INTERVAL = 2.0  # Seconds between background gossip rounds. Set to 0 to only gossip when a request needs it.
+GOSSIP_FANOUT = 1  # The number of RMs gossiped with in each background round
+PEER_SELECTION = PeerSelection.RANDOM  # How those RMs are chosen
+GOSSIP_TIMEOUT = 2.0  # Seconds to wait for any one RM when fetching gossip from it
+GOSSIP_WORKERS = 8  # The number of RMs this RM fetches gossip from at once
+REGISTRY_TTL = 10.0  # Seconds the list of registered RMs is reused for when compacting, before asking the name server
+CHECKPOINT_INTERVAL = 30.0  # Seconds between checkpoints of a persistent RM's state
+QUERY_CACHE_SIZE = 10000  # The most query results a RM caches. Set to 0 to disable the cache.
+COMPRESSION_THRESHOLD = 4096  # Gossip packed to at least this many bytes is compressed. Set to None to never compress.
+COMPRESSION_LEVEL = 1  # Most of the saving of higher levels, at a fraction of the CPU time
+
 
-@Pyro4.expose
 class Replica(object):
+    # Only the methods that FEs and other RMs call are exposed to Pyro. The rest are internal, and several must be
+    # called with self.lock held.
+
     # Accessor methods for properties of this RM; used for gossip
     @Pyro4.expose
     @property
@@ -32,9 +52,24 @@ class Replica(object):
 
         return self._update_log
 
-    def __init__(self):
+    def __init__(self, gossip_interval: float = GOSSIP_INTERVAL, gossip_fanout: int = GOSSIP_FANOUT,
+                 peer_selection: PeerSelection = PEER_SELECTION, gossip_timeout: float = GOSSIP_TIMEOUT,
+                 directory: str = None, checkpoint_interval: float = CHECKPOINT_INTERVAL,
+                 query_cache_size: int = QUERY_CACHE_SIZE,
+                 compression_threshold: Optional[int] = COMPRESSION_THRESHOLD):
+
+        # If a directory is given, this RM's state is kept on disk there, and a restarted RM picks up where it left off
+        # under the same ID. Otherwise, its state is lost when it stops.
+        self.storage = Storage(directory) if directory is not None else None
+
+        self._id = self.storage.id if self.storage is not None else None  # This RM's ID
+
+        if self._id is None:
+
+            self._id = "replica-" + str(uuid.uuid4())
 
-        self._id = "replica-" + str(uuid.uuid4())  # This RM's ID
+            if self.storage is not None:
+                self.storage.id = self._id
 
         # Represents updates currently reflected in the value. Contains one entry for every replica manager, and is
         # updated whenever an update operation is applied to the value.
@@ -45,25 +80,87 @@ class Replica(object):
         self._replica_timestamp = Timestamp({self.id: 0})
 
         # The Pyro name server. Storing it locally removes the overhead of re-locating it every time this RM gets
-        # replicas_with_updates.
+        # replicas_with_updates. Shared by every thread, as calls to the name server are few enough to take turns: a
+        # Pyro proxy makes one call at a time, under a lock of its own, so the name server only spends one connection,
+        # and one of its worker threads, on this RM.
         self.ns = Pyro4.locateNS()
 
-        # This RM's update log, containing Records.
-        self._update_log = Log()
+        # The value of the application state as maintained by the RM. Each RM is a state machine, which begins with a
+        # specified initial value and is thereafter solely the result of applying update operations to that state. The
+        # copy is only loaded when first used.
+        self.database = DB()
 
-    # The value of the application state as maintained by the RM. Each RM is a state machine, which begins with a
-    # specified initial value and is thereafter solely the result of applying update operations to that state.
-    database = DB()
+        # Results of recent queries against the value. Results an update could change are discarded as it is applied,
+        # so a cached result is always the one the value would give.
+        self.query_cache = QueryCache(query_cache_size)
 
-    # The same update may arrive at a given replica manager from a FE and in gossip messages from other RMs. To prevent
-    # an update being applied twice, this table contains the unique FE IDs of updates that have been applied to the
-    # value. The RM checks this table before adding an update to the log.
-    executed_operation_table: List[str] = []
+        # This RM's update log, containing Records.
+        self._update_log = Log()
 
-    # Contains a vector timestamp for each other RM, filled with timestamps that arrive from them in gossip messages.
-    # Used to establish whether an update has been applied to all RMs.
-    timestamp_table: Dict[str, Timestamp] = {}
+        # An FE sends each update to several RMs, each of which accepts it under its own entry. Only one copy is kept in
+        # the update log; the others are held here until they are stable, then their timestamps are merged into the
+        # value timestamp as if they had been applied, so that FEs that have seen them can be served by this RM.
+        self._duplicates: List[Record] = []
+
+        # The same update may arrive at a given replica manager from a FE and in gossip messages from other RMs. To
+        # prevent an update being applied twice, this table records the unique FE IDs of updates that have been applied
+        # to the value. The RM checks this table before adding an update to the log.
+        self.executed_operation_table = ExecutedOperationTable()
+
+        # Contains a vector timestamp for each other RM, filled with timestamps that arrive from them in gossip
+        # messages. Used to establish whether an update has been applied to all RMs.
+        self.timestamp_table: Dict[str, Timestamp] = {}
+
+        # Guards this RM's timestamps, log and value, which are shared between Pyro's worker threads and the background
+        # gossip thread. Never held while calling another RM, so two RMs gossiping with each other can't deadlock.
+        self.lock = threading.RLock()
+
+        # Background gossip settings. Gossiping ahead of demand means requests rarely have to wait for gossip.
+        self.gossip_interval = gossip_interval
+        self.gossip_fanout = gossip_fanout
+        self.peer_selection = peer_selection
+        self._next_peer = 0  # Used for PeerSelection.ROUND_ROBIN
+        self._stop_gossip = threading.Event()
+        self._gossip_thread = None
+
+        # Gossip is fetched from several RMs at once, each with its own deadline, so one slow or offline RM can't hold
+        # up the others.
+        self.gossip_timeout = gossip_timeout
+        self._gossip_pool = ThreadPoolExecutor(max_workers=GOSSIP_WORKERS)
+
+        # The RMs registered with the name server, and when they were listed. Background gossip lists them every round;
+        # compacting after gossip on a request's behalf reuses the list, rather than asking the name server again.
+        self._registry: Optional[Tuple[float, Dict[str, str]]] = None
+
+        # Gossip sent to RMs that ask for it compressed is compressed if it is at least compression_threshold bytes.
+        self.compression_threshold = compression_threshold
+
+        # A persistent RM's value and state are checkpointed every checkpoint_interval seconds, so that only the journal
+        # written since has to be replayed on restart.
+        self.checkpoint_interval = checkpoint_interval
+        self._stop_checkpoints = threading.Event()
+        self._checkpoint_thread = None
+
+        # Counts of requests received, and of those that had to wait for gossip before they could be executed, along
+        # with the bytes of gossip sent and received compressed, and the CPU time spent compressing and decompressing.
+        self.metrics: Dict[str, Any] = {
+            "queries": 0,
+            "blocked_queries": 0,
+            "updates": 0,
+            "blocked_updates": 0,
+            "gossip_rounds": 0,
+            "gossip_packed_bytes_sent": 0,
+            "gossip_bytes_sent": 0,
+            "gossip_compression_cpu": 0.0,
+            "gossip_packed_bytes_received": 0,
+            "gossip_bytes_received": 0,
+            "gossip_decompression_cpu": 0.0
+        }
+
+        if self.storage is not None:
+            self.recover()
 
+    @Pyro4.expose
     def query(self, query: FrontendRequest) -> ReplicaResponse:
         """
         Execute a query from an FE. If this RM holds outdated information (i.e. FE's prev > RM's value), gossip, then
@@ -78,13 +175,92 @@ class Replica(object):
         request: ClientRequest = query.request  # The request passed to the FE
 
         # q can be applied to the replica's value if q.prev <= valueTS. If it can't, gossip so that it can.
-        if (prev <= self.value_timestamp) is False:
-            self.gossip(prev)
+        self.catch_up(prev, "queries")
+
+        with self.lock:
+
+            result = self.execute_queries(prev, [request])[0]
+
+            return ReplicaResponse(result, self.value_timestamp.copy())
+
+    @Pyro4.expose
+    def query_batch(self, query: FrontendBatchRequest) -> ReplicaBatchResponse:
+        """
+        Execute a batch of queries from an FE, in a single transaction. If this RM holds outdated information (i.e. FE's
+        prev > RM's value), gossip, then execute the queries. A batch may hold queries from many clients, so if one
+        fails, the queries are executed again one at a time, and only those that fail give a message saying why.
+        :param query: A FrontendBatchRequest, comprising the FE's timestamp and the requests from the client.
+        :return: A ReplicaBatchResponse, containing the requested values and this RM's value timestamp.
+        """
+
+        print("Received {} queries from FE".format(len(query.requests)), query.prev, end="\n\n")
+
+        self.catch_up(query.prev, "queries")
+
+        with self.lock:
+
+            try:
+
+                results = self.execute_queries(query.prev, query.requests)
+
+            except Exception as e:
+
+                print("Batch failed ({0}: {1}), executing one at a time".format(type(e).__name__, e))
+
+                results = []
+
+                for request in query.requests:
+
+                    try:
+
+                        results.append(self.execute_queries(query.prev, [request])[0])
+
+                    except Exception as e:
+
+                        results.append("Query failed ({0}: {1})".format(type(e).__name__, e))
+
+            return ReplicaBatchResponse(results, self.value_timestamp.copy())
+
+    def execute_queries(self, prev: Timestamp, requests: List[ClientRequest]) -> List[Any]:
+        """
+        Execute queries against this RM's value, using cached results where possible. A cached result is only used if
+        the value reflects everything the FE has seen; the queries without one are executed in a single transaction.
+        Must be called with self.lock held.
+        :param prev: The FE timestamp sent with the queries
+        :param requests: The queries
+        :return: The result of each query
+        """
+
+        covered = (prev <= self.value_timestamp) is True
+
+        if covered:
+
+            results = [self.query_cache.get(request) for request in requests]
+
+        else:
+
+            results = [None] * len(requests)
+
+            self.query_cache.misses += len(requests)
 
-        result = self.database.execute_request(request)
+        missed = [request for (request, result) in zip(requests, results) if result is None]
 
-        return ReplicaResponse(result, self.value_timestamp)
+        if len(missed) == 0:
+            return results
 
+        executed = iter(self.database.execute_batch(missed))
+
+        for (i, request) in enumerate(requests):
+
+            if results[i] is None:
+
+                results[i] = next(executed)
+
+                self.query_cache.put(request, results[i])
+
+        return results
+
+    @Pyro4.expose
     def update(self, update: FrontendRequest) -> ReplicaResponse:
         """
         Execute an update from an FE. If this RM holds outdated information (i.e. FE's prev > RM's value), gossip, then
@@ -99,27 +275,136 @@ class Replica(object):
         prev: Timestamp = update.prev  # The previous timestamp
         request: ClientRequest = update.request  # The request passed to the FE
 
-        if id not in self.executed_operation_table:  # Update has not already been applied
+        self.catch_up(prev, "updates")  # If we're missing information, gossip
+
+        with self.lock:
+
+            record = self.accept(id, request, prev, update.floor)
+
+            if record is not None:
+
+                response = ReplicaResponse(self.apply_update(record), record.ts)
+
+            else:
+
+                response = ReplicaResponse("Update has already been performed", self.seen_timestamp([id]))
+
+        self.sync()  # Don't acknowledge the update until it is durable
+
+        return response
+
+    @Pyro4.expose
+    def update_batch(self, update: FrontendBatchRequest) -> ReplicaBatchResponse:
+        """
+        Execute a batch of updates from an FE, in order and in a single transaction. If this RM holds outdated
+        information (i.e. FE's prev > RM's value), gossip, then execute the updates. Each update is recorded separately,
+        and depends on the one before it.
+        :param update: A FrontendBatchRequest, comprising the FE's timestamp and the requests from the client.
+        :return: A ReplicaBatchResponse, containing a database message for each update and this RM's value timestamp.
+        """
+
+        print("Received {} updates from FE".format(len(update.requests)), update.prev, end="\n\n")
+
+        prev: Timestamp = update.prev
 
-            if id not in self._update_log:  # Update has not been seen before
+        self.catch_up(prev, "updates")  # If we're missing information, gossip
 
-                self._replica_timestamp.replicas[self.id] += 1  # This RM has accepted an update
+        with self.lock:
 
-                if (prev <= self.value_timestamp) is False:  # If we're missing information, gossip
+            records: List[Record] = []
+            results: List[Any] = []
+            seen: List[str] = []
 
-                    self.gossip(prev)
+            for (id, request) in zip(update.ids, update.requests):
 
-                ts = prev.copy()
-                ts.replicas[self.id] = self._replica_timestamp.replicas[self.id]  # Update the timestamp to reflect this
+                record = self.accept(id, request, prev, update.floor)
 
-                record = Record(self.id, ts, request, prev, id)  # Create a record of this update
-                self._update_log += record  # Add it to the log
+                if record is None:
+
+                    results.append("Update has already been performed")
+                    seen.append(id)
+
+                else:
+
+                    records.append(record)
+                    results.append(None)
+
+                    prev = record.ts  # The next update in the batch depends on this one
+
+            applied = iter(self.apply_updates(records))
+
+            results = [next(applied) if result is None else result for result in results]
+
+            response = ReplicaBatchResponse(results, self.seen_timestamp(seen))
+
+        self.sync()  # Don't acknowledge the updates until they are durable
+
+        return response
+
+    def seen_timestamp(self, ids: List[str]) -> Timestamp:
+        """
+        The timestamp to acknowledge updates with, when some have been seen before. A FE sends an update again if it
+        didn't hear whether it was accepted, and must then get a timestamp that reflects it, even if it is still waiting
+        in this RM's log. Must be called with self.lock held.
+        :param ids: The IDs of the updates that have been seen before
+        :return: This RM's value timestamp, merged with the timestamps of those updates still in its update log
+        """
+
+        ts = self.value_timestamp.copy()
+
+        for id in ids:
+
+            record = self._update_log.get(id)
+
+            if record is not None:
+                ts.merge(record.ts)
+
+        return ts
+
+    def catch_up(self, prev: Timestamp, kind: str) -> None:
+        """
+        Gossip if this RM's value doesn't yet reflect everything the FE has seen, and count the request.
+        :param prev: The FE timestamp sent with the request
+        :param kind: "queries" or "updates"
+        :return: None
+        """
 
-                result = self.apply_update(record)
+        with self.lock:
 
-                return ReplicaResponse(result, ts)
+            self.metrics[kind] += 1
 
-        return ReplicaResponse("Update has already been performed", self.value_timestamp)
+            blocked = (prev <= self.value_timestamp) is False
+
+            if blocked:
+                self.metrics["blocked_" + kind] += 1
+
+        if blocked:
+            self.gossip(prev)
+
+    def accept(self, id: str, request: ClientRequest, prev: Timestamp, floor: Optional[int] = None) -> Optional[Record]:
+        """
+        Accept an update into this RM's update log, unless it has been seen before. Must be called with self.lock held.
+        :param id: The unique ID of the update
+        :param request: The request passed to the FE
+        :param prev: The timestamp the update depends on
+        :param floor: The FE's lowest outstanding sequence number when it sent the update
+        :return: A Record of the update, or None if it has already been seen
+        """
+
+        if id in self.executed_operation_table or id in self._update_log:  # Update has already been seen
+            return None
+
+        self._replica_timestamp[self.id] += 1  # This RM has accepted an update
+
+        ts = prev.copy()
+        ts[self.id] = self._replica_timestamp[self.id]  # Update the timestamp to reflect it
+
+        record = Record(self.id, ts, request, prev, id, floor)  # Create a record of this update
+        self._update_log += record  # Add it to the log
+
+        self.journal("record", record)
+
+        return record
 
     def apply_update(self, record: Record) -> str:
         """
@@ -128,11 +413,75 @@ class Replica(object):
         :return: a message from the Database
         """
 
+        floor = self.floor(record)
+
         self.value_timestamp.merge(record.ts)  # Merge this RM's value timestamp with the timestamp of the record
-        self.executed_operation_table.append(record.id)  # Add the record's ID to the executed operation table
+        self.executed_operation_table.add(record.id, floor)  # Add the record's ID to the executed operation table
+
+        self.journal("apply", [record.id])
+
+        self.query_cache.invalidate(record.request)  # Discard the cached results this update could change
 
         return self.database.execute_request(record.request)  # Execute the request
 
+    def apply_updates(self, records: List[Record]) -> List[str]:
+        """
+        Apply several updates, in order and in a single transaction. If one fails, only that one doesn't take effect.
+        :param records: stable Records in this RM's update log
+        :return: a message from the Database for each
+        """
+
+        for record in records:
+
+            floor = self.floor(record)
+
+            self.value_timestamp.merge(record.ts)
+            self.executed_operation_table.add(record.id, floor)
+
+        if len(records) > 0:
+            self.journal("apply", [record.id for record in records])
+
+        for record in records:
+            self.query_cache.invalidate(record.request)
+
+        return self.database.apply_batch([record.request for record in records])
+
+    def floor(self, record: Record) -> Optional[int]:
+        """
+        The floor of an update about to be applied, if it can be trusted. Updates below it that were acknowledged are
+        in its prev, so it is only used once everything in its prev has been applied; otherwise, an acknowledged update
+        still on its way through gossip would be skipped. Must be called with self.lock held.
+        :param record: A Record about to be applied
+        :return: The Record's floor, or None
+        """
+
+        return record.floor if record.prev <= self.value_timestamp else None
+
+    def journal(self, kind: str, value: Any) -> None:
+        """
+        Write a change to this RM's journal, if it is persistent. Must be called with self.lock held, so that changes
+        are journaled in the order they are made.
+        :param kind: "record" for a Record added to the update log, "duplicate" for another RM's copy of a Record
+        already in it, "ts" for a replica timestamp merged from gossip, or "apply" for the IDs of Records applied to the
+        value
+        :param value: The Record, Timestamp or list of IDs
+        :return: None
+        """
+
+        if self.storage is not None:
+            self.storage.append(kind, value)
+
+    def sync(self) -> None:
+        """
+        Wait until everything journaled so far is durable. Must be called without self.lock held, so that other
+        requests can share the fsync.
+        :return: None
+        """
+
+        if self.storage is not None:
+            self.storage.sync()
+
+    @Pyro4.expose
     def get_status(self) -> Status:
         """
         :return: An arbitrary status
@@ -140,38 +489,282 @@ class Replica(object):
 
         return Status.random
 
+    @Pyro4.expose
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        :return: Counts of the queries and updates this RM has received, of those that had to wait for gossip, and of
+        background gossip rounds, along with the sizes of the update log and executed operation table, the hit ratio
+        and approximate memory use of the query cache, and the ratio and CPU time of gossip compression
+        """
+
+        with self.lock:
+
+            metrics = dict(self.metrics)
+
+            sent = self.metrics["gossip_bytes_sent"]
+            metrics["gossip_compression_ratio"] = self.metrics["gossip_packed_bytes_sent"] / sent if sent > 0 else 1.0
+
+            metrics["update_log"] = len(self._update_log)
+            metrics["executed_operation_table"] = len(self.executed_operation_table)
+
+            metrics["query_cache_hits"] = self.query_cache.hits
+            metrics["query_cache_misses"] = self.query_cache.misses
+            metrics["query_cache_hit_ratio"] = self.query_cache.hit_ratio
+            metrics["query_cache_entries"] = len(self.query_cache)
+            metrics["query_cache_bytes"] = self.query_cache.bytes
+
+            return metrics
+
+    @Pyro4.expose
+    def get_gossip(self, replica_id: str, replica_ts: Timestamp) -> Gossip:
+        """
+        Build a gossip message for another RM, containing only the Records it has not yet received.
+        :param replica_id: The ID of the RM requesting gossip
+        :param replica_ts: The replica timestamp of the RM requesting gossip
+        :return: A Gossip, containing the missing Records and this RM's replica timestamp
+        """
+
+        with self.lock:
+
+            self.timestamp_table[replica_id] = replica_ts  # The requesting RM has received at least this much
+
+            gossip = Gossip(self.id, self._update_log.missing(replica_ts), self._replica_timestamp.copy())
+
+        self.sync()  # Another RM must never hold a Record this RM could lose
+
+        return gossip
+
+    @Pyro4.expose
+    def get_compressed_gossip(self, replica_id: str, replica_ts: Timestamp, codecs: List[str]) -> CompressedGossip:
+        """
+        Build a gossip message for another RM, as get_gossip does, and compress it if it is at least
+        compression_threshold bytes. Only called by RMs that support compression; others call get_gossip.
+        :param replica_id: The ID of the RM requesting gossip
+        :param replica_ts: The replica timestamp of the RM requesting gossip
+        :param codecs: The codecs the RM requesting gossip can decompress, in its order of preference
+        :return: A CompressedGossip, containing the missing Records and this RM's replica timestamp
+        """
+
+        data = wire.pack(self.get_gossip(replica_id, replica_ts))  # Packed anyway, to be sent
+
+        start = time.thread_time()
+
+        compressed = CompressedGossip.compress(data, codecs, self.compression_threshold, COMPRESSION_LEVEL)
+
+        cpu = time.thread_time() - start
+
+        if compressed.codec is not None:
+            print("Compressed gossip for {0}: {1} -> {2} bytes ({3:.2f}x) in {4:.2f}ms".format(
+                replica_id, compressed.size, len(compressed.data), compressed.ratio, cpu * 1000))
+
+        with self.lock:
+
+            self.metrics["gossip_packed_bytes_sent"] += compressed.size
+            self.metrics["gossip_bytes_sent"] += len(compressed.data)
+            self.metrics["gossip_compression_cpu"] += cpu
+
+        return compressed
+
     def apply_gossip(self, replica: 'Replica'):
 
-        print("Gossiping with {0}".format(replica.id))
+        with self.lock:
+            replica_ts = self._replica_timestamp.copy()
+
+        if hasattr(replica, "get_compressed_gossip"):  # Pyro's metadata lists the methods the RM exposes
+
+            compressed: CompressedGossip = replica.get_compressed_gossip(self.id, replica_ts, list(CODECS))
+
+            start = time.thread_time()
+
+            data = compressed.decompress()
 
-        log: Log = replica.update_log  # The RM's update_log
-        ts: Timestamp = replica.replica_timestamp  # The RM's replica timestamp
-        old_log_length = len(self._update_log)
+            cpu = time.thread_time() - start
 
-        self._update_log.merge(log, self._replica_timestamp)  # Merge update logs
+            gossip: Gossip = wire.unpack(Gossip.read, data)  # Only the Records we are missing
+
+            if compressed.codec is not None:
+                print("Decompressed gossip from {0}: {1} -> {2} bytes ({3:.2f}x) in {4:.2f}ms".format(
+                    gossip.i, len(compressed.data), compressed.size, compressed.ratio, cpu * 1000))
+
+            with self.lock:
+
+                self.metrics["gossip_packed_bytes_received"] += compressed.size
+                self.metrics["gossip_bytes_received"] += len(compressed.data)
+                self.metrics["gossip_decompression_cpu"] += cpu
+
+        else:
+
+            gossip: Gossip = replica.get_gossip(self.id, replica_ts)  # A RM that doesn't support compression
+
+        with self.lock:
+            self.merge_gossip(gossip)
+
+    def pull_gossip(self, replica_id: str, uri: Pyro4.URI = None) -> None:
+        """
+        Fetch and apply gossip from a single RM, waiting at most gossip_timeout for it. Runs on the gossip pool.
+        :param replica_id: The ID of the RM to gossip with
+        :param uri: The Pyro URI of that RM, if already known
+        :return: None
+        """
 
-        print("Merging update logs ({} new record(s))".format(len(self._update_log) - old_log_length))
+        try:
+
+            if uri is None:
+                uri = self.ns.lookup(replica_id)  # Get the URI of the RM
+
+            with Pyro4.Proxy(uri) as replica:
+
+                replica._pyroTimeout = self.gossip_timeout
+
+                self.apply_gossip(replica)  # Apply gossip
+
+        except (NamingError, CommunicationError):
+
+            print("{} with required updates reporting Status.OFFLINE\n".format(replica_id))  # A replica with a
+            # required update is offline or too slow. Shouldn't matter, as requests are sent to multiple RMs when they
+            # are received at a FM.
+
+    def merge_gossip(self, gossip: Gossip) -> None:
+        """
+        Merge a gossip message into this RM's update log and replica timestamp, then apply any updates that are now
+        stable. Must be called with self.lock held.
+        :param gossip: A Gossip received from another RM
+        :return: None
+        """
+
+        print("Gossiping with {0}".format(gossip.i))
+
+        log: Log = gossip.log  # The Records in the RM's update log that this RM has not received
+        ts: Timestamp = gossip.ts  # The RM's replica timestamp
+
+        self.timestamp_table[gossip.i] = ts  # Update the timestamp table
+
+        duplicates = [record for record in log if self.is_duplicate(record)]
+
+        merged = self._update_log.merge(log, self._replica_timestamp)  # Merge update logs
+
+        print("Merging update logs ({} new record(s))".format(len(merged)))
+
+        for record in merged:
+            self.journal("record", record)
+
+        for record in duplicates:
+            self.journal("duplicate", record)
+
+        self._duplicates += duplicates
+
+        if (ts <= self._replica_timestamp) is False:
+            self.journal("ts", ts)
 
         self._replica_timestamp.merge(ts)  # Merge replica timestamps
 
         print("New replica timestamp", self._replica_timestamp)
 
+        self.apply_stable()
+
+    def apply_stable(self) -> None:
+        """
+        Apply the updates in this RM's update log that have become stable. Must be called with self.lock held.
+        :return: None
+        """
+
         stable: List[Record] = self._update_log.stable(self._replica_timestamp)  # Get stable records
-        applied_updates = 0
 
-        print()
+        # Apply those that have not already been applied, in a single transaction
+        records = [record for record in stable if record.id not in self.executed_operation_table]
+
+        # Those that have were applied under another RM's entry, and count towards the value timestamp all the same
+        for record in stable:
+
+            if record.id in self.executed_operation_table:
+                self.value_timestamp.merge(record.ts)
+
+        if len(records) > 0:
+            self.apply_updates(records)
+
+        waiting: List[Record] = []
+
+        for record in self._duplicates:
+
+            if record.ts <= self._replica_timestamp and record.id in self.executed_operation_table:
+
+                self.value_timestamp.merge(record.ts)
+
+            else:
+
+                waiting.append(record)
+
+        self._duplicates = waiting
+
+        print("\nApplied {} stable update(s)\n".format(len(records)))
+
+    def is_duplicate(self, record: Record) -> bool:
+        """
+        Must be called with self.lock held.
+        :param record: A Record received in gossip
+        :return: Whether it is a new copy of an update this RM already holds a copy of, accepted by another RM
+        """
+
+        held = self._update_log.get(record.id)
+
+        return held is not None and held.i != record.i and (record.ts <= self._replica_timestamp) is False
+
+    def registered(self, fresh: bool = False) -> Dict[str, str]:
+        """
+        The RMs registered with the name server, as listed within the last REGISTRY_TTL seconds.
+        :param fresh: Whether to list them again anyway
+        :return: The Pyro URI of every registered RM, including this one, keyed by its ID
+        """
+
+        now = time.monotonic()
+        registry = self._registry
+
+        if fresh or registry is None or registry[0] < now - REGISTRY_TTL:
+
+            registry = (now, self.ns.list(metadata_all={"resource:replica"}))
+
+            self._registry = registry
+
+        return registry[1]
+
+    def compact(self) -> Tuple[int, int]:
+        """
+        Discard Records from this RM's update log once the timestamp table shows that every known RM has received them.
+        An RM is known if it is registered with the name server or appears in this RM's replica timestamp. Nothing is
+        discarded until the timestamp table holds an entry for every known RM.
+        :return: The length of the update log before and after compaction
+        """
+
+        try:
 
-        for record in stable:  # Iterate through stable records
+            replica_ids = set(self.registered().keys())
 
-            if record.id not in self.executed_operation_table:  # If the record has not already been applied
+        except (NamingError, CommunicationError):
 
-                self.apply_update(record)  # Apply the update
+            size = len(self._update_log)
 
-                self.timestamp_table[id] = ts  # Update the timestamp table
+            return size, size  # Without the name server, we can't be sure we know every RM
 
-                applied_updates += 1
+        with self.lock:
 
-        print("Applied {} stable update(s)\n".format(applied_updates))
+            before = len(self._update_log)
+
+            replica_ids.update(self._replica_timestamp.replicas.keys())
+            replica_ids.discard(self.id)
+
+            if not replica_ids.issubset(self.timestamp_table.keys()):
+
+                return before, before  # Some RM has never gossiped with us, so we can't tell what it has received
+
+            timestamps = [self.value_timestamp] + [self.timestamp_table[replica_id] for replica_id in replica_ids]
+
+            self._update_log.truncate(timestamps, self.executed_operation_table)
+
+            after = len(self._update_log)
+
+        print("Compacted update log ({} record(s) before, {} after)\n".format(before, after))
+
+        return before, after
 
     def gossip(self, prev: Timestamp) -> None:
         """
@@ -180,35 +773,267 @@ class Replica(object):
         :return: None
         """
 
-        for replica_id in self._replica_timestamp.compare(prev):  # Iterate through a  list of RMs that this RM needs
-            # updates from
+        with self.lock:
+            replica_ids = list(self._replica_timestamp.compare(prev))  # RMs that this RM needs updates from
 
-            uri = self.ns.lookup(replica_id)  # Get the URI of the RM
+        # Fetch from every RM at once, merging each response as it arrives. Stop waiting as soon as this RM holds
+        # everything the FE has seen: any RMs still responding are merged in the background.
+        futures = [self._gossip_pool.submit(self.pull_gossip, replica_id) for replica_id in replica_ids]
 
-            try:
+        try:
+
+            for _ in as_completed(futures, timeout=self.gossip_timeout):
 
-                with Pyro4.Proxy(uri) as replica:
+                with self.lock:
 
-                    self.apply_gossip(replica)  # Apply gossip
+                    if prev <= self.value_timestamp:
+                        break
 
-            except CommunicationError:
+        except TimeoutError:
 
-                print("{} with required updates reporting Status.OFFLINE\n".format(replica_id))  # A replica with a
-                # required update is offline. Shouldn't matter, as requests are sent to multiple RMs when they are
-                # received at a FM.
+            print("Timed out waiting for gossip\n")
+
+        self.compact()
 
         print("Finished gossiping\n")
 
+    def select_peers(self, replica_ids: List[str]) -> List[str]:
+        """
+        Choose which RMs to gossip with in a background round, according to this RM's PeerSelection.
+        :param replica_ids: The IDs of all other registered RMs, sorted
+        :return: Up to gossip_fanout of those IDs
+        """
+
+        fanout = min(self.gossip_fanout, len(replica_ids))
+
+        if self.peer_selection is PeerSelection.RANDOM:
+
+            return random.sample(replica_ids, fanout)
+
+        start = self._next_peer  # PeerSelection.ROUND_ROBIN: carry on from where the last round stopped
+        self._next_peer += fanout
+
+        return [replica_ids[(start + i) % len(replica_ids)] for i in range(fanout)]
+
+    def gossip_round(self) -> None:
+        """
+        A single round of background (anti-entropy) gossip. Pulls updates from gossip_fanout other RMs, so that this RM
+        converges ahead of the requests that would otherwise have to wait for it to gossip.
+        :return: None
+        """
+
+        try:
+
+            replicas = self.registered(fresh=True)  # Get all registered replicas
+
+        except (NamingError, CommunicationError) as e:
+
+            print("Background gossip failed:", e)
+
+            return
+
+        replica_ids = sorted(replica_id for replica_id in replicas.keys() if replica_id != self.id)
+
+        wait([self._gossip_pool.submit(self.pull_gossip, replica_id, replicas[replica_id])
+              for replica_id in self.select_peers(replica_ids)])
+
+        self.compact()
+
+        with self.lock:
+            self.metrics["gossip_rounds"] += 1
+
+    def _gossip_loop(self) -> None:
+        """
+        Run background gossip rounds every gossip_interval seconds, until stop_gossip is called.
+        :return: None
+        """
+
+        while not self._stop_gossip.wait(self.gossip_interval):
+
+            self.gossip_round()
+
+    def start_gossip(self) -> None:
+        """
+        Start background gossip, unless gossip_interval is 0.
+        :return: None
+        """
+
+        if self.gossip_interval <= 0 or self._gossip_thread is not None:
+            return
+
+        self._stop_gossip.clear()
+        self._gossip_thread = threading.Thread(target=self._gossip_loop, daemon=True)
+        self._gossip_thread.start()
+
+    def stop_gossip(self) -> None:
+        """
+        Stop background gossip, waiting for the current round to finish.
+        :return: None
+        """
+
+        if self._gossip_thread is None:
+            return
+
+        self._stop_gossip.set()
+        self._gossip_thread.join()
+        self._gossip_thread = None
+
+    def recover(self) -> None:
+        """
+        Restore a persistent RM's state from its latest checkpoint, then replay the journal written since, in order.
+        Called once, when the RM is created.
+        :return: None
+        """
+
+        storage, self.storage = self.storage, None  # Replayed changes are already in the journal
+
+        path, state, entries = storage.load()
+
+        with self.lock:
+
+            if state is not None:
+
+                self.database = DB(path)
+                self.value_timestamp = state["value_ts"]
+                self._replica_timestamp = state["replica_ts"]
+                self.executed_operation_table = state["executed_operation_table"]
+                self._update_log = state["update_log"]
+                self._duplicates = state.get("duplicates", [])  # Not held by older checkpoints
+
+            self.database.connection  # Load the value now, as the checkpoint may be replaced once the RM is running
+
+            for entry in entries:
+
+                kind, value = entry["kind"], entry["value"]
+
+                if kind == "record":
+
+                    self._update_log += value
+
+                    # Only this RM's own entry is taken from the records it accepted; entries for other RMs come from
+                    # the "ts" entries, as a record's timestamp also holds the prev it depended on
+                    if value.i == self.id:
+                        self._replica_timestamp[self.id] = max(self._replica_timestamp[self.id], value.ts[self.id])
+
+                elif kind == "ts":
+
+                    self._replica_timestamp.merge(value)
+
+                elif kind == "duplicate":
+
+                    self._duplicates.append(value)
+
+                elif kind == "apply":
+
+                    records = [self._update_log.get(id) for id in value]
+
+                    self.apply_updates([record for record in records if record is not None])
+
+            self.storage = storage
+
+            self.apply_stable()
+
+        print("Recovered {0} at {1}\n".format(self.id, self.value_timestamp))
+
+    def rejoin(self) -> None:
+        """
+        Pull gossip from every other registered RM. A restarted RM does this before it takes requests, to catch up on
+        what it missed while it was stopped.
+        :return: None
+        """
+
+        try:
+
+            replicas = self.registered(fresh=True)
+
+        except (NamingError, CommunicationError) as e:
+
+            print("Rejoining failed:", e)
+
+            return
+
+        wait([self._gossip_pool.submit(self.pull_gossip, replica_id, uri)
+              for (replica_id, uri) in replicas.items() if replica_id != self.id])
+
+    def checkpoint(self) -> None:
+        """
+        Checkpoint a persistent RM's value and state, if anything has changed since the last checkpoint. The snapshot is
+        taken with self.lock held, but written to disk without it.
+        :return: None
+        """
+
+        if self.storage is None or not self.storage.dirty:
+            return
+
+        with self.lock:
+
+            snapshot = self.database.copy()
+            state = encode({
+                "value_ts": self.value_timestamp,
+                "replica_ts": self._replica_timestamp,
+                "executed_operation_table": self.executed_operation_table,
+                "update_log": self._update_log,
+                "duplicates": self._duplicates
+            })
+
+            number = self.storage.rotate()
+
+        self.storage.write_checkpoint(number, snapshot, state)
+
+    def _checkpoint_loop(self) -> None:
+        """
+        Checkpoint every checkpoint_interval seconds, until stop_checkpoints is called.
+        :return: None
+        """
+
+        while not self._stop_checkpoints.wait(self.checkpoint_interval):
+
+            self.checkpoint()
+
+    def start_checkpoints(self) -> None:
+        """
+        Start checkpointing in the background, if this RM is persistent and checkpoint_interval isn't 0.
+        :return: None
+        """
+
+        if self.storage is None or self.checkpoint_interval <= 0 or self._checkpoint_thread is not None:
+            return
+
+        self._stop_checkpoints.clear()
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+        self._checkpoint_thread.start()
+
+    def stop_checkpoints(self) -> None:
+        """
+        Stop checkpointing in the background, waiting for the current checkpoint to finish.
+        :return: None
+        """
+
+        if self._checkpoint_thread is None:
+            return
+
+        self._stop_checkpoints.set()
+        self._checkpoint_thread.join()
+        self._checkpoint_thread = None
+
 
 if __name__ == '__main__':
     print("Creating replica...")
 
+    directory = sys.argv[1] if len(sys.argv) >= 2 else None  # Keep state on disk, if given a directory
+
     daemon = Pyro4.Daemon()
-    replica = Replica()
+    replica = Replica(directory=directory)
+
+    if replica.storage is not None:
+        replica.rejoin()  # Catch up on anything missed since the RM last ran
 
     uri = daemon.register(replica)
     replica.ns.register(replica.id, uri, metadata={"resource:replica"})
 
     print("{0} running".format(replica.id), end="\n\n")
 
+    replica.start_gossip()
+    replica.start_checkpoints()
+
     daemon.requestLoop()
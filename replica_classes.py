@@ -1,22 +1,39 @@
-from typing import List, Dict
-
+import bisect
+import heapq
+import sys
+import zlib
+from collections import OrderedDict
+from itertools import count
+from typing import List, Dict, Iterator, Container, Tuple, Set, Optional, Any, Hashable, Callable
+
+import serpent
 from Pyro4.util import SerializerBase
 
+import wire
+from enums import Operation
 from requests import ClientRequest
 from timestamp import Timestamp
 
+# The codecs gossip may be compressed with, by name, in order of preference. Each is a function compressing bytes at a
+# given level, and one decompressing them. A RM asking for compressed gossip lists those it can decompress.
+CODECS: Dict[str, Tuple[Callable[[bytes, int], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (zlib.compress, zlib.decompress)
+}
+
 
 class Record:
     """
     Represents an update request received from an FE. Stored in an RM's update log.
     """
 
-    def __init__(self, i: str, ts: Timestamp, request: ClientRequest, prev: Timestamp, id: str):
+    def __init__(self, i: str, ts: Timestamp, request: ClientRequest, prev: Timestamp, id: str,
+                 floor: Optional[int] = None):
         self.i = i  # ID of the RM that received the update request
         self.ts = ts  # RM's replica timestamp IF update is applied
         self.request = request  # Actual request from the client
         self.prev = prev  # Timestamp sent from the FE
         self.id = id  # Unique ID of the update, generated by the FE
+        self.floor = floor  # The FE's lowest outstanding sequence number when it sent the update, if it sent one
 
     def __str__(self):
         return str(self.to_dict())
@@ -24,9 +41,40 @@ class Record:
     def __eq__(self, other: 'Record') -> bool:
         return other.id is self.id
 
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        writer.string(self.i)
+        self.ts.write(writer)
+        self.request.write(writer)
+        self.prev.write(writer)
+        writer.identifier(self.id)
+        writer.uint(self.floor if self.floor is not None else 0)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'Record':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A Record
+        """
+
+        i = reader.string()
+        ts = Timestamp.read(reader)
+        request = ClientRequest.read(reader)
+        prev = Timestamp.read(reader)
+        id = reader.identifier()
+        floor = reader.uint() if reader.version >= 2 else 0
+
+        return Record(i, ts, request, prev, id, floor if floor > 0 else None)
+
     def to_dict(self) -> Dict:
         """
-        Used for serpent serialisation
+        The readable form of this Record, as it was sent before Records were packed
         :return: A dict representing this Record
         """
 
@@ -36,13 +84,14 @@ class Record:
             "ts": self.ts.to_dict(),
             "request": self.request.to_dict(),
             "prev": self.prev.to_dict(),
-            "id": self.id
+            "id": self.id,
+            "floor": self.floor
         }
 
     @staticmethod
     def from_dict(classname: 'str', dict: Dict) -> 'Record':
         """
-        Used for serpent deserialisation
+        Used to receive Records sent in their readable form
         :return: A Record
         """
 
@@ -51,7 +100,8 @@ class Record:
             Timestamp.from_dict("Timestamp", dict["ts"]),
             ClientRequest.from_dict("ClientRequest", dict["request"]),
             Timestamp.from_dict("Timestamp", dict["prev"]),
-            dict["id"]
+            dict["id"],
+            dict.get("floor")
         )
 
 
@@ -63,11 +113,33 @@ class Log:
      by all other RMs.
 
      An update is stable if it can be applied with the desired ordering.
+
+     Records are indexed by their unique ID, so membership checks and merges take constant time per Record. Each RM's
+     Records are also kept in the order of that RM's entry in their Timestamp, which is the order in which it accepted
+     them.
+
+     Records that are not yet stable wait on one entry of the replica Timestamp that they are missing, so finding the
+     Records that have become stable only touches those whose awaited entry has been reached.
      """
 
     def __init__(self, records=None):
 
-        self.records: List[Record] = [] if records is None else records
+        self._records: Dict[str, Record] = {}  # Records, keyed by their unique ID, in the order they were added
+        self._origins: Dict[str, List[Record]] = {}  # Records, keyed by the ID of the RM that received them
+        self._origin_keys: Dict[str, List[int]] = {}  # The receiving RM's Timestamp entry for each Record in _origins
+
+        self._unchecked: List[Record] = []  # Records added since stable was last called
+        self._waiting: Dict[str, List[Tuple[int, int, Record]]] = {}  # Heaps of unstable Records, keyed by the ID of
+        # the RM whose replica Timestamp entry they are waiting for, and ordered by the entry they are waiting for
+        self._sequence = count()  # Breaks ties in _waiting, so that Records are never compared
+
+        for record in [] if records is None else records:
+            self.add(record)
+
+    @property
+    def records(self) -> List[Record]:
+
+        return list(self._records.values())
 
     def __str__(self):
 
@@ -75,70 +147,220 @@ class Log:
 
     def __len__(self):
 
-        return len(self.records)
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Record]:
+
+        return iter(self._records.values())
 
     def __iadd__(self, record: Record):
 
-        self.records.append(record)
+        self.add(record)
 
         return self
 
     def __contains__(self, record_id: str):
 
-        for record in self.records:
+        return record_id in self._records
+
+    def add(self, record: Record) -> None:
+        """
+        Adds a Record to the Log, unless a Record with the same ID is already held.
+        :param record: The Record to add
+        :return: None
+        """
+
+        if record.id in self._records:
+            return
+
+        self._records[record.id] = record
+        self._unchecked.append(record)
+
+        origin = self._origins.setdefault(record.i, [])
+        keys = self._origin_keys.setdefault(record.i, [])
+        key = record.ts[record.i]
+
+        if len(keys) == 0 or key >= keys[-1]:  # The usual case: an RM's Records arrive in the order it accepted them
+
+            origin.append(record)
+            keys.append(key)
+
+        else:
 
-            if record_id == record.id:
-                return True
+            index = bisect.bisect_right(keys, key)
 
-        return False
+            origin.insert(index, record)
+            keys.insert(index, key)
+
+    def get(self, record_id: str) -> Optional[Record]:
+        """
+        :param record_id: The unique ID of a Record
+        :return: The Record with that ID, or None if it isn't held
+        """
+
+        return self._records.get(record_id)
+
+    def origin(self, i: str) -> List[Record]:
+        """
+        :param i: The ID of an RM
+        :return: The Records received by that RM, in the order it accepted them
+        """
+
+        return list(self._origins.get(i, []))
+
+    def truncate(self, timestamps: List[Timestamp], applied: Container[str]) -> int:
+        """
+        Discards Records that every RM is known to have received. A Record r received by RM i may be discarded once
+        ts[i] >= r.ts[i] for every Timestamp ts given, and once it has been applied to the value of the RM that owns
+        this Log. Each RM's Records are discarded in the order that RM accepted them.
+        :param timestamps: The replica Timestamps of every known RM, as held in the owning RM's timestamp table
+        :param applied: The IDs of the Records that have been applied to the owning RM's value
+        :return: The number of Records discarded
+        """
+
+        discarded = 0
+
+        for (i, keys) in self._origin_keys.items():
+
+            known = min(ts[i] for ts in timestamps)  # The highest entry every RM has received from i
+            origin = self._origins[i]
+            count = 0
+
+            for key, record in zip(keys, origin):
+
+                if key > known or record.id not in applied:
+                    break
+
+                del self._records[record.id]
+
+                count += 1
+
+            del origin[:count]
+            del keys[:count]
+
+            discarded += count
+
+        return discarded
+
+    def missing(self, replica_ts: Timestamp) -> 'Log':
+        """
+        Gets the Records that an RM with the given replica Timestamp has not yet received. A Record r received by RM i
+        has been received by that RM if replica_ts[i] >= r.ts[i]. Used to send only the gap in gossip messages.
+        :param replica_ts: The replica Timestamp of the RM requesting gossip
+        :return: A Log of the Records not covered by replica_ts
+        """
+
+        records: List[Record] = []
+
+        for (i, keys) in self._origin_keys.items():
+
+            index = bisect.bisect_right(keys, replica_ts[i])
+
+            records.extend(self._origins[i][index:])
+
+        return Log(records)
 
     def stable(self, replica_ts: Timestamp) -> List[Record]:
         """
-        When new Records have been merged into the Log, the RM collects any updates that are now stable.
+        When new Records have been merged into the Log, the RM collects any updates that are now stable. Only Records
+        added since the last call, or whose awaited entry replica_ts has now reached, are checked, and each Record is
+        returned once.
         :param replica_ts: The replica Timestamp of the RM that owns this Log.
-        :return: A List of stable Records, sorted by the partial order <= defined between Timestamps.
+        :return: A List of the Records that have become stable, in an order consistent with the partial order <=
+        defined between Timestamps.
         """
 
-        stable: [Record] = []
+        candidates: List[Record] = self._unchecked
+        self._unchecked = []
+
+        for (i, waiting) in self._waiting.items():
+
+            value = replica_ts[i]
+
+            while len(waiting) > 0 and waiting[0][0] <= value:  # This Record's awaited entry has been reached
+
+                candidates.append(heapq.heappop(waiting)[2])
+
+        stable: List[Record] = []
 
-        for record in self.records:
+        for record in candidates:
+
+            if record.id not in self._records:
+                continue  # Discarded by truncate
+
+            missing = next(replica_ts.compare(record.ts), None)  # An entry this Record is still waiting for
+
+            if missing is None:
 
-            if record.ts <= replica_ts:
                 stable.append(record)
 
-        return sorted(stable, key=lambda record: record.ts)
+            else:
+
+                heapq.heappush(self._waiting.setdefault(missing, []),
+                               (record.ts[missing], next(self._sequence), record))
+
+        # If r.ts < s.ts, the sum of r.ts's entries is less than that of s.ts's, so r comes before s
+        return sorted(stable, key=lambda record: record.ts.total())
 
-    def merge(self, log: 'Log', replica_ts: Timestamp) -> None:
+    def merge(self, log: 'Log', replica_ts: Timestamp) -> List[Record]:
         """
         Merges another Log in-place. A Record r in the Log is merged unless record.ts <= replica_ts, in which case
         it is already in the Log or it has bee applied to the RM's value and then discarded
         :param log: The Log to be merged into this one
         :param replica_ts: The replica Timestamp of the RM that owns this Log.
+        :return: The Records that were merged
+        """
+
+        merged: List[Record] = []
+
+        for record in log:
+
+            if record.id not in self._records and (record.ts <= replica_ts) is False:
+
+                self.add(record)
+
+                merged.append(record)
+
+        return merged
+
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation. Writes the number of Records, then each Record. The replica and FE IDs shared by
+        the Records are only written in full once.
+        :param writer: The Writer to write to
         :return: None
         """
 
-        for record in log.records:
+        writer.uint(len(self._records))
+
+        for record in self._records.values():
+            record.write(writer)
 
-            if (record.ts <= replica_ts) is False:
+    @staticmethod
+    def read(reader: wire.Reader) -> 'Log':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A Log
+        """
 
-                if not (record.id in self):
-                    self.records.append(record)
+        return Log([Record.read(reader) for _ in range(reader.uint())])
 
     def to_dict(self) -> Dict:
         """
-        Used for serpent serialisation
+        The readable form of this Log, as it was sent before Logs were packed
         :return: A dict representing this Log
         """
 
         return {
             "__class__": "Log",
-            "records": [record.to_dict() for record in self.records]
+            "records": [record.to_dict() for record in self._records.values()]
         }
 
     @staticmethod
     def from_dict(classname: str, dict: Dict) -> 'Log':
         """
-        Used for serpent deserialisation
+        Used to receive Logs sent in their readable form
         :return: A Log
         """
 
@@ -147,8 +369,400 @@ class Log:
         )
 
 
-SerializerBase.register_class_to_dict(Record, Record.to_dict)
-SerializerBase.register_dict_to_class("Record", Record.from_dict)
+class ExecutedOperationTable:
+    """
+    Holds the unique IDs of the updates that have been applied to an RM's value. A Frontend gives its updates the IDs
+    "<frontend ID>:1", "<frontend ID>:2", and so on, so rather than every ID, the table keeps a watermark for each FE,
+    below which every update has been applied, along with the few updates applied ahead of it. Updates from one FE can
+    only be applied out of order while an earlier one is still on its way through gossip, so that set stays small.
+    IDs that don't carry a sequence number are held as they are.
+
+    An update that never reached a RM leaves a gap that gossip never fills. So that the updates applied ahead of it
+    don't pile up, each update carries the FE's floor: its lowest sequence number that was still outstanding when it
+    sent the update. Every earlier update had either been acknowledged, and so is reflected in the update's prev, or
+    never reached any RM; the FE keeps sending an update that may have reached one until it is acknowledged. Once an
+    update has been applied along with everything in its prev, the watermark is raised to below its floor, closing any
+    gaps left by failed updates.
+    """
+
+    def __init__(self):
+
+        self._watermarks: Dict[str, int] = {}  # Every update from the FE up to this sequence number has been applied
+        self._ahead: Dict[str, Set[int]] = {}  # Sequence numbers from the FE applied above its watermark
+        self._unsequenced: Set[str] = set()  # IDs without a sequence number
+
+    def __len__(self):
+
+        return len(self._watermarks) + sum(len(ahead) for ahead in self._ahead.values()) + len(self._unsequenced)
+
+    def __contains__(self, id: str):
+
+        origin, sequence = self.parse(id)
+
+        if sequence is None:
+            return id in self._unsequenced
+
+        return sequence <= self._watermarks.get(origin, 0) or sequence in self._ahead.get(origin, ())
+
+    def add(self, id: str, floor: Optional[int] = None) -> None:
+        """
+        Records that an update has been applied.
+        :param id: The unique ID of the update
+        :param floor: If given, every update from the same FE numbered below it has been applied or will never be
+        :return: None
+        """
+
+        origin, sequence = self.parse(id)
+
+        if sequence is None:
+
+            self._unsequenced.add(id)
+
+            return
+
+        watermark = self._watermarks.get(origin, 0)
+        ahead = self._ahead.get(origin, set())
+
+        if floor is not None and floor - 1 > watermark:
+
+            watermark = floor - 1  # Skip the gaps left by updates that failed
+            ahead = {n for n in ahead if n > watermark}
+
+        if sequence > watermark:
+            ahead.add(sequence)  # Applied ahead of the watermark, unless it fills the gap above it
+
+        while watermark + 1 in ahead:  # Close the gap this update filled
+
+            watermark += 1
+            ahead.remove(watermark)
+
+        if watermark > 0:
+            self._watermarks[origin] = watermark
+
+        if len(ahead) > 0:
+
+            self._ahead[origin] = ahead
+
+        else:
+
+            self._ahead.pop(origin, None)
+
+    @staticmethod
+    def parse(id: str) -> Tuple[str, Optional[int]]:
+        """
+        Splits an update ID into the ID of the FE that sent it and its sequence number.
+        :param id: The unique ID of the update
+        :return: The FE ID and sequence number, or the ID and None if it has no sequence number
+        """
+
+        origin, _, sequence = id.rpartition(":")
+
+        if origin == "" or not sequence.isdigit():
+            return id, None
+
+        return origin, int(sequence)
+
+    def to_dict(self) -> Dict:
+        """
+        Used for serpent serialisation
+        :return: A dict representing this ExecutedOperationTable
+        """
+
+        return {
+            "__class__": "ExecutedOperationTable",
+            "watermarks": dict(self._watermarks),
+            "ahead": {origin: sorted(ahead) for (origin, ahead) in self._ahead.items()},
+            "unsequenced": sorted(self._unsequenced)
+        }
+
+    @staticmethod
+    def from_dict(classname: str, dict: Dict) -> 'ExecutedOperationTable':
+        """
+        Used for serpent deserialisation
+        :return: An ExecutedOperationTable
+        """
+
+        table = ExecutedOperationTable()
+
+        table._watermarks = {origin: int(watermark) for (origin, watermark) in dict["watermarks"].items()}
+        table._ahead = {origin: set(ahead) for (origin, ahead) in dict["ahead"].items()}
+        table._unsequenced = set(dict["unsequenced"])
+
+        return table
+
+
+class QueryCache:
+    """
+    A bounded, least-recently-used cache of query results, kept by an RM in step with its value. Each READ, AVERAGE and
+    ALL query is keyed by the rating, movie or user it reads, so an update to a rating invalidates exactly the cached
+    results it could change: the rating itself, its movie's average, and its user's ratings.
+    """
+
+    def __init__(self, capacity: int):
+
+        self.capacity = capacity  # The most results held at once
+
+        self._results: OrderedDict = OrderedDict()  # Results, keyed as below, least recently used first
+        self._sizes: Dict[Hashable, int] = {}  # The approximate size of each result and its key, in bytes
+
+        self.bytes = 0  # The approximate size of everything held, in bytes
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+
+        return len(self._results)
+
+    @property
+    def hit_ratio(self) -> float:
+
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    @staticmethod
+    def key(request: ClientRequest) -> Optional[Hashable]:
+        """
+        :param request: A ClientRequest
+        :return: The key its result is cached under, or None if it isn't a query
+        """
+
+        params = request.params
+
+        if request.method == Operation.READ:
+            return Operation.READ, params["user_id"], params["movie_id"]
+
+        if request.method == Operation.AVERAGE:
+            return Operation.AVERAGE, params["movie_id"]
+
+        if request.method == Operation.ALL:
+            return Operation.ALL, params["user_id"]
+
+        return None
+
+    @staticmethod
+    def size(value: Any) -> int:
+        """
+        :param value: A key or result
+        :return: Its approximate size, including that of the values it holds, in bytes
+        """
+
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(QueryCache.size(item) for item in value)
+
+        return sys.getsizeof(value)
+
+    def get(self, request: ClientRequest) -> Optional[Any]:
+        """
+        :param request: A ClientRequest
+        :return: The cached result of the query, or None if it isn't held
+        """
+
+        key = self.key(request)
+        result = self._results.get(key) if key is not None else None
+
+        if result is None:
+
+            self.misses += 1
+
+            return None
+
+        self.hits += 1
+        self._results.move_to_end(key)
+
+        return result
+
+    def put(self, request: ClientRequest, result: Any) -> None:
+        """
+        Cache the result of a query, discarding the least recently used results if the cache is full.
+        :param request: A ClientRequest
+        :param result: Its result, as of the RM's current value
+        :return: None
+        """
+
+        key = self.key(request)
+
+        if key is None or result is None or self.capacity <= 0:
+            return
+
+        self.discard(key)
+
+        self._results[key] = result
+        self._sizes[key] = self.size(key) + self.size(result)
+        self.bytes += self._sizes[key]
+
+        while len(self._results) > self.capacity:
+            self.discard(next(iter(self._results)))
+
+    def discard(self, key: Hashable) -> None:
+
+        if key in self._results:
+
+            del self._results[key]
+
+            self.bytes -= self._sizes.pop(key)
+
+    def invalidate(self, request: ClientRequest) -> None:
+        """
+        Discard the cached results that an update could change. Called before the update is applied.
+        :param request: The ClientRequest of a CREATE, UPDATE or DELETE
+        :return: None
+        """
+
+        user_id, movie_id = request.params.get("user_id"), request.params.get("movie_id")
+
+        self.discard((Operation.READ, user_id, movie_id))
+        self.discard((Operation.AVERAGE, movie_id))
+        self.discard((Operation.ALL, user_id))
+
+
+class Gossip:
+    """
+    Represents a gossip message from one RM to another. Contains only the Records the receiving RM is missing, along
+    with the sending RM's replica Timestamp.
+    """
+
+    def __init__(self, i: str, log: Log, ts: Timestamp):
+        self.i = i  # ID of the RM that sent the gossip
+        self.log = log  # Records the receiving RM has not yet received
+        self.ts = ts  # Replica timestamp of the RM that sent the gossip
+
+    def __str__(self):
+        return str(self.to_dict())
+
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        writer.string(self.i)
+        self.log.write(writer)
+        self.ts.write(writer)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'Gossip':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A Gossip
+        """
+
+        i = reader.string()
+        log = Log.read(reader)
+
+        return Gossip(i, log, Timestamp.read(reader))
+
+    def to_dict(self) -> Dict:
+        """
+        The readable form of this Gossip, as it was sent before Gossip was packed
+        :return: A dict representing this Gossip
+        """
+
+        return {
+            "__class__": "Gossip",
+            "i": self.i,
+            "log": self.log.to_dict(),
+            "ts": self.ts.to_dict()
+        }
+
+    @staticmethod
+    def from_dict(classname: str, dict: Dict) -> 'Gossip':
+        """
+        Used to receive Gossip sent in its readable form
+        :return: A Gossip
+        """
+
+        return Gossip(
+            dict["i"],
+            Log.from_dict("Log", dict["log"]),
+            Timestamp.from_dict("Timestamp", dict["ts"])
+        )
+
+
+class CompressedGossip:
+    """
+    A Gossip, packed and, if it is large enough to be worth it, compressed. Sent in place of a Gossip to RMs that ask
+    for it, so that catch-up transfers of many Records take less bandwidth.
+    """
+
+    def __init__(self, codec: Optional[str], data: bytes, size: int):
+        self.codec = codec  # The codec the packed Gossip was compressed with, or None if it wasn't compressed
+        self.data = data  # The packed Gossip, compressed with that codec
+        self.size = size  # The size of the packed Gossip before it was compressed
+
+    @property
+    def ratio(self) -> float:
+        """
+        :return: The size of the packed Gossip over its size as sent
+        """
+
+        return self.size / len(self.data) if len(self.data) > 0 else 1.0
+
+    @staticmethod
+    def compress(data: bytes, codecs: List[str], threshold: Optional[int], level: int) -> 'CompressedGossip':
+        """
+        Compress a packed Gossip with the first of `codecs` that this RM supports, if it is at least `threshold` bytes.
+        Smaller Gossip isn't worth the CPU time.
+        :param data: The packed Gossip, from wire.pack
+        :param codecs: The codecs the receiving RM can decompress, in its order of preference
+        :param threshold: The smallest packed Gossip, in bytes, that is compressed. None never compresses.
+        :param level: The compression level
+        :return: A CompressedGossip
+        """
+
+        size = len(data)
+        codec = None
+
+        if threshold is not None and size >= threshold:
+            codec = next((codec for codec in codecs if codec in CODECS), None)
+
+        if codec is not None:
+            data = CODECS[codec][0](data, level)
+
+        return CompressedGossip(codec, data, size)
+
+    def decompress(self) -> bytes:
+        """
+        :return: The packed Gossip, to be read with wire.unpack
+        """
+
+        return self.data if self.codec is None else CODECS[self.codec][1](self.data)
+
+    def to_dict(self) -> Dict:
+        """
+        Used for serpent serialisation
+        :return: A dict representing this CompressedGossip
+        """
+
+        return {
+            "__class__": "CompressedGossip",
+            "codec": self.codec,
+            "data": self.data,
+            "size": self.size
+        }
+
+    @staticmethod
+    def from_dict(classname: str, dict: Dict) -> 'CompressedGossip':
+        """
+        Used for serpent deserialisation
+        :return: A CompressedGossip
+        """
+
+        return CompressedGossip(
+            dict["codec"],
+            serpent.tobytes(dict["data"]),  # Serpent sends bytes as base64
+            dict["size"]
+        )
+
+
+wire.register(Record)
+wire.register(Log)
+wire.register(Gossip)
+
+SerializerBase.register_class_to_dict(ExecutedOperationTable, ExecutedOperationTable.to_dict)
+SerializerBase.register_dict_to_class("ExecutedOperationTable", ExecutedOperationTable.from_dict)
 
-SerializerBase.register_class_to_dict(Log, Log.to_dict)
-SerializerBase.register_dict_to_class("Log", Log.from_dict)
+SerializerBase.register_class_to_dict(CompressedGossip, CompressedGossip.to_dict)
+SerializerBase.register_dict_to_class("CompressedGossip", CompressedGossip.from_dict)
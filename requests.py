@@ -1,8 +1,7 @@
 import uuid
-from typing import Dict, Any
-
-from Pyro4.util import SerializerBase
+from typing import Dict, Any, List, Optional
 
+import wire
 from enums import Operation
 from timestamp import Timestamp
 
@@ -22,9 +21,31 @@ class ClientRequest:
             "params": self.params
         })
 
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        writer.string(self.method.value)
+        writer.value(self.params)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'ClientRequest':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A ClientRequest
+        """
+
+        method = Operation(reader.string())
+
+        return ClientRequest(method, reader.value())
+
     def to_dict(self) -> Dict:
         """
-        Used for serpent serialisation
+        The readable form of this ClientRequest, as it was sent before ClientRequests were packed
         :return: A dict representing this ClientRequest
         """
 
@@ -37,7 +58,7 @@ class ClientRequest:
     @staticmethod
     def from_dict(classname: str, dict: Dict):
         """
-        Used for serpent deserialisation
+        Used to receive ClientRequests sent in their readable form
         :return: A ClientRequest
         """
 
@@ -52,10 +73,11 @@ class FrontendRequest:
     Represents a request from a FE to a RM.
     """
 
-    def __init__(self, prev: Timestamp, request: ClientRequest, id: str = None):
+    def __init__(self, prev: Timestamp, request: ClientRequest, id: str = None, floor: Optional[int] = None):
         self.id = id if id is not None else str(uuid.uuid4())
         self.prev = prev
         self.request = request
+        self.floor = floor  # The FE's lowest outstanding sequence number, sent with updates
 
     def __str__(self):
         dict = self.to_dict()
@@ -63,9 +85,36 @@ class FrontendRequest:
 
         return str(dict)
 
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        self.prev.write(writer)
+        self.request.write(writer)
+        writer.identifier(self.id)
+        writer.uint(self.floor if self.floor is not None else 0)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'FrontendRequest':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A FrontendRequest
+        """
+
+        prev = Timestamp.read(reader)
+        request = ClientRequest.read(reader)
+        id = reader.identifier()
+        floor = reader.uint() if reader.version >= 2 else 0
+
+        return FrontendRequest(prev, request, id, floor if floor > 0 else None)
+
     def to_dict(self) -> Dict:
         """
-        Used for serpent serialisation
+        The readable form of this FrontendRequest, as it was sent before FrontendRequests were packed
         :return: A dict representing this FrontendRequest
         """
 
@@ -73,20 +122,22 @@ class FrontendRequest:
             "__class__": "FrontendRequest",
             "prev": self.prev.to_dict(),
             "request": self.request.to_dict(),
-            "id": self.id
+            "id": self.id,
+            "floor": self.floor
         }
 
     @staticmethod
     def from_dict(classname: str, dict: Dict) -> 'FrontendRequest':
         """
-        Used for serpent deserialisation
+        Used to receive FrontendRequests sent in their readable form
         :return: A FrontendRequest
         """
 
         return FrontendRequest(
             Timestamp.from_dict("Timestamp", dict["prev"]),
             ClientRequest.from_dict("ClientRequest", dict["request"]),
-            dict["id"]
+            dict["id"],
+            dict.get("floor")
         )
 
 
@@ -105,9 +156,31 @@ class ReplicaResponse:
 
         return str(dict)
 
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        writer.value(self.value)
+        self.label.write(writer)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'ReplicaResponse':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A ReplicaResponse
+        """
+
+        value = reader.value()
+
+        return ReplicaResponse(value, Timestamp.read(reader))
+
     def to_dict(self):
         """
-        Used for serpent serialisation
+        The readable form of this ReplicaResponse, as it was sent before ReplicaResponses were packed
         :return: A dict representing this ReplicaResponse
         """
 
@@ -120,7 +193,7 @@ class ReplicaResponse:
     @staticmethod
     def from_dict(classname: str, dict: Dict):
         """
-        Used for serpent deserialisation
+        Used to receive ReplicaResponses sent in their readable form
         :return: A ReplicaResponse
         """
 
@@ -130,11 +203,157 @@ class ReplicaResponse:
         )
 
 
-SerializerBase.register_class_to_dict(ClientRequest, ClientRequest.to_dict)
-SerializerBase.register_dict_to_class("ClientRequest", ClientRequest.from_dict)
+class FrontendBatchRequest:
+    """
+    Represents a batch of requests from a FE to a RM, sent under a single FE timestamp. The requests are either all
+    queries or all updates, and are executed in order.
+    """
+
+    def __init__(self, prev: Timestamp, requests: List[ClientRequest], ids: List[str] = None,
+                 floor: Optional[int] = None):
+        self.ids = ids if ids is not None else [str(uuid.uuid4()) for _ in requests]  # The unique ID of each request
+        self.prev = prev
+        self.requests = requests
+        self.floor = floor  # The FE's lowest outstanding sequence number, sent with updates
+
+    def __str__(self):
+        dict = self.to_dict()
+        del dict["__class__"]
+
+        return str(dict)
+
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation. Writes the number of requests, then each request followed by its ID, then the
+        floor.
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        self.prev.write(writer)
+        writer.uint(len(self.requests))
+
+        for (request, id) in zip(self.requests, self.ids):
+
+            request.write(writer)
+            writer.identifier(id)
+
+        writer.uint(self.floor if self.floor is not None else 0)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'FrontendBatchRequest':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A FrontendBatchRequest
+        """
+
+        prev = Timestamp.read(reader)
+        requests: List[ClientRequest] = []
+        ids: List[str] = []
+
+        for _ in range(reader.uint()):
+
+            requests.append(ClientRequest.read(reader))
+            ids.append(reader.identifier())
+
+        floor = reader.uint() if reader.version >= 2 else 0
+
+        return FrontendBatchRequest(prev, requests, ids, floor if floor > 0 else None)
+
+    def to_dict(self) -> Dict:
+        """
+        The readable form of this FrontendBatchRequest, as it was sent before FrontendBatchRequests were packed
+        :return: A dict representing this FrontendBatchRequest
+        """
+
+        return {
+            "__class__": "FrontendBatchRequest",
+            "prev": self.prev.to_dict(),
+            "requests": [request.to_dict() for request in self.requests],
+            "ids": self.ids,
+            "floor": self.floor
+        }
+
+    @staticmethod
+    def from_dict(classname: str, dict: Dict) -> 'FrontendBatchRequest':
+        """
+        Used to receive FrontendBatchRequests sent in their readable form
+        :return: A FrontendBatchRequest
+        """
+
+        return FrontendBatchRequest(
+            Timestamp.from_dict("Timestamp", dict["prev"]),
+            [ClientRequest.from_dict("ClientRequest", request) for request in dict["requests"]],
+            dict["ids"],
+            dict.get("floor")
+        )
+
+
+class ReplicaBatchResponse:
+    """
+    Represents a response to a FrontendBatchRequest from a RM to a FE
+    """
+
+    def __init__(self, values: List[Any], label: Timestamp):
+        self.values = values  # The value of each executed request, in order
+        self.label = label  # The value Timestamp of the RM once every request had been executed
+
+    def __str__(self):
+        dict = self.to_dict()
+        del dict["__class__"]
+
+        return str(dict)
+
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        writer.value(self.values)
+        self.label.write(writer)
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'ReplicaBatchResponse':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A ReplicaBatchResponse
+        """
+
+        values = reader.value()
+
+        return ReplicaBatchResponse(values, Timestamp.read(reader))
+
+    def to_dict(self):
+        """
+        The readable form of this ReplicaBatchResponse, as it was sent before ReplicaBatchResponses were packed
+        :return: A dict representing this ReplicaBatchResponse
+        """
+
+        return {
+            "__class__": "ReplicaBatchResponse",
+            "values": self.values,
+            "label": self.label.to_dict()
+        }
+
+    @staticmethod
+    def from_dict(classname: str, dict: Dict):
+        """
+        Used to receive ReplicaBatchResponses sent in their readable form
+        :return: A ReplicaBatchResponse
+        """
+
+        return ReplicaBatchResponse(
+            dict["values"],
+            Timestamp.from_dict("Timestamp", dict["label"])
+        )
 
-SerializerBase.register_class_to_dict(FrontendRequest, FrontendRequest.to_dict)
-SerializerBase.register_dict_to_class("FrontendRequest", FrontendRequest.from_dict)
 
-SerializerBase.register_class_to_dict(ReplicaResponse, ReplicaResponse.to_dict)
-SerializerBase.register_dict_to_class("ReplicaResponse", ReplicaResponse.from_dict)
+wire.register(ClientRequest)
+wire.register(FrontendRequest)
+wire.register(ReplicaResponse)
+wire.register(FrontendBatchRequest)
+wire.register(ReplicaBatchResponse)
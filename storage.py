@@ -0,0 +1,375 @@
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from Pyro4.util import get_serializer
+
+import replica_classes  # Registers Records, Logs and ExecutedOperationTables with the serializer
+
+SYNC_INTERVAL = 0.005  # Seconds to gather journal entries into a single fsync
+
+serializer = get_serializer("serpent")  # Uses the same to_dict and from_dict registrations as Pyro
+header = struct.Struct(">II")  # Every journal entry is preceded by its length and CRC-32
+
+
+def encode(value: Any) -> bytes:
+
+    return serializer.dumps(value)
+
+
+def decode(data: bytes) -> Any:
+
+    return serializer.loads(data)
+
+
+def fsync_directory(directory: str) -> None:
+    """
+    Make a file's creation, rename or deletion in a directory durable.
+    :param directory: The directory
+    :return: None
+    """
+
+    fd = os.open(directory, os.O_RDONLY)
+
+    try:
+
+        os.fsync(fd)
+
+    finally:
+
+        os.close(fd)
+
+
+class Storage:
+    """
+    The on-disk state of a persistent RM. Each RM has a directory of its own, holding:
+
+    * id: the ID of the RM, so that it rejoins under the same ID when restarted
+    * journal-<n>: an append-only segment of the changes made to the RM's log, replica timestamp and value
+    * checkpoint-<n>.sqlite and checkpoint-<n>.state: the RM's value, and the timestamps, executed operation table and
+      update log that go with it, as they were when journal-<n> was started
+    * CURRENT: the number of the latest complete checkpoint
+
+    Recovery loads the latest checkpoint and replays only the segments written since. Entries are written to the journal
+    as soon as they are made, but fsynced in batches by a background thread: every entry made within SYNC_INTERVAL of
+    each other shares a single fsync, and sync blocks until the entries made so far are durable.
+    """
+
+    def __init__(self, directory: str, sync_interval: float = SYNC_INTERVAL):
+
+        self.directory = directory
+        self.sync_interval = sync_interval
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.checkpoint_number = self.read_current()  # The latest complete checkpoint, or 0 if there is none
+        self.segment = max(self.segments(), default=self.checkpoint_number) + 1  # The segment being written
+
+        self._file = open(self.path("journal-{0}".format(self.segment)), "ab")
+
+        self._lock = threading.Lock()  # Guards the journal file and the counts below
+        self._sync_lock = threading.Lock()  # Held while fsyncing, so the file isn't closed underneath it
+        self._appended = threading.Condition(self._lock)  # Notified when an entry is written
+        self._synced = threading.Condition(self._lock)  # Notified when entries become durable
+
+        self.written = 0  # The number of entries written
+        self.durable = 0  # The number of those entries that have been fsynced
+        self.rotated = 0  # The number of entries written when the current segment was started
+        self.syncs = 0  # The number of fsyncs made
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._sync_loop, daemon=True)
+        self._thread.start()
+
+    def path(self, name: str) -> str:
+
+        return os.path.join(self.directory, name)
+
+    @property
+    def id(self) -> Optional[str]:
+        """
+        :return: The ID of the RM this directory belongs to, or None if it is new
+        """
+
+        try:
+
+            with open(self.path("id")) as file:
+                return file.read().strip()
+
+        except FileNotFoundError:
+
+            return None
+
+    @id.setter
+    def id(self, id: str) -> None:
+
+        with open(self.path("id"), "w") as file:
+
+            file.write(id)
+            file.flush()
+            os.fsync(file.fileno())
+
+        fsync_directory(self.directory)
+
+    @property
+    def dirty(self) -> bool:
+        """
+        :return: Whether anything has been written since the last checkpoint
+        """
+
+        with self._lock:
+            return self.written > self.rotated
+
+    def read_current(self) -> int:
+
+        try:
+
+            with open(self.path("CURRENT")) as file:
+                return int(file.read().strip())
+
+        except FileNotFoundError:
+
+            return 0
+
+    def segments(self) -> List[int]:
+        """
+        :return: The numbers of the journal segments on disk, in order
+        """
+
+        numbers = [re.fullmatch(r"journal-(\d+)", name) for name in os.listdir(self.directory)]
+
+        return sorted(int(match.group(1)) for match in numbers if match is not None)
+
+    def load(self) -> Tuple[Optional[str], Optional[Dict], List[Dict]]:
+        """
+        Read the latest checkpoint, and the journal entries written since.
+        :return: The path of the checkpointed database, and the state that goes with it, or None and None if there is
+        no checkpoint; and the journal entries, in the order they were written
+        """
+
+        path, state = None, None
+
+        if self.checkpoint_number > 0:
+
+            path = self.path("checkpoint-{0}.sqlite".format(self.checkpoint_number))
+
+            with open(self.path("checkpoint-{0}.state".format(self.checkpoint_number)), "rb") as file:
+                state = decode(file.read())
+
+        entries: List[Dict] = []
+
+        for number in self.segments():
+
+            if self.checkpoint_number <= number < self.segment:
+                entries.extend(self.read_segment(self.path("journal-{0}".format(number))))
+
+        print("Loaded checkpoint {0} and {1} journal entries".format(self.checkpoint_number, len(entries)))
+
+        return path, state, entries
+
+    @staticmethod
+    def read_segment(path: str) -> List[Dict]:
+        """
+        Read the entries in a journal segment. An entry that was only partly written when the RM stopped, and anything
+        after it, is cut off.
+        :param path: The path of the segment
+        :return: The entries in the segment
+        """
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        entries: List[Dict] = []
+        offset = 0
+
+        while offset + header.size <= len(data):
+
+            length, crc = header.unpack_from(data, offset)
+            payload = data[offset + header.size:offset + header.size + length]
+
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+
+            entries.append(decode(payload))
+
+            offset += header.size + length
+
+        if offset < len(data):
+
+            print("Truncating {0} at {1} bytes (of {2})".format(path, offset, len(data)))
+
+            with open(path, "r+b") as file:
+                file.truncate(offset)
+
+        return entries
+
+    def append(self, kind: str, value: Any) -> int:
+        """
+        Write an entry to the journal. It isn't durable until sync is called.
+        :param kind: What the entry records: "record", "duplicate", "ts" or "apply"
+        :param value: The Record, Timestamp or list of Record IDs
+        :return: The number of entries written, including this one
+        """
+
+        data = encode({"kind": kind, "value": value})
+
+        with self._lock:
+
+            self._file.write(header.pack(len(data), zlib.crc32(data)) + data)
+
+            self.written += 1
+            self._appended.notify()
+
+            return self.written
+
+    def sync(self, written: int = None) -> None:
+        """
+        Wait until journal entries are durable.
+        :param written: The number of entries that must be durable; by default, every entry written so far
+        :return: None
+        """
+
+        with self._lock:
+
+            if written is None:
+                written = self.written
+
+            while self.durable < written and not self._closed:
+                self._synced.wait()
+
+    def _sync_loop(self) -> None:
+        """
+        Fsync the journal whenever there are entries waiting, gathering entries for sync_interval first.
+        :return: None
+        """
+
+        while True:
+
+            with self._lock:
+
+                while self.durable == self.written and not self._closed:
+                    self._appended.wait()
+
+                if self._closed:
+                    return
+
+            time.sleep(self.sync_interval)
+
+            with self._sync_lock:
+
+                with self._lock:
+
+                    if self._closed:
+                        return
+
+                    written = self.written
+                    self._file.flush()
+
+                os.fsync(self._file.fileno())
+
+                with self._lock:
+
+                    self.durable = max(self.durable, written)
+                    self.syncs += 1
+                    self._synced.notify_all()
+
+    def rotate(self) -> int:
+        """
+        Make everything written so far durable, and start a new journal segment. A checkpoint of the state as it is now
+        will be numbered with the new segment.
+        :return: The number of the new segment
+        """
+
+        with self._sync_lock, self._lock:
+
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+            self.durable = self.written
+            self.rotated = self.written
+            self._synced.notify_all()
+
+            self.segment += 1
+            self._file = open(self.path("journal-{0}".format(self.segment)), "ab")
+
+            fsync_directory(self.directory)
+
+            return self.segment
+
+    def write_checkpoint(self, number: int, snapshot: sqlite3.Connection, state: bytes) -> None:
+        """
+        Write a checkpoint, make it the latest, then delete the checkpoints and journal segments it replaces.
+        :param number: The number returned by rotate when the snapshot was taken
+        :param snapshot: A snapshot of the RM's value, which is closed once written
+        :param state: The encoded state that goes with the snapshot
+        :return: None
+        """
+
+        start = time.perf_counter()
+
+        database = self.path("checkpoint-{0}.sqlite".format(number))
+
+        if os.path.exists(database + ".tmp"):
+            os.remove(database + ".tmp")  # Left by a checkpoint that didn't finish
+
+        destination = sqlite3.connect(database + ".tmp")
+
+        snapshot.backup(destination)
+
+        destination.close()
+        snapshot.close()
+
+        with open(database + ".tmp", "rb") as file:
+            os.fsync(file.fileno())
+
+        os.replace(database + ".tmp", database)
+
+        for (name, data) in [("checkpoint-{0}.state".format(number), state), ("CURRENT", str(number).encode())]:
+
+            with open(self.path(name + ".tmp"), "wb") as file:
+
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(self.path(name + ".tmp"), self.path(name))  # CURRENT is written last, so it never points at a
+            # checkpoint that is incomplete
+
+        fsync_directory(self.directory)
+
+        self.checkpoint_number = number
+
+        for name in os.listdir(self.directory):  # Everything before this checkpoint is no longer needed
+
+            match = re.fullmatch(r"(?:checkpoint-(\d+)\.(?:sqlite|state)|journal-(\d+))", name)
+
+            if match is not None and int(match.group(1) or match.group(2)) < number:
+                os.remove(self.path(name))
+
+        print("Wrote checkpoint {0} in {1:.3f}s\n".format(number, time.perf_counter() - start))
+
+    def close(self) -> None:
+        """
+        Make everything written durable, and stop syncing.
+        :return: None
+        """
+
+        with self._sync_lock, self._lock:
+
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+            self.durable = self.written
+            self._closed = True
+
+            self._appended.notify_all()
+            self._synced.notify_all()
+
+        self._thread.join()
@@ -1,4 +1,18 @@
-from tests import test_timestamp, test_log
+from tests import test_timestamp, test_log, test_executed_operation_table, test_membership, test_proxy_pool, \
+    test_latency_tracker, test_gateway, test_db, test_storage, test_query_cache, \
+    test_wire, test_compressed_gossip, test_replica, test_frontend
 
 test_timestamp.run()
 test_log.run()
+test_executed_operation_table.run()
+test_membership.run()
+test_proxy_pool.run()
+test_latency_tracker.run()
+test_gateway.run()
+test_db.run()
+test_storage.run()
+test_query_cache.run()
+test_wire.run()
+test_compressed_gossip.run()
+test_replica.run()
+test_frontend.run()
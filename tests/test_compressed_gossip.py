@@ -0,0 +1,67 @@
+import unittest
+
+from Pyro4.util import get_serializer
+
+import wire
+from enums import Operation
+from replica_classes import Record, Log, Gossip, CompressedGossip
+from requests import ClientRequest
+from timestamp import Timestamp
+
+serializer = get_serializer("serpent")
+
+
+def gossip(n: int) -> Gossip:
+    records = [Record("replica-A", Timestamp({"replica-A": i}),
+                      ClientRequest(Operation.CREATE, {"user_id": "1", "movie_id": str(i), "rating": "4"}),
+                      Timestamp(), "frontend-1:" + str(i)) for i in range(n)]
+
+    return Gossip("replica-A", Log(records), Timestamp({"replica-A": n}))
+
+
+def packed(n: int) -> bytes:
+    return wire.pack(gossip(n))
+
+
+class CompressTest(unittest.TestCase):
+    def test_above_threshold(self):
+        compressed = CompressedGossip.compress(packed(500), ["zlib"], 1024, 1)
+
+        self.assertEqual(compressed.codec, "zlib")
+        self.assertEqual(compressed.size, len(packed(500)))
+        self.assertGreater(compressed.ratio, 1.5)
+
+    def test_below_threshold(self):
+        compressed = CompressedGossip.compress(packed(1), ["zlib"], 1024, 1)
+
+        self.assertIsNone(compressed.codec)
+        self.assertEqual(compressed.ratio, 1.0)
+
+    def test_disabled(self):
+        self.assertIsNone(CompressedGossip.compress(packed(500), ["zlib"], None, 1).codec)
+
+    def test_unsupported_codecs(self):
+        self.assertIsNone(CompressedGossip.compress(packed(500), ["lz4"], 1024, 1).codec)
+        self.assertEqual(CompressedGossip.compress(packed(500), ["lz4", "zlib"], 1024, 1).codec, "zlib")
+
+
+class DecompressTest(unittest.TestCase):
+    def test_round_trip(self):
+        for (n, threshold) in [(1, 1024), (500, 1024), (500, None)]:
+            compressed = CompressedGossip.compress(packed(n), ["zlib"], threshold, 1)
+            received = serializer.loads(serializer.dumps(compressed))
+            decompressed = wire.unpack(Gossip.read, received.decompress())
+
+            self.assertEqual(decompressed.i, "replica-A")
+            self.assertEqual([record.id for record in decompressed.log], ["frontend-1:" + str(i) for i in range(n)])
+            self.assertEqual(decompressed.ts.replicas, {"replica-A": n})
+
+
+def run():
+    test_cases = [CompressTest, DecompressTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
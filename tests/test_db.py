@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db import DB, DATABASE_PATH, STATEMENTS
+from enums import Operation
+from requests import ClientRequest
+
+
+class LoadTest(unittest.TestCase):
+    def test_lazy(self):
+        db = DB()
+
+        self.assertIsNone(db._connection)
+
+        self.assertEqual(db.connection.execute("SELECT COUNT(*) FROM ratings").fetchone()[0], 100836)
+        self.assertIs(db.connection, db.connection)
+
+    def test_copy(self):
+        modified = os.path.getmtime(DATABASE_PATH)
+
+        first, second = DB(), DB()
+
+        first.execute_request(ClientRequest(Operation.DELETE, {"user_id": "1", "movie_id": "1"}))
+
+        query = "SELECT rating FROM ratings WHERE userId = '1' AND movieId = '1'"
+
+        self.assertIsNone(first.connection.execute(query).fetchone())
+        self.assertIsNotNone(second.connection.execute(query).fetchone())
+        self.assertEqual(os.path.getmtime(DATABASE_PATH), modified)  # Only the in-memory copy is changed
+
+
+class CatalogueTest(unittest.TestCase):
+    def test_titles(self):
+        db = DB()
+
+        self.assertEqual(len(db.titles), 9742)
+        self.assertEqual(db.title("1"), "Toy Story (1995) (1)")
+
+    def test_all(self):
+        db = DB()
+
+        rows = db.connection.execute(
+            "SELECT ratings.movieId, title, rating FROM ratings JOIN movies USING (movieId) WHERE userId = '1'")
+        expected = ["{0} ({1}): {2}".format(title, movie_id, rating) for (movie_id, title, rating) in rows]
+
+        self.assertEqual(sorted(db.all("1")), sorted(expected))
+
+
+class AggregateTest(unittest.TestCase):
+    def assertConsistent(self, db, movie_id):
+        expected = db.connection.execute("SELECT ROUND(AVG(rating)) FROM ratings WHERE movieId = ?",
+                                         (movie_id,)).fetchone()[0]
+
+        self.assertEqual(db.average(movie_id), "Average rating for {0}: {1}".format(db.title(movie_id), expected))
+
+    def test_average(self):
+        db = DB()
+
+        for movie_id in ["1", "2", "356", "193609"]:
+            self.assertConsistent(db, movie_id)
+
+    def test_changes(self):
+        db = DB()
+
+        db.execute_request(ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "2", "rating": 5}))
+        db.execute_request(ClientRequest(Operation.UPDATE, {"user_id": "1000", "movie_id": "2", "rating": "0.5"}))
+        db.execute_request(ClientRequest(Operation.DELETE, {"user_id": "1", "movie_id": "3"}))
+
+        for movie_id in ["2", "3"]:
+            self.assertConsistent(db, movie_id)
+
+        for user_id in ["6", "19", "44", "51", "58", "64", "68", "91"]:  # Every rating of movie 2 but one
+            db.execute_request(ClientRequest(Operation.DELETE, {"user_id": user_id, "movie_id": "2"}))
+
+        db.execute_request(ClientRequest(Operation.DELETE, {"user_id": "1000", "movie_id": "2"}))
+
+        self.assertConsistent(db, "2")
+
+    def test_rollback(self):
+        db = DB()
+
+        with self.assertRaises(KeyError):  # The second request fails, so neither takes effect
+            db.execute_batch([ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "1", "rating": 0.5}),
+                              ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "0", "rating": 0.5})])
+
+        self.assertConsistent(db, "1")
+
+    def test_checkpoint(self):
+        db = DB()
+
+        db.execute_request(ClientRequest(Operation.DELETE, {"user_id": "1", "movie_id": "1"}))
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            path = os.path.join(directory, "checkpoint.sqlite")
+            destination = sqlite3.connect(path)
+
+            db.copy().backup(destination)  # As a checkpoint is written
+            destination.close()
+
+            restored = DB(path)
+
+            self.assertConsistent(restored, "1")
+
+            restored.execute_request(ClientRequest(Operation.DELETE, {"user_id": "5", "movie_id": "1"}))
+
+            self.assertConsistent(restored, "1")
+
+
+class ApplyBatchTest(unittest.TestCase):
+    def rating(self, db, user_id, movie_id):
+        result = db.connection.execute("SELECT rating FROM ratings WHERE userId = ? AND movieId = ?",
+                                       (user_id, movie_id)).fetchone()
+
+        return result[0] if result is not None else None
+
+    def test_batch(self):
+        db = DB()
+
+        values = db.apply_batch([ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1", "rating": "2"}),
+                                 ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "1", "rating": "5"})])
+
+        self.assertEqual(values, ["Rating for Toy Story (1995) (1) updated: 2",
+                                  "Rating for Toy Story (1995) (1) created: 5"])
+        self.assertEqual((self.rating(db, "1", "1"), self.rating(db, "1000", "1")), ("2", "5"))
+        self.assertFalse(db.connection.in_transaction)
+
+    def test_failure(self):
+        db = DB()
+
+        values = db.apply_batch([ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1", "rating": "2"}),
+                                 ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "0", "rating": "5"}),
+                                 ClientRequest(Operation.DELETE, {"user_id": "1", "movie_id": "3"})])
+
+        self.assertTrue(values[1].startswith("Update failed (KeyError"))
+        self.assertEqual(self.rating(db, "1", "1"), "2")  # The updates either side of the failure take effect
+        self.assertIsNone(self.rating(db, "1000", "0"))  # The failed update doesn't
+        self.assertIsNone(self.rating(db, "1", "3"))
+
+    def test_request_failure(self):
+        db = DB()
+
+        with self.assertRaises(KeyError):
+            db.execute_request(ClientRequest(Operation.CREATE, {"user_id": "1000", "movie_id": "0", "rating": "5"}))
+
+        db.execute_request(ClientRequest(Operation.READ, {"user_id": "1", "movie_id": "1"}))  # Commits
+
+        self.assertIsNone(self.rating(db, "1000", "0"))
+
+
+class IndexTest(unittest.TestCase):
+    def plan(self, db, statement, params):
+        return " ".join(str(row[-1]) for row in db.connection.execute("EXPLAIN QUERY PLAN " + statement, params))
+
+    def test_indexed(self):
+        db = DB()
+
+        self.assertIn("ratings_user_movie", self.plan(db, STATEMENTS["read"], ("1", "1")))
+        self.assertIn("ratings_user_movie", self.plan(db, STATEMENTS["update"], ("4", 0, "1", "1")))
+        self.assertIn("ratings_user_movie", self.plan(db, STATEMENTS["all"], ("1",)))
+        self.assertIn("movie_ratings", self.plan(db, STATEMENTS["average"], ("1",)))
+
+    def test_copy(self):
+        db = DB()
+
+        snapshot = db.copy()  # Checkpoints carry the indexes with them
+
+        names = [row[0] for row in snapshot.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+
+        self.assertIn("ratings_user_movie", names)
+
+
+def run():
+    test_cases = [LoadTest, CatalogueTest, AggregateTest, ApplyBatchTest, IndexTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
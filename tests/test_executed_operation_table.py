@@ -0,0 +1,110 @@
+import unittest
+
+from replica_classes import ExecutedOperationTable
+
+
+class InTest(unittest.TestCase):
+    def test_in_false(self):
+        table = ExecutedOperationTable()
+
+        self.assertFalse("frontend:1" in table)
+
+    def test_in_true(self):
+        table = ExecutedOperationTable()
+
+        table.add("frontend:1")
+
+        self.assertTrue("frontend:1" in table)
+        self.assertFalse("frontend:2" in table)
+        self.assertFalse("other:1" in table)
+
+    def test_in_unsequenced(self):
+        table = ExecutedOperationTable()
+
+        table.add("id")
+
+        self.assertTrue("id" in table)
+        self.assertFalse("other" in table)
+
+
+class WatermarkTest(unittest.TestCase):
+    def test_in_order(self):
+        table = ExecutedOperationTable()
+
+        for i in range(1, 101):
+            table.add("frontend:{}".format(i))
+
+        self.assertTrue("frontend:50" in table)
+        self.assertEqual(len(table), 1)
+
+    def test_out_of_order(self):
+        table = ExecutedOperationTable()
+
+        table.add("frontend:3")
+        table.add("frontend:2")
+
+        self.assertFalse("frontend:1" in table)
+        self.assertTrue("frontend:3" in table)
+        self.assertEqual(len(table), 2)
+
+        table.add("frontend:1")
+
+        self.assertTrue("frontend:1" in table)
+        self.assertEqual(len(table), 1)
+
+    def test_duplicate(self):
+        table = ExecutedOperationTable()
+
+        table.add("frontend:1")
+        table.add("frontend:1")
+        table.add("frontend:3")
+        table.add("frontend:3")
+
+        self.assertEqual(len(table), 2)
+
+
+class FloorTest(unittest.TestCase):
+    def test_gap_skipped(self):
+        table = ExecutedOperationTable()
+
+        table.add("frontend:1")
+
+        for i in range(3, 101):  # frontend:2 failed at every RM
+            table.add("frontend:{}".format(i), 3)
+
+        self.assertTrue("frontend:2" in table)  # Given up on, so never applied if it turns up
+        self.assertTrue("frontend:100" in table)
+        self.assertEqual(len(table), 1)
+
+    def test_stale_ahead_discarded(self):
+        table = ExecutedOperationTable()
+
+        table.add("frontend:3")
+        table.add("frontend:5")
+        table.add("frontend:7", 5)
+
+        self.assertTrue("frontend:4" in table)
+        self.assertFalse("frontend:6" in table)
+        self.assertEqual(len(table), 2)  # The watermark at 5, and 7 ahead of it
+
+    def test_lower_floor_ignored(self):
+        table = ExecutedOperationTable()
+
+        for i in range(1, 11):
+            table.add("frontend:{}".format(i))
+
+        table.add("frontend:12", 2)
+
+        self.assertTrue("frontend:10" in table)
+        self.assertFalse("frontend:11" in table)
+        self.assertEqual(len(table), 2)
+
+
+def run():
+    test_cases = [InTest, WatermarkTest, FloorTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
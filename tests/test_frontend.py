@@ -0,0 +1,347 @@
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+from Pyro4.errors import CommunicationError, ConnectionClosedError
+
+from enums import Operation
+from frontend import Frontend
+from frontend_classes import LatencyTracker
+from replica import Replica
+from requests import ClientRequest, FrontendRequest, ReplicaResponse, ReplicaBatchResponse
+from timestamp import Timestamp
+
+REPLICAS = [("replica-{0}".format(n), "PYRO:replica-{0}@localhost:9999".format(n)) for n in range(2)]
+
+READ = ClientRequest(Operation.READ, {"user_id": "1", "movie_id": "1"})
+UPDATE = ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1", "rating": 4})
+
+
+def frontend(test: unittest.TestCase, **kwargs) -> Frontend:
+    """
+    :return: A Frontend that sends every request to REPLICAS, for the duration of `test`
+    """
+
+    patcher = mock.patch("Pyro4.locateNS")
+    patcher.start()
+
+    test.addCleanup(patcher.stop)
+
+    fe = Frontend(**kwargs)
+    fe.get_replica_uri = lambda: REPLICAS
+
+    return fe
+
+
+class FakeReplica:
+    """
+    Stands in for a RM, answering each request with its value and label, once it has been released. If it fails, the
+    request never reaches it; if it has an error, the error is raised once the request has.
+    """
+
+    def __init__(self, value, label: Timestamp, released: bool = True, fail: bool = False, error: Exception = None):
+        self.value = value
+        self.label = label
+        self.fail = fail
+        self.error = error
+        self.released = threading.Event()
+        self.calls = []
+
+        if released:
+            self.released.set()
+
+    def answer(self, frontend_request):
+        self.released.wait()
+
+        if self.fail:
+            raise CommunicationError("offline")
+
+        self.calls.append(frontend_request)
+
+        if self.error is not None:
+            raise self.error
+
+        return ReplicaResponse(self.value, self.label)
+
+    query = update = answer
+
+    def answer_batch(self, batch):
+        self.answer(batch)
+
+        return ReplicaBatchResponse([request.params["movie_id"] for request in batch.requests], self.label)
+
+    query_batch = update_batch = answer_batch
+
+
+def connect(fe: Frontend, replicas) -> None:
+    """
+    Send the FE's calls to REPLICAS to `replicas`, in the same order.
+    """
+
+    fakes = {uri: replica for ((_, uri), replica) in zip(REPLICAS, replicas)}
+
+    @contextmanager
+    def proxy(uri, timeout=None):
+        yield fakes[uri]
+
+    fe.pool.proxy = proxy
+
+
+def offline(name, uri, method, frontend_request):
+    raise CommunicationError("{0} is offline".format(name))
+
+
+class FailureTest(unittest.TestCase):
+    def test_update(self):
+        fe = frontend(self)
+        fe.send = offline
+
+        with self.assertRaises(ConnectionRefusedError):
+            fe.request(UPDATE)
+
+        self.assertEqual(fe.outstanding, set())  # Given up on
+
+    def test_query(self):
+        fe = frontend(self)
+        fe.send = offline
+
+        with self.assertRaises(ConnectionRefusedError):
+            fe.request(READ)
+
+    def test_batch(self):
+        fe = frontend(self)
+        fe.send = offline
+
+        for batch in [[READ, READ], [UPDATE, READ]]:
+
+            with self.assertRaises(ConnectionRefusedError):
+                fe.request_batch(batch)
+
+
+class QuorumTest(unittest.TestCase):
+    def test_returns_at_quorum(self):
+        fe = frontend(self, write_quorum=1)
+        slow = FakeReplica("slow", Timestamp({"replica-1": 1}), released=False)
+
+        connect(fe, [FakeReplica("fast", Timestamp({"replica-0": 1})), slow])
+
+        self.assertEqual(fe.request(UPDATE), "fast")
+        self.assertEqual(fe.prev.replicas, {"replica-0": 1})  # Only one has answered
+
+        slow.released.set()
+        fe.executor.shutdown(wait=True)
+
+        self.assertEqual(len(slow.calls), 1)
+        self.assertEqual(fe.prev.replicas, {"replica-0": 1, "replica-1": 1})  # The late ack is still merged
+
+    def test_waits_for_quorum(self):
+        fe = frontend(self, write_quorum=2)
+        slow = FakeReplica("slow", Timestamp({"replica-1": 1}), released=False)
+
+        connect(fe, [FakeReplica("fast", Timestamp({"replica-0": 1})), slow])
+
+        threading.Timer(0.05, slow.released.set).start()
+
+        fe.request(UPDATE)
+
+        self.assertEqual(fe.prev.replicas, {"replica-0": 1, "replica-1": 1})
+
+    def test_failure_below_quorum(self):
+        fe = frontend(self, write_quorum=2)
+
+        connect(fe, [FakeReplica("ok", Timestamp({"replica-0": 1})), FakeReplica(None, Timestamp(), fail=True)])
+
+        self.assertEqual(fe.request(UPDATE), "ok")  # Acknowledged by one RM, so not lost
+        self.assertEqual(fe.outstanding, set())
+
+    def test_best_effort(self):
+        fe = frontend(self, write_quorum=2)
+        failing = FakeReplica(None, Timestamp(), released=False, fail=True)
+
+        connect(fe, [FakeReplica("ok", Timestamp({"replica-0": 1})), failing])
+
+        threading.Timer(0.05, failing.released.set).start()
+
+        start = time.monotonic()
+        responses = fe.update(FrontendRequest(Timestamp(), UPDATE, fe.id + ":1"), REPLICAS)
+
+        self.assertGreater(time.monotonic() - start, 0.04)  # Waited to see whether the quorum could be reached
+        self.assertEqual([response.value for response in responses], ["ok"])  # Fewer than write_quorum
+
+    def test_sequence(self):
+        fe = frontend(self)
+        replica = FakeReplica("ok", Timestamp({"replica-0": 1}))
+
+        connect(fe, [replica, FakeReplica("ok", Timestamp({"replica-0": 1}))])
+
+        fe.request(UPDATE)
+        fe.request(UPDATE)
+
+        self.assertEqual([request.id for request in replica.calls], [fe.id + ":1", fe.id + ":2"])
+        self.assertEqual([request.floor for request in replica.calls], [1, 2])
+
+
+class HedgeTest(unittest.TestCase):
+    def hedging(self, delay: float) -> Frontend:
+        fe = frontend(self)
+        fe.latency = LatencyTracker(min_samples=1000, default=delay)  # Hedge after `delay` seconds
+
+        return fe
+
+    def test_fast(self):
+        fe = self.hedging(1.0)
+        second = FakeReplica("second", Timestamp())
+
+        connect(fe, [FakeReplica("first", Timestamp()), second])
+
+        self.assertEqual(fe.request(READ), "first")
+        self.assertEqual(len(second.calls), 0)
+        self.assertEqual(fe.hedged, 0)
+
+    def test_slow(self):
+        fe = self.hedging(0.01)
+        first = FakeReplica("first", Timestamp(), released=False)
+
+        connect(fe, [first, FakeReplica("second", Timestamp())])
+
+        start = time.monotonic()
+
+        self.assertEqual(fe.request(READ), "second")
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(fe.hedged, 1)
+
+        first.released.set()
+
+    def test_failed(self):
+        fe = self.hedging(1.0)
+
+        connect(fe, [FakeReplica(None, Timestamp(), fail=True), FakeReplica("second", Timestamp())])
+
+        start = time.monotonic()
+
+        self.assertEqual(fe.request(READ), "second")
+        self.assertLess(time.monotonic() - start, 1.0)  # Tried the next RM at once, rather than after the delay
+        self.assertEqual(fe.hedged, 0)
+
+    def test_stale(self):
+        fe = self.hedging(1.0)
+        fe.prev = Timestamp({"replica-1": 2})
+
+        connect(fe, [FakeReplica("stale", Timestamp({"replica-1": 1})),
+                     FakeReplica("second", Timestamp({"replica-1": 2}))])
+
+        self.assertEqual(fe.request(READ), "second")  # Older than what the client has seen, so not used
+
+
+class BatchTest(unittest.TestCase):
+    def test_groups(self):
+        fe = frontend(self, write_quorum=2)  # So that each RM has answered every run before the next is sent
+        replica = FakeReplica(None, Timestamp())
+        requests = [ClientRequest(method, {"user_id": "1", "movie_id": str(n), "rating": 4})
+                    for (n, method) in enumerate([Operation.READ, Operation.AVERAGE, Operation.CREATE,
+                                                  Operation.UPDATE, Operation.READ])]
+
+        connect(fe, [replica, FakeReplica(None, Timestamp())])
+
+        self.assertEqual(fe.request_batch(requests), ["0", "1", "2", "3", "4"])  # In the order given
+        self.assertEqual([[request.method for request in batch.requests] for batch in replica.calls],
+                         [[Operation.READ, Operation.AVERAGE], [Operation.CREATE, Operation.UPDATE], [Operation.READ]])
+        self.assertEqual(replica.calls[1].ids, [fe.id + ":1", fe.id + ":2"])  # A run of updates shares one floor
+        self.assertEqual(replica.calls[1].floor, 1)
+
+
+class LostReply:
+    """
+    Passes updates to a Replica, but loses its replies until it has been found.
+    """
+
+    def __init__(self, replica: Replica):
+        self.replica = replica
+        self.found = False
+
+    def update(self, frontend_request):
+        response = self.replica.update(frontend_request)
+
+        if not self.found:
+            raise ConnectionClosedError("reply lost")
+
+        return response
+
+
+class UnsettledTest(unittest.TestCase):
+    def test_resent(self):
+        fe = frontend(self, write_quorum=2)  # So that each RM has answered every update before the next is sent
+        replicas = [FakeReplica("ok", Timestamp({"replica-0": 1}), error=ConnectionClosedError("reply lost"))
+                    for _ in range(2)]
+
+        connect(fe, replicas)
+
+        with self.assertRaises(ConnectionRefusedError):
+            fe.request(UPDATE)
+
+        self.assertEqual(fe.outstanding, {1})  # It may have been accepted, so isn't given up on
+
+        for replica in replicas:
+            replica.error = None
+
+        fe.request(UPDATE)
+
+        self.assertEqual([request.id for request in replicas[0].calls], [fe.id + ":1", fe.id + ":1", fe.id + ":2"])
+        self.assertEqual(replicas[0].calls[2].floor, 2)  # Only once the first was acknowledged
+        self.assertEqual(fe.outstanding, set())
+        self.assertEqual(fe.unsettled, [])
+
+    def test_floor_held(self):
+        fe = frontend(self)
+        replicas = [FakeReplica("ok", Timestamp({"replica-0": 1}), error=ConnectionClosedError("reply lost")),
+                    FakeReplica(None, Timestamp(), fail=True)]
+
+        connect(fe, replicas)
+
+        for _ in range(2):
+
+            with self.assertRaises(ConnectionRefusedError):
+                fe.request(UPDATE)
+
+        self.assertEqual([request.floor for request in replicas[0].calls], [1, 1, 1])  # Sent again, but still lost
+        self.assertEqual(fe.outstanding, {1, 2})
+
+    def test_remote_error(self):
+        fe = frontend(self)
+
+        connect(fe, [FakeReplica(None, Timestamp(), error=KeyError("unknown")) for _ in range(2)])
+
+        with self.assertRaises(KeyError):
+            fe.request(UPDATE)
+
+        self.assertEqual(fe.outstanding, {1})
+        self.assertEqual(len(fe.unsettled), 1)
+
+    def test_applied(self):
+        fe = frontend(self)
+        replica = LostReply(Replica())
+
+        connect(fe, [replica, FakeReplica(None, Timestamp(), fail=True)])
+
+        with self.assertRaises(ConnectionRefusedError):
+            fe.request(UPDATE)  # Applied, but the reply was lost
+
+        replica.found = True
+
+        fe.request(UPDATE)
+
+        self.assertEqual(fe.prev.replicas, {replica.replica.id: 2})  # The first is reflected, though applied once
+        self.assertEqual(fe.outstanding, set())
+        self.assertEqual(len(replica.replica.update_log), 2)
+
+
+def run():
+    test_cases = [FailureTest, QuorumTest, HedgeTest, BatchTest, UnsettledTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
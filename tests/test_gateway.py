@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import unittest
+
+from enums import Operation
+from gateway import Gateway, GatewayClient
+from requests import ClientRequest
+
+
+class EchoFrontend:
+    """
+    Stands in for a Frontend, answering each READ with its movie ID.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def request_batch(self, requests):
+        with self.lock:
+            self.batches.append(len(requests))
+
+        if any(request.params.get("fail") for request in requests):
+            raise ConnectionRefusedError("All replicas reported Status.OFFLINE")
+
+        return [request.params["movieId"] for request in requests]
+
+
+class GatewayTest(unittest.TestCase):
+    def serve(self, frontend, coroutine):
+        async def main():
+            gateway = Gateway(frontend, window=0.005)
+            server = await gateway.start("localhost", 0)
+
+            client = GatewayClient()
+            await client.connect("localhost", server.sockets[0].getsockname()[1])
+
+            try:
+                return gateway, await coroutine(client)
+            finally:
+                client.close()
+                server.close()
+
+        return asyncio.run(main())
+
+    def test_concurrent(self):
+        frontend = EchoFrontend()
+
+        async def requests(client):
+            return await asyncio.gather(*[client.request(ClientRequest(Operation.READ, {"movieId": str(i)}))
+                                          for i in range(1000)])
+
+        gateway, values = self.serve(frontend, requests)
+
+        self.assertEqual(values, [str(i) for i in range(1000)])
+        self.assertEqual(sum(frontend.batches), 1000)
+        self.assertLess(len(frontend.batches), 1000)  # Concurrent requests share batches
+        self.assertEqual(gateway.requests, 1000)
+
+    def test_error(self):
+        frontend = EchoFrontend()
+
+        async def requests(client):
+            with self.assertRaises(ConnectionRefusedError):
+                await client.request(ClientRequest(Operation.READ, {"movieId": "1", "fail": True}))
+
+            return await client.request(ClientRequest(Operation.READ, {"movieId": "2"}))  # The connection still works
+
+        _, value = self.serve(frontend, requests)
+
+        self.assertEqual(value, "2")
+
+    def test_error_isolated(self):
+        frontend = EchoFrontend()
+
+        async def requests(client):
+            return await asyncio.gather(*[client.request(ClientRequest(Operation.READ, {"movieId": str(i),
+                                                                                        "fail": i == 7}))
+                                          for i in range(20)], return_exceptions=True)
+
+        _, values = self.serve(frontend, requests)
+
+        self.assertIsInstance(values[7], ConnectionRefusedError)  # Only the failing request fails...
+        self.assertEqual(values[:7] + values[8:], [str(i) for i in range(20) if i != 7])
+        self.assertGreater(max(frontend.batches), 1)  # ...though it shared a batch with the others
+
+    def test_updates_not_resent(self):
+        frontend = EchoFrontend()
+
+        async def requests(client):
+            return await asyncio.gather(client.request(ClientRequest(Operation.UPDATE, {"movieId": "1"})),
+                                        client.request(ClientRequest(Operation.READ, {"movieId": "2", "fail": True})),
+                                        return_exceptions=True)
+
+        _, values = self.serve(frontend, requests)
+
+        self.assertIsInstance(values[0], ConnectionRefusedError)  # The update may have been applied, so isn't
+        self.assertIsInstance(values[1], ConnectionRefusedError)  # sent again
+        self.assertEqual(frontend.batches, [2])
+
+
+def run():
+    test_cases = [GatewayTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
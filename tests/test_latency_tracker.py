@@ -0,0 +1,41 @@
+import unittest
+
+from frontend_classes import LatencyTracker
+
+
+class PercentileTest(unittest.TestCase):
+    def test_default(self):
+        tracker = LatencyTracker(min_samples=10, default=0.5)
+
+        tracker.record(0.1)
+
+        self.assertEqual(tracker.percentile(95), 0.5)
+
+    def test_percentile(self):
+        tracker = LatencyTracker(min_samples=10)
+
+        for i in range(1, 101):
+            tracker.record(i / 100)
+
+        self.assertEqual(tracker.percentile(50), 0.51)
+        self.assertEqual(tracker.percentile(95), 0.96)
+        self.assertEqual(tracker.percentile(100), 1.0)
+
+    def test_window(self):
+        tracker = LatencyTracker(window=10, min_samples=1)
+
+        for i in range(100):
+            tracker.record(1.0 if i < 90 else 0.1)
+
+        self.assertEqual(len(tracker), 10)
+        self.assertEqual(tracker.percentile(100), 0.1)
+
+
+def run():
+    test_cases = [PercentileTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
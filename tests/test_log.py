@@ -23,6 +23,14 @@ class InTest(unittest.TestCase):
 
         self.assertFalse("id" in log)
 
+    def test_in_duplicate(self):
+        log = Log()
+
+        log += self.record
+        log += self.record
+
+        self.assertEqual(len(log), 1)
+
 
 class MergeTest(unittest.TestCase):
     def setUp(self):
@@ -89,9 +97,112 @@ class StableTest(unittest.TestCase):
         self.assertTrue(stable[1] is self.r3)
         self.assertTrue(stable[2] is self.r1)
 
+    def test_stable_incremental(self):
+        first = self.log.stable(Timestamp({"1": 0}))
+        second = self.log.stable(Timestamp({"1": 1}))
+        third = self.log.stable(Timestamp({"1": 1}))
+
+        self.assertEqual(first, [self.r2])
+        self.assertEqual(second, [self.r1])
+        self.assertEqual(third, [])
+
+    def test_stable_causal_order(self):
+        r4 = Record("1", Timestamp({"1": 2, "3": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_4")
+
+        log = Log([r4, self.r3, self.r1])
+
+        stable = log.stable(Timestamp({"1": 2, "3": 1}))
+
+        self.assertTrue(stable[-1] is r4)
+
+    def test_stable_truncated(self):
+        self.log.stable(Timestamp())
+
+        self.log.truncate([Timestamp({"1": 1, "2": 0, "3": 1})], {"id_1", "id_2", "id_3"})
+
+        self.assertEqual(self.log.stable(Timestamp({"1": 1, "3": 1})), [])
+
+
+class OriginTest(unittest.TestCase):
+    def setUp(self):
+        self.r1 = Record("1", Timestamp({"1": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_1")
+        self.r2 = Record("1", Timestamp({"1": 2}), ClientRequest(Operation.READ, {}), Timestamp(), "id_2")
+        self.r3 = Record("1", Timestamp({"1": 3}), ClientRequest(Operation.READ, {}), Timestamp(), "id_3")
+        self.r4 = Record("2", Timestamp({"2": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_4")
+
+    def test_origin_ordered(self):
+        log = Log([self.r3, self.r1, self.r4, self.r2])
+
+        self.assertEqual(log.origin("1"), [self.r1, self.r2, self.r3])
+        self.assertEqual(log.origin("2"), [self.r4])
+
+    def test_origin_unknown(self):
+        log = Log([self.r1])
+
+        self.assertEqual(log.origin("3"), [])
+
+
+class TruncateTest(unittest.TestCase):
+    def setUp(self):
+        self.r1 = Record("1", Timestamp({"1": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_1")
+        self.r2 = Record("1", Timestamp({"1": 2}), ClientRequest(Operation.READ, {}), Timestamp(), "id_2")
+        self.r3 = Record("2", Timestamp({"2": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_3")
+
+        self.log = Log([self.r1, self.r2, self.r3])
+
+    def test_truncate_all_received(self):
+        discarded = self.log.truncate([Timestamp({"1": 2, "2": 1}), Timestamp({"1": 2, "2": 1})],
+                                      {"id_1", "id_2", "id_3"})
+
+        self.assertEqual(discarded, 3)
+        self.assertEqual(len(self.log), 0)
+        self.assertEqual(self.log.origin("1"), [])
+
+    def test_truncate_partially_received(self):
+        discarded = self.log.truncate([Timestamp({"1": 2, "2": 1}), Timestamp({"1": 1})], {"id_1", "id_2", "id_3"})
+
+        self.assertEqual(discarded, 1)
+        self.assertFalse("id_1" in self.log)
+        self.assertTrue("id_2" in self.log)
+        self.assertTrue("id_3" in self.log)
+
+    def test_truncate_not_applied(self):
+        discarded = self.log.truncate([Timestamp({"1": 2, "2": 1})], {"id_2", "id_3"})
+
+        self.assertEqual(discarded, 1)
+        self.assertTrue("id_1" in self.log)
+        self.assertTrue("id_2" in self.log)
+        self.assertFalse("id_3" in self.log)
+
+
+class MissingTest(unittest.TestCase):
+    def setUp(self):
+        self.r1 = Record("1", Timestamp({"1": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_1")
+        self.r2 = Record("1", Timestamp({"1": 2}), ClientRequest(Operation.READ, {}), Timestamp(), "id_2")
+        self.r3 = Record("2", Timestamp({"2": 1}), ClientRequest(Operation.READ, {}), Timestamp(), "id_3")
+
+        self.log = Log([self.r1, self.r2, self.r3])
+
+    def test_missing_none(self):
+        missing = self.log.missing(Timestamp({"1": 2, "2": 1}))
+
+        self.assertEqual(len(missing), 0)
+
+    def test_missing_gap(self):
+        missing = self.log.missing(Timestamp({"1": 1}))
+
+        self.assertFalse("id_1" in missing)
+        self.assertTrue("id_2" in missing)
+        self.assertTrue("id_3" in missing)
+
+    def test_missing_all(self):
+        missing = self.log.missing(Timestamp())
+
+        self.assertEqual(len(missing), 3)
+
 
 def run():
-    test_cases = [InTest, MergeTest, StableTest]
+    test_cases = [InTest, MergeTest, StableTest, OriginTest, TruncateTest, MissingTest]
     all_tests = unittest.TestSuite()
 
     for case in test_cases:
@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from enums import Status
+from frontend_classes import Membership
+
+
+class AvailableTest(unittest.TestCase):
+    def setUp(self):
+        self.membership = Membership()
+
+    def test_available_empty(self):
+        self.assertEqual(self.membership.available(2), [])
+
+    def test_available_priority(self):
+        self.membership.update("1", "uri_1", Status.OVERLOADED)
+        self.membership.update("2", "uri_2", Status.OFFLINE)
+        self.membership.update("3", "uri_3", Status.ACTIVE)
+
+        self.assertEqual(self.membership.available(2), [("3", "uri_3"), ("1", "uri_1")])
+
+    def test_available_limit(self):
+        self.membership.update("1", "uri_1", Status.ACTIVE)
+        self.membership.update("2", "uri_2", Status.ACTIVE)
+
+        self.assertEqual(len(self.membership.available(1)), 1)
+
+    def test_available_expired(self):
+        membership = Membership(ttl=0.01)
+
+        membership.update("1", "uri_1", Status.ACTIVE)
+
+        time.sleep(0.02)
+
+        self.assertEqual(membership.available(2), [])
+
+
+class EvictTest(unittest.TestCase):
+    def test_evict(self):
+        membership = Membership()
+
+        membership.update("1", "uri_1", Status.ACTIVE)
+        membership.update("2", "uri_2", Status.ACTIVE)
+        membership.evict("1")
+
+        self.assertEqual(membership.available(2), [("2", "uri_2")])
+
+    def test_evict_unknown(self):
+        membership = Membership()
+
+        membership.evict("1")
+
+        self.assertEqual(membership.available(2), [])
+
+
+def run():
+    test_cases = [AvailableTest, EvictTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
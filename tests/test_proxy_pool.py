@@ -0,0 +1,81 @@
+import time
+import unittest
+
+from Pyro4.errors import CommunicationError
+
+from frontend_classes import ProxyPool
+
+URI = "PYRO:replica@localhost:9999"
+
+
+class ReuseTest(unittest.TestCase):
+    def test_reuse(self):
+        pool = ProxyPool()
+
+        with pool.proxy(URI) as first:
+            pass
+
+        with pool.proxy(URI) as second:
+            pass
+
+        self.assertTrue(first is second)
+        self.assertEqual(pool.connections, 1)
+
+    def test_concurrent(self):
+        pool = ProxyPool()
+
+        with pool.proxy(URI) as first:
+
+            with pool.proxy(URI) as second:
+
+                self.assertFalse(first is second)
+
+        self.assertEqual(pool.connections, 2)
+
+    def test_failure(self):
+        pool = ProxyPool()
+
+        with self.assertRaises(CommunicationError):
+
+            with pool.proxy(URI):
+                raise CommunicationError
+
+        with pool.proxy(URI):
+            pass
+
+        self.assertEqual(pool.connections, 2)
+
+
+class IdleTest(unittest.TestCase):
+    def test_idle(self):
+        pool = ProxyPool(idle_timeout=0.01)
+
+        with pool.proxy(URI):
+            pass
+
+        time.sleep(0.02)
+
+        with pool.proxy("PYRO:other@localhost:9999"):
+            pass
+
+        self.assertEqual(len(pool.idle[URI]), 0)
+
+    def test_max_idle(self):
+        pool = ProxyPool(max_idle=2)
+        proxies = [pool.acquire(URI) for _ in range(5)]  # A burst of concurrent calls
+
+        for proxy in proxies:
+            pool.release(URI, proxy)
+
+        self.assertEqual([proxy for (proxy, _) in pool.idle[URI]], proxies[3:])  # The most recently used are kept
+        self.assertEqual(pool.connections, 5)
+
+
+def run():
+    test_cases = [ReuseTest, IdleTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
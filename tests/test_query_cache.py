@@ -0,0 +1,128 @@
+import random
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from db import DB
+from enums import Operation
+from replica_classes import QueryCache
+from requests import ClientRequest
+
+
+def read(user_id, movie_id):
+    return ClientRequest(Operation.READ, {"user_id": user_id, "movie_id": movie_id})
+
+
+def average(movie_id):
+    return ClientRequest(Operation.AVERAGE, {"movie_id": movie_id})
+
+
+def ratings(user_id):
+    return ClientRequest(Operation.ALL, {"user_id": user_id})
+
+
+def update(user_id, movie_id, rating):
+    return ClientRequest(Operation.UPDATE, {"user_id": user_id, "movie_id": movie_id, "rating": rating})
+
+
+class LRUTest(unittest.TestCase):
+    def test_get(self):
+        cache = QueryCache(10)
+
+        self.assertIsNone(cache.get(read("1", "2")))
+
+        cache.put(read("1", "2"), "Rating: 4")
+
+        self.assertEqual(cache.get(read("1", "2")), "Rating: 4")
+        self.assertEqual((cache.hits, cache.misses, cache.hit_ratio), (1, 1, 0.5))
+
+    def test_updates_not_cached(self):
+        cache = QueryCache(10)
+
+        cache.put(update("1", "2", "4"), "Rating updated")
+
+        self.assertEqual(len(cache), 0)
+
+    def test_evict(self):
+        cache = QueryCache(2)
+
+        cache.put(average("1"), "1")
+        cache.put(average("2"), "2")
+        cache.get(average("1"))  # 2 is now the least recently used
+        cache.put(average("3"), "3")
+
+        self.assertEqual(cache.get(average("1")), "1")
+        self.assertIsNone(cache.get(average("2")))
+        self.assertEqual(cache.get(average("3")), "3")
+
+    def test_bytes(self):
+        cache = QueryCache(1)
+
+        cache.put(ratings("1"), ["Toy Story (1995) (1): 4.0"] * 10)
+
+        self.assertGreater(cache.bytes, 10 * len("Toy Story (1995) (1): 4.0"))
+
+        cache.put(average("1"), "4.0")  # Evicts the first
+        cache.invalidate(update("1", "1", "5"))
+
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+
+class InvalidateTest(unittest.TestCase):
+    def test_precise(self):
+        cache = QueryCache(10)
+
+        for request in [read("1", "2"), read("1", "3"), read("5", "2"), average("2"), average("3"), ratings("1"),
+                        ratings("5")]:
+            cache.put(request, "value")
+
+        cache.invalidate(update("1", "2", "4"))
+
+        for request in [read("1", "2"), average("2"), ratings("1")]:
+            self.assertIsNone(cache.get(request))
+
+        for request in [read("1", "3"), read("5", "2"), average("3"), ratings("5")]:
+            self.assertEqual(cache.get(request), "value")
+
+    def test_consistent(self):
+        random.seed(0)
+
+        db = DB()
+        cache = QueryCache(50)
+        users, movies = ["1", "5", "15"], ["1", "2", "3", "6"]
+
+        with redirect_stdout(StringIO()):
+
+            for _ in range(500):
+
+                user_id, movie_id = random.choice(users), random.choice(movies)
+
+                if random.random() < 0.2:
+
+                    request = update(user_id, movie_id, str(random.randint(1, 5)))
+
+                    cache.invalidate(request)
+                    db.execute_request(request)
+
+                    continue
+
+                request = random.choice([read(user_id, movie_id), average(movie_id), ratings(user_id)])
+                result = db.execute_request(request)
+                cached = cache.get(request)
+
+                if cached is None:
+                    cache.put(request, result)
+                else:
+                    self.assertEqual(cached, result)
+
+        self.assertGreater(cache.hits, 0)
+
+
+def run():
+    test_cases = [LRUTest, InvalidateTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
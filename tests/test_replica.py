@@ -0,0 +1,305 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import Pyro4
+import Pyro4.util
+
+from enums import PeerSelection, Operation
+from replica import Replica
+from requests import ClientRequest, FrontendRequest, FrontendBatchRequest
+from timestamp import Timestamp
+
+PEERS = ["replica-{0}".format(n) for n in range(5)]
+
+
+def replica(test: unittest.TestCase, **kwargs) -> Replica:
+    """
+    :return: A Replica whose name server lists PEERS, for the duration of `test`
+    """
+
+    patcher = mock.patch("Pyro4.locateNS")
+    ns = patcher.start().return_value
+    ns.list.return_value = {peer: "PYRO:{0}@localhost:9999".format(peer) for peer in PEERS}
+
+    test.addCleanup(patcher.stop)
+
+    return Replica(**kwargs)
+
+
+class ExposeTest(unittest.TestCase):
+    def test_exposed(self):
+        exposed = Pyro4.util.get_exposed_members(Replica)
+
+        self.assertEqual(exposed["methods"], {"query", "query_batch", "update", "update_batch", "get_status",
+                                              "get_metrics", "get_gossip", "get_compressed_gossip"})
+        self.assertEqual(exposed["attrs"], {"id", "replica_timestamp", "update_log"})
+
+
+class SelectPeersTest(unittest.TestCase):
+    def test_round_robin(self):
+        rm = replica(self, gossip_fanout=2, peer_selection=PeerSelection.ROUND_ROBIN)
+
+        rounds = [rm.select_peers(PEERS) for _ in range(3)]
+
+        self.assertEqual(rounds, [PEERS[0:2], PEERS[2:4], [PEERS[4], PEERS[0]]])
+
+    def test_random(self):
+        rm = replica(self, gossip_fanout=2, peer_selection=PeerSelection.RANDOM)
+
+        rounds = [rm.select_peers(PEERS) for _ in range(100)]
+
+        self.assertTrue(all(len(set(peers)) == 2 and set(peers) <= set(PEERS) for peers in rounds))
+        self.assertEqual(set(peer for peers in rounds for peer in peers), set(PEERS))  # Every peer is chosen
+
+    def test_fanout_above_peers(self):
+        for selection in PeerSelection:
+            rm = replica(self, gossip_fanout=10, peer_selection=selection)
+
+            self.assertEqual(sorted(rm.select_peers(PEERS[:2])), PEERS[:2])
+            self.assertEqual(rm.select_peers([]), [])
+
+
+class GossipRoundTest(unittest.TestCase):
+    def test_round(self):
+        rm = replica(self, gossip_fanout=2, peer_selection=PeerSelection.ROUND_ROBIN)
+        pulled = []
+
+        rm.pull_gossip = lambda replica_id, uri=None: pulled.append((replica_id, uri))
+
+        rm.gossip_round()
+        rm.gossip_round()
+
+        self.assertEqual(sorted(pulled), [(peer, "PYRO:{0}@localhost:9999".format(peer)) for peer in PEERS[:4]])
+        self.assertEqual(rm.get_metrics()["gossip_rounds"], 2)
+
+    def test_excludes_self(self):
+        rm = replica(self, gossip_fanout=10)
+        pulled = []
+
+        rm.ns.list.return_value = {rm.id: "PYRO:self@localhost:9999", PEERS[0]: "PYRO:peer@localhost:9999"}
+        rm.pull_gossip = lambda replica_id, uri=None: pulled.append(replica_id)
+
+        rm.gossip_round()
+
+        self.assertEqual(pulled, [PEERS[0]])
+
+    def test_one_name_server_connection(self):
+        rm = replica(self, gossip_fanout=len(PEERS))
+
+        rm.pull_gossip = lambda replica_id, uri=None: rm.ns.lookup(replica_id)  # From the gossip pool's threads
+
+        for _ in range(3):
+            rm.gossip_round()
+
+        self.assertEqual(Pyro4.locateNS.call_count, 1)
+
+
+class GossipTest(unittest.TestCase):
+    def test_returns_before_slow_peer(self):
+        rm = replica(self, gossip_timeout=5.0)
+        prev = Timestamp({"replica-fast": 1, "replica-slow": 1})
+        released = threading.Event()
+        finished = []
+
+        def pull_gossip(replica_id, uri=None):
+            if replica_id == "replica-slow":
+                released.wait()
+            else:
+                with rm.lock:
+                    rm.value_timestamp.merge(prev)  # The fast peer has also received the slow peer's update
+
+            finished.append(replica_id)
+
+        rm.pull_gossip = pull_gossip
+
+        start = time.monotonic()
+        rm.gossip(prev)
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(finished, ["replica-fast"])  # The slow peer is still pending
+
+        released.set()
+
+    def test_name_server_listed_once(self):
+        rm = replica(self, gossip_timeout=0.01)
+
+        rm.pull_gossip = lambda replica_id, uri=None: None  # replica-B can't be reached
+
+        for _ in range(3):
+            rm.gossip(Timestamp({"replica-B": 1}))
+
+        self.assertEqual(rm.ns.list.call_count, 1)  # The RMs listed when compacting are reused
+
+        rm.gossip_round()
+
+        self.assertEqual(rm.ns.list.call_count, 2)  # Background rounds list them afresh
+
+    def test_timeout(self):
+        rm = replica(self, gossip_timeout=0.1)
+        released = threading.Event()
+
+        rm.pull_gossip = lambda replica_id, uri=None: released.wait()
+
+        start = time.monotonic()
+        rm.gossip(Timestamp({"replica-slow": 1}))
+
+        self.assertLess(time.monotonic() - start, 1.0)
+
+        released.set()
+
+
+class FloorTest(unittest.TestCase):
+    def update(self, rm: Replica, sequence: int, floor: int, prev: Timestamp = None) -> None:
+        request = ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1", "rating": 4})
+
+        rm.update(FrontendRequest(prev if prev is not None else rm.value_timestamp.copy(), request,
+                                  "frontend-1:{0}".format(sequence), floor))
+
+    def test_gap_closed(self):
+        rm = replica(self)
+
+        self.update(rm, 1, 1)
+
+        for sequence in range(3, 50):  # frontend-1:2 was never acknowledged, and was given up on
+            self.update(rm, sequence, 3)
+
+        self.assertEqual(len(rm.executed_operation_table), 1)
+
+    def test_floor_ignored_until_prev_applied(self):
+        rm = replica(self, gossip_timeout=0.01)
+
+        rm.pull_gossip = lambda replica_id, uri=None: None  # replica-B can't be reached
+
+        self.update(rm, 1, 1)
+        self.update(rm, 3, 3, Timestamp({rm.id: 1, "replica-B": 1}))  # frontend-1:2 was acknowledged by replica-B
+
+        self.assertFalse("frontend-1:2" in rm.executed_operation_table)  # So it will be applied when it arrives
+
+
+class BatchTest(unittest.TestCase):
+    def test_update_batch(self):
+        rm = replica(self)
+        ratings = [ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1", "rating": rating})
+                   for rating in [2, 3, 5]]
+        ids = ["frontend-1:{0}".format(n) for n in range(1, 4)]
+
+        response = rm.update_batch(FrontendBatchRequest(Timestamp(), ratings, ids, 1))
+
+        self.assertEqual(response.values, ["Rating for Toy Story (1995) (1) updated: {0}".format(rating)
+                                           for rating in [2, 3, 5]])
+        self.assertEqual(response.label.replicas, {rm.id: 3})
+
+        records = [rm.update_log.get(id) for id in ids]
+
+        self.assertEqual([record.ts.replicas for record in records], [{rm.id: n} for n in range(1, 4)])
+        self.assertEqual([record.prev.replicas for record in records[1:]], [{rm.id: 1}, {rm.id: 2}])  # Each depends
+        # on the update before it
+
+        response = rm.update_batch(FrontendBatchRequest(response.label, ratings[:1], ids[:1]))  # Sent again
+
+        self.assertEqual(response.values, ["Update has already been performed"])
+
+    def test_query_batch(self):
+        rm = replica(self)
+        queries = [ClientRequest(Operation.READ, {"user_id": "1", "movie_id": "1"}),
+                   ClientRequest(Operation.AVERAGE, {"movie_id": "1"}),
+                   ClientRequest(Operation.READ, {"user_id": "1", "movie_id": "3"})]
+
+        rm.update(FrontendRequest(Timestamp(), ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1",
+                                                                                "rating": 1}), "frontend-1:1"))
+
+        response = rm.query_batch(FrontendBatchRequest(Timestamp({rm.id: 1}), queries))
+
+        self.assertEqual(response.values, ["Rating for Toy Story (1995) (1): 1",
+                                           rm.database.execute_request(queries[1]),
+                                           "Rating for Grumpier Old Men (1995) (3): 4.0"])
+        self.assertEqual(response.label.replicas, {rm.id: 1})
+
+    def test_query_batch_failure(self):
+        rm = replica(self)
+        queries = [ClientRequest(Operation.AVERAGE, {"movie_id": movie_id}) for movie_id in ["1", "unknown", "3"]]
+
+        response = rm.query_batch(FrontendBatchRequest(Timestamp(), queries))
+
+        self.assertEqual(response.values[0], rm.database.execute_request(queries[0]))
+        self.assertEqual(response.values[1], "Query failed (KeyError: 'unknown')")  # Only the failing query fails
+        self.assertEqual(response.values[2], rm.database.execute_request(queries[2]))
+
+
+class DuplicateTest(unittest.TestCase):
+    def test_query_after_gossip(self):
+        rms = [replica(self, gossip_timeout=1.0) for _ in range(2)]
+        update = FrontendRequest(Timestamp(), ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1",
+                                                                               "rating": 4}), "frontend-1:1")
+        prev = Timestamp()
+
+        for rm in rms:  # Sent to both, and accepted by each under its own entry
+            prev.merge(rm.update(update).label)
+
+        for (rm, other) in [rms, rms[::-1]]:
+            rm.pull_gossip = lambda replica_id, uri=None, rm=rm, other=other: rm.apply_gossip(other)
+
+        query = FrontendRequest(prev, ClientRequest(Operation.READ, {"user_id": "1", "movie_id": "1"}))
+
+        for rm in rms:
+            response = rm.query(query)
+
+            self.assertEqual(response.value, "Rating for Toy Story (1995) (1): 4")
+            self.assertTrue(prev <= response.label)  # So the FE can use it
+            self.assertEqual(len(rm.update_log), 1)  # Only one copy is kept
+
+    def test_recovered(self):
+        directory = tempfile.mkdtemp()
+
+        self.addCleanup(shutil.rmtree, directory)
+
+        rm, other = replica(self, directory=directory), replica(self)
+        update = FrontendRequest(Timestamp(), ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": "1",
+                                                                               "rating": 4}), "frontend-1:1")
+
+        rm.update(update)
+        other.update(update)
+
+        with rm.lock:
+            rm.merge_gossip(other.get_gossip(rm.id, rm.replica_timestamp.copy()))
+
+        rm.sync()
+
+        self.assertEqual(replica(self, directory=directory).value_timestamp.replicas, rm.value_timestamp.replicas)
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replica_timestamp(self):
+        rm = replica(self, directory=self.directory, gossip_timeout=0.01)
+
+        rm.pull_gossip = lambda replica_id, uri=None: None  # replica-B can't be reached
+
+        rm.update(FrontendRequest(Timestamp({"replica-B": 5}), ClientRequest(Operation.UPDATE, {
+            "user_id": "1", "movie_id": "1", "rating": 4}), "frontend-1:1"))  # Depends on updates it hasn't seen
+
+        restarted = replica(self, directory=self.directory)
+
+        self.assertEqual(restarted.id, rm.id)
+        self.assertEqual(restarted.replica_timestamp.replicas, {rm.id: 1})  # Still hasn't seen replica-B's updates
+        self.assertIn("frontend-1:1", restarted.update_log)
+
+
+def run():
+    test_cases = [ExposeTest, SelectPeersTest, GossipRoundTest, GossipTest, FloorTest, BatchTest, DuplicateTest,
+                  RecoveryTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from enums import Operation
+from replica_classes import Record, Log, ExecutedOperationTable
+from requests import ClientRequest
+from storage import Storage, encode
+from timestamp import Timestamp
+
+
+def record(n: int) -> Record:
+    return Record("A", Timestamp({"A": n}), ClientRequest(Operation.CREATE, {"movie_id": str(n)}), Timestamp(),
+                  "frontend:" + str(n))
+
+
+class StorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_id(self):
+        storage = Storage(self.directory)
+
+        self.assertIsNone(storage.id)
+
+        storage.id = "replica-A"
+        storage.close()
+
+        self.assertEqual(Storage(self.directory).id, "replica-A")
+
+    def test_journal(self):
+        storage = Storage(self.directory)
+
+        storage.append("record", record(1))
+        storage.append("ts", Timestamp({"A": 1, "B": 2}))
+        storage.append("apply", ["frontend:1"])
+        storage.sync()
+
+        self.assertEqual(storage.durable, 3)
+
+        path, state, entries = Storage(self.directory).load()
+
+        self.assertIsNone(path)
+        self.assertIsNone(state)
+        self.assertEqual([entry["kind"] for entry in entries], ["record", "ts", "apply"])
+        self.assertEqual(entries[0]["value"].id, "frontend:1")
+        self.assertEqual(entries[0]["value"].ts.replicas, {"A": 1})
+        self.assertEqual(entries[1]["value"].replicas, {"A": 1, "B": 2})
+        self.assertEqual(entries[2]["value"], ["frontend:1"])
+
+    def test_batched_sync(self):
+        storage = Storage(self.directory, sync_interval=0.05)
+
+        for n in range(100):
+            storage.append("record", record(n))
+
+        storage.sync()
+
+        self.assertEqual(storage.durable, 100)
+        self.assertLess(storage.syncs, 100)
+
+    def test_torn_entry(self):
+        storage = Storage(self.directory)
+
+        storage.append("record", record(1))
+        storage.append("record", record(2))
+        storage.close()
+
+        path = os.path.join(self.directory, "journal-{0}".format(storage.segment))
+
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 3)  # The RM stopped part way through writing the second entry
+
+        _, _, entries = Storage(self.directory).load()
+
+        self.assertEqual([entry["value"].id for entry in entries], ["frontend:1"])
+
+    def test_checkpoint(self):
+        storage = Storage(self.directory)
+
+        storage.append("record", record(1))
+
+        log = Log([record(1)])
+        table = ExecutedOperationTable()
+        table.add("frontend:1")
+
+        snapshot = sqlite3.connect(":memory:")
+        snapshot.execute("CREATE TABLE ratings (rating TEXT)")
+        snapshot.execute("INSERT INTO ratings VALUES ('5')")
+        snapshot.commit()
+
+        number = storage.rotate()
+        storage.append("record", record(2))  # Written after the checkpoint's snapshot
+        storage.write_checkpoint(number, snapshot, encode({"value_ts": Timestamp({"A": 1}), "update_log": log,
+                                                           "executed_operation_table": table}))
+        storage.close()
+
+        self.assertNotIn("journal-{0}".format(number - 1), os.listdir(self.directory))
+
+        path, state, entries = Storage(self.directory).load()
+
+        self.assertEqual(sqlite3.connect(path).execute("SELECT rating FROM ratings").fetchall(), [("5",)])
+        self.assertEqual(state["value_ts"].replicas, {"A": 1})
+        self.assertIn("frontend:1", state["update_log"])
+        self.assertIn("frontend:1", state["executed_operation_table"])
+        self.assertNotIn("frontend:2", state["executed_operation_table"])
+        self.assertEqual([entry["value"].id for entry in entries], ["frontend:2"])  # Only the journal since
+
+
+def run():
+    test_cases = [StorageTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
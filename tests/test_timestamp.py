@@ -66,6 +66,48 @@ class LessThanEqualsTest(unittest.TestCase):
 
         self.assertTrue(t1 <= t2)
 
+    def test_9(self):
+        t1 = Timestamp({"id": 1})
+        t2 = Timestamp()
+
+        self.assertFalse(t1 <= t2)
+
+    def test_no_side_effects(self):
+        t1 = Timestamp()
+        t2 = Timestamp({"id": 2})
+
+        t1 <= t2
+
+        self.assertEqual(t1.replicas, {})
+
+
+class LessThanTest(unittest.TestCase):
+    def test_1(self):
+        t1 = Timestamp({"id": 0})
+        t2 = Timestamp({"id": 1})
+
+        self.assertTrue(t1 < t2)
+
+    def test_2(self):
+        t1 = Timestamp({"id": 1})
+        t2 = Timestamp({"id": 1})
+
+        self.assertFalse(t1 < t2)
+
+    def test_3(self):
+        t1 = Timestamp({"id": 1})
+        t2 = Timestamp({"other": 1})
+
+        self.assertFalse(t1 < t2)
+        self.assertFalse(t2 < t1)
+
+
+class TotalTest(unittest.TestCase):
+    def test_1(self):
+        timestamp = Timestamp({"id": 1, "other": 2})
+
+        self.assertEqual(timestamp.total(), 3)
+
 
 class MergeTest(unittest.TestCase):
     def test_1(self):
@@ -92,6 +134,14 @@ class MergeTest(unittest.TestCase):
 
         self.assertNotEqual(t2.replicas["id"], 0)
 
+    def test_4(self):
+        t1 = Timestamp({"id": 2})
+        t2 = Timestamp({"other": 1})
+
+        t1.merge(t2)
+
+        self.assertEqual(t1.replicas, {"id": 2, "other": 1})
+
 
 class CompareTest(unittest.TestCase):
     def test_1(self):
@@ -102,9 +152,43 @@ class CompareTest(unittest.TestCase):
 
         self.assertEqual(l[0], "id")
 
+    def test_2(self):
+        t1 = Timestamp()
+        t2 = Timestamp({"id": 1, "other": 0})
+
+        l = list(t1.compare(t2))
+
+        self.assertEqual(l, ["id"])
+        self.assertEqual(t1.replicas, {})
+
+
+class ItemTest(unittest.TestCase):
+    def test_get_missing(self):
+        timestamp = Timestamp()
+
+        self.assertEqual(timestamp["missing"], 0)
+
+    def test_set(self):
+        timestamp = Timestamp({"id": 1})
+
+        timestamp["id"] += 1
+
+        self.assertEqual(timestamp["id"], 2)
+
+
+class CopyTest(unittest.TestCase):
+    def test_copy(self):
+        t1 = Timestamp({"id": 1})
+        t2 = t1.copy()
+
+        t2["id"] = 2
+
+        self.assertEqual(t1["id"], 1)
+        self.assertEqual(t2.replicas, {"id": 2})
+
 
 def run():
-    test_cases = [InitTest, LessThanEqualsTest, MergeTest, CompareTest]
+    test_cases = [InitTest, LessThanEqualsTest, LessThanTest, TotalTest, MergeTest, CompareTest, ItemTest, CopyTest]
     all_tests = unittest.TestSuite()
 
     for case in test_cases:
@@ -0,0 +1,162 @@
+import unittest
+
+import serpent
+from Pyro4.util import get_serializer
+
+import wire
+from enums import Operation
+from replica_classes import Record, Log, Gossip
+from requests import ClientRequest, FrontendBatchRequest, ReplicaBatchResponse
+from timestamp import Timestamp
+
+serializer = get_serializer("serpent")
+
+
+def record(n: int) -> Record:
+    return Record("replica-A", Timestamp({"replica-A": n, "replica-B": 2}),
+                  ClientRequest(Operation.UPDATE, {"user_id": "1", "movie_id": str(n), "rating": "4"}),
+                  Timestamp({"replica-B": 2}), "frontend-1:" + str(n))
+
+
+class PrimitiveTest(unittest.TestCase):
+    def test_uint(self):
+        writer = wire.Writer()
+
+        for n in [0, 1, 127, 128, 300, 2 ** 40]:
+            writer.uint(n)
+
+        reader = wire.Reader(bytes(writer.buffer))
+
+        self.assertEqual([reader.uint() for _ in range(6)], [0, 1, 127, 128, 300, 2 ** 40])
+        self.assertEqual(len(writer.buffer), 1 + 1 + 1 + 1 + 2 + 2 + 6)
+
+    def test_int(self):
+        writer = wire.Writer()
+
+        for n in [0, -1, 1, -64, 64, -(2 ** 40)]:
+            writer.int(n)
+
+        reader = wire.Reader(bytes(writer.buffer))
+
+        self.assertEqual([reader.int() for _ in range(6)], [0, -1, 1, -64, 64, -(2 ** 40)])
+
+    def test_interned_strings(self):
+        writer = wire.Writer()
+
+        writer.string("replica-A")
+        length = len(writer.buffer)
+        writer.string("replica-A")
+
+        self.assertEqual(len(writer.buffer) - length, 1)  # Written as its index
+
+        reader = wire.Reader(bytes(writer.buffer))
+
+        self.assertEqual([reader.string(), reader.string()], ["replica-A", "replica-A"])
+
+    def test_identifier(self):
+        ids = ["frontend-1:0", "frontend-1:10", "frontend-1:010", "2b1e4c9a-uuid", "a:b:7", ":3", "frontend-1:"]
+        writer = wire.Writer()
+
+        for id in ids:
+            writer.identifier(id)
+
+        reader = wire.Reader(bytes(writer.buffer))
+
+        self.assertEqual([reader.identifier() for _ in ids], ids)
+
+    def test_value(self):
+        value = {"user_id": "1", "rating": 4.5, "count": -3, "ok": True, "none": None, "list": ["a", ["b", False]]}
+        writer = wire.Writer()
+
+        writer.value(value)
+
+        self.assertEqual(wire.Reader(bytes(writer.buffer)).value(), value)
+
+    def test_unknown_value(self):
+        with self.assertRaises(TypeError):
+            wire.Writer().value(object())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            wire.Reader(bytes([wire.FORMAT_VERSION + 1]))
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_timestamp(self):
+        ts = serializer.loads(serializer.dumps(Timestamp({"replica-A": 3, "replica-B": 300})))
+
+        self.assertEqual(ts.replicas, {"replica-A": 3, "replica-B": 300})
+
+    def test_log(self):
+        log = serializer.loads(serializer.dumps(Log([record(n) for n in range(200)])))
+
+        self.assertEqual([r.id for r in log], ["frontend-1:" + str(n) for n in range(200)])
+        self.assertEqual(log.get("frontend-1:7").ts.replicas, {"replica-A": 7, "replica-B": 2})
+        self.assertEqual(log.get("frontend-1:7").prev.replicas, {"replica-B": 2})
+        self.assertEqual(log.get("frontend-1:7").request.method, Operation.UPDATE)
+        self.assertEqual(log.get("frontend-1:7").request.params, record(7).request.params)
+
+    def test_gossip(self):
+        gossip = serializer.loads(serializer.dumps(Gossip("replica-A", Log([record(1)]), Timestamp({"replica-A": 1}))))
+
+        self.assertEqual(gossip.i, "replica-A")
+        self.assertIn("frontend-1:1", gossip.log)
+        self.assertEqual(gossip.ts.replicas, {"replica-A": 1})
+
+    def test_batch(self):
+        batch = FrontendBatchRequest(Timestamp({"replica-A": 1}), [record(1).request, record(2).request])
+        received = serializer.loads(serializer.dumps(batch))
+
+        self.assertEqual(received.ids, batch.ids)
+        self.assertEqual([r.params for r in received.requests], [r.params for r in batch.requests])
+
+        response = serializer.loads(serializer.dumps(ReplicaBatchResponse(["Rating: 4", ["a", "b"], None],
+                                                                          Timestamp({"replica-A": 2}))))
+
+        self.assertEqual(response.values, ["Rating: 4", ["a", "b"], None])
+        self.assertEqual(response.label.replicas, {"replica-A": 2})
+
+    def test_floor(self):
+        floored = Record("replica-A", Timestamp({"replica-A": 1}), record(1).request, Timestamp(), "frontend-1:9", 7)
+        batch = FrontendBatchRequest(Timestamp(), [record(1).request], ["frontend-1:9"], 7)
+
+        self.assertEqual(serializer.loads(serializer.dumps(Log([floored]))).get("frontend-1:9").floor, 7)
+        self.assertIsNone(serializer.loads(serializer.dumps(Log([record(1)]))).get("frontend-1:1").floor)
+        self.assertEqual(serializer.loads(serializer.dumps(batch)).floor, 7)
+        self.assertEqual(Record.from_dict("Record", floored.to_dict()).floor, 7)
+
+    def test_first_version_received(self):
+        data = wire.pack(record(1))
+        first = bytes([1]) + data[1:-1]  # As packed before the floor was added, e.g. in a journal
+
+        received = wire.unpack(Record.read, first)
+
+        self.assertEqual(received.id, "frontend-1:1")
+        self.assertIsNone(received.floor)
+
+    def test_readable_form_received(self):
+        data = serpent.dumps(Log([record(n) for n in range(3)]).to_dict(), module_in_classname=True)  # As sent before
+        log = serializer.loads(data)
+
+        self.assertEqual([r.id for r in log], ["frontend-1:0", "frontend-1:1", "frontend-1:2"])
+        self.assertEqual(log.get("frontend-1:2").ts.replicas, {"replica-A": 2, "replica-B": 2})
+
+
+class SizeTest(unittest.TestCase):
+    def test_smaller(self):
+        log = Log([record(n) for n in range(1000)])
+
+        packed = serializer.dumps(log)
+        readable = serpent.dumps(log.to_dict(), module_in_classname=True)
+
+        self.assertLess(len(packed), len(readable) / 3)
+
+
+def run():
+    test_cases = [PrimitiveTest, RoundTripTest, SizeTest]
+    all_tests = unittest.TestSuite()
+
+    for case in test_cases:
+        all_tests.addTest(unittest.TestLoader().loadTestsFromTestCase(case))
+
+    unittest.TextTestRunner(verbosity=2).run(all_tests)
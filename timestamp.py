@@ -1,77 +1,144 @@
-from typing import Dict, Iterator
+import threading
+from itertools import repeat
+from operator import le
+from typing import Dict, Iterator, List
 
-from Pyro4.util import SerializerBase
+import wire
 
 
 class Timestamp:
+    """
+    A vector timestamp, containing the number of updates accepted by each RM. Replica IDs are interned to integer slots
+    shared by every Timestamp, so each Timestamp holds only a list of counts indexed by slot, along with a bitmask of
+    the slots it has entries for. A missing entry is treated as 0.
+    """
+
+    __slots__ = ("_values", "_present")
+
+    _slots: Dict[str, int] = {}  # The slot of every replica ID seen so far
+    _ids: List[str] = []  # The replica ID held in each slot
+    _lock = threading.Lock()  # Guards the interning of new replica IDs
+
     def __init__(self, replicas: Dict[str, int] = None):
 
-        self.replicas: Dict[str, int] = replicas if replicas is not None else dict()
+        self._values: List[int] = []  # The entry for each slot
+        self._present = 0  # Bit k is set if this Timestamp has an entry for slot k
 
-    def __str__(self):
+        if replicas is not None:
 
-        return str(self.replicas)
+            for (id, value) in replicas.items():
 
-    def __le__(self, other: 'Timestamp') -> bool:
+                self[id] = value
+
+    @classmethod
+    def slot(cls, id: str) -> int:
         """
-        Overrides the "<=" operator. If any entry in `other` is greater, returns True.
-        :param other: The Timestamp to compare with
-        :return: A boolean
+        Gets the slot of a replica ID, interning it if it hasn't been seen before.
+        :param id: A replica ID
+        :return: The index of that replica's entry in every Timestamp
         """
 
-        for (id, value) in other.replicas.items():
+        slot = cls._slots.get(id)
 
-            if id not in self.replicas:
+        if slot is None:
 
-                self.replicas[id] = 0
+            with cls._lock:
 
-            elif value < self.replicas[id]:
+                slot = cls._slots.get(id)
 
-                return False
+                if slot is None:
 
-        for (id, value) in self.replicas.items():
+                    slot = len(cls._ids)
 
-            if id not in other.replicas and value > 0:
-                return False
+                    cls._ids.append(id)
+                    cls._slots[id] = slot
 
-        return True
+        return slot
 
-    def __lt__(self, other: 'Timestamp') -> bool:
+    @property
+    def replicas(self) -> Dict[str, int]:
         """
-        Overrides the "<" operator. Used to sort Timestamps when getting stable updates.
-        :param other: The Timestamp to compare with
-        :return: A boolean
+        :return: A dict of the entries in this Timestamp, keyed by replica ID. Changing it doesn't change the Timestamp.
         """
 
-        return self <= other
+        ids = self._ids
+        present = self._present
 
-    def compare(self, other: 'Timestamp') -> Iterator[str]:
+        return {ids[slot]: value for (slot, value) in enumerate(self._values) if present >> slot & 1}
+
+    def __getitem__(self, id: str) -> int:
+
+        slot = self._slots.get(id)
+
+        if slot is None or slot >= len(self._values):
+            return 0
+
+        return self._values[slot]
+
+    def __setitem__(self, id: str, value: int) -> None:
+
+        slot = self.slot(id)
+        values = self._values
+
+        if slot >= len(values):
+            values.extend(repeat(0, slot + 1 - len(values)))
+
+        values[slot] = value
+
+        self._present |= 1 << slot
+
+    def __str__(self):
+
+        return str(self.replicas)
+
+    def __le__(self, other: 'Timestamp') -> bool:
         """
-        Get an Iterator of all replica IDs for which `other` has greater entries. Used to selectively gossip with other
-        RMs.
+        Overrides the "<=" operator. Returns True if no entry in this Timestamp is greater than the entry in `other`.
         :param other: The Timestamp to compare with
-        :return: An Iterator of the replica IDs for which `other` had greater entries
+        :return: A boolean
         """
 
-        def filter_replica(replica):
+        values = self._values
+        other_values = other._values
 
-            id = replica[0]
-            value = replica[1]
+        if len(values) > len(other_values) and any(values[len(other_values):]):
+            return False  # We have a non-zero entry that `other` doesn't
 
-            if id not in self.replicas:
+        return all(map(le, values, other_values))
 
-                self.replicas[id] = 0
+    def __lt__(self, other: 'Timestamp') -> bool:
+        """
+        Overrides the "<" operator. Returns True if this Timestamp <= `other` and they differ. This is a partial order,
+        so it can't be used to sort Timestamps: use total() instead.
+        :param other: The Timestamp to compare with
+        :return: A boolean
+        """
+
+        return self <= other and not other <= self
 
-                if value > 0:
-                    return True
+    def total(self) -> int:
+        """
+        Gets the sum of every entry in this Timestamp. If a < b, then a.total() < b.total(), so sorting by total orders
+        Timestamps consistently with "<". Used to order stable updates.
+        :return: The sum of every entry
+        """
 
-            elif value > self.replicas[id]:
+        return sum(self._values)
 
-                return True
+    def compare(self, other: 'Timestamp') -> Iterator[str]:
+        """
+        Get an Iterator of all replica IDs for which `other` has greater entries. Used to selectively gossip with other
+        RMs.
+        :param other: The Timestamp to compare with
+        :return: An Iterator of the replica IDs for which `other` had greater entries
+        """
 
-            return False
+        ids = self._ids
+        values = self._values
+        length = len(values)
 
-        return map(lambda entry: entry[0], filter(filter_replica, other.replicas.items()))
+        return iter([ids[slot] for (slot, value) in enumerate(other._values)
+                     if value > (values[slot] if slot < length else 0)])
 
     def copy(self) -> 'Timestamp':
         """
@@ -79,7 +146,11 @@ class Timestamp:
         :return: A copy of this Timestamp
         """
 
-        return Timestamp(self.replicas.copy())
+        ts = Timestamp.__new__(Timestamp)
+        ts._values = self._values[:]
+        ts._present = self._present
+
+        return ts
 
     def merge(self, ts: 'Timestamp') -> None:
         """
@@ -90,19 +161,58 @@ class Timestamp:
         :return:
         """
 
-        for (id, value) in ts.replicas.items():
+        values = self._values
+        other_values = ts._values
+
+        if len(values) < len(other_values):
+            values.extend(repeat(0, len(other_values) - len(values)))
+
+        for (slot, value) in enumerate(other_values):
+
+            if value > values[slot]:
+                values[slot] = value
+
+        self._present |= ts._present
+
+    def write(self, writer: wire.Writer) -> None:
+        """
+        Used for packed serialisation. Writes the number of entries, then the replica ID and value of each.
+        :param writer: The Writer to write to
+        :return: None
+        """
+
+        ids = self._ids
+        values = self._values
+        present = self._present
+        slots = [slot for slot in range(len(values)) if present >> slot & 1]
+
+        writer.uint(len(slots))
+
+        for slot in slots:
+
+            writer.string(ids[slot])
+            writer.uint(values[slot])
+
+    @staticmethod
+    def read(reader: wire.Reader) -> 'Timestamp':
+        """
+        Used for packed deserialisation
+        :param reader: The Reader to read from
+        :return: A Timestamp
+        """
 
-            if id not in self.replicas:
+        ts = Timestamp()
 
-                self.replicas[id] = value
+        for _ in range(reader.uint()):
 
-            elif value > self.replicas[id]:
+            id = reader.string()
+            ts[id] = reader.uint()
 
-                self.replicas[id] = ts.replicas[id]
+        return ts
 
     def to_dict(self) -> Dict:
         """
-        Used for serpent serialisation
+        The readable form of this Timestamp, as it was sent before Timestamps were packed
         :return: A dict representing this Timestamp
         """
 
@@ -114,12 +224,11 @@ class Timestamp:
     @staticmethod
     def from_dict(classname: str, dict: Dict) -> 'Timestamp':
         """
-        Used for serpent deserialisation
-        :return: A Log
+        Used to receive Timestamps sent in their readable form
+        :return: A Timestamp
         """
 
         return Timestamp(dict["replicas"])
 
 
-SerializerBase.register_class_to_dict(Timestamp, Timestamp.to_dict)
-SerializerBase.register_dict_to_class('Timestamp', Timestamp.from_dict)
+wire.register(Timestamp)
@@ -0,0 +1,299 @@
+import struct
+from typing import Any, Dict, List, Callable
+
+import serpent
+from Pyro4.util import SerializerBase
+
+FORMAT_VERSION = 2  # The first byte of every packed object. Version 2 added the floor of Records and update requests.
+READABLE_VERSIONS = [1, 2]  # Objects packed in version 1, e.g. in a journal, can still be read
+
+# Tags for values of arbitrary type, such as request params and the values of responses
+NONE, FALSE, TRUE, INT, FLOAT, STRING, LIST, DICT = range(8)
+
+double = struct.Struct(">d")
+
+
+class Writer:
+    """
+    Packs objects into a compact binary layout. Integers are written as varints, and each string is written in full
+    only the first time it appears in a message; after that, it is written as its index among the strings already
+    written. Replica and FE IDs, which appear in every Timestamp and Record, therefore cost a byte or two each after
+    their first appearance. Objects write their own fields, in a fixed order, with no field names or class tags.
+    """
+
+    def __init__(self):
+
+        self.buffer = bytearray([FORMAT_VERSION])
+        self._strings: Dict[str, int] = {}  # The index of each string written so far
+
+    def uint(self, n: int) -> None:
+
+        if n < 0x80:  # The usual case
+
+            self.buffer.append(n)
+
+            return
+
+        while n >= 0x80:
+
+            self.buffer.append((n & 0x7F) | 0x80)
+
+            n >>= 7
+
+        self.buffer.append(n)
+
+    def int(self, n: int) -> None:
+
+        self.uint(n << 1 if n >= 0 else (-n << 1) - 1)  # Zigzag encoding keeps small negative numbers small
+
+    def string(self, s: str) -> None:
+
+        index = self._strings.get(s)
+
+        if index is not None:
+
+            self.uint(index + 1)
+
+            return
+
+        data = s.encode("utf-8")
+
+        self.uint(0)
+        self.uint(len(data))
+        self.buffer += data
+
+        self._strings[s] = len(self._strings)
+
+    def identifier(self, id: str) -> None:
+        """
+        Writes an update ID. IDs of the form "<FE ID>:<sequence number>" share their FE ID with the FE's other updates.
+        :param id: The unique ID of an update
+        :return: None
+        """
+
+        origin, _, sequence = id.rpartition(":")
+
+        if origin != "" and sequence.isdigit() and str(int(sequence)) == sequence:
+
+            self.string(origin)
+            self.uint(int(sequence) + 1)
+
+        else:
+
+            self.string(id)
+            self.uint(0)
+
+    def value(self, value: Any) -> None:
+        """
+        Writes a value of arbitrary type: None, a bool, int, float or str, or a list, tuple or dict of these.
+        :param value: The value
+        :return: None
+        """
+
+        if value is None:
+
+            self.buffer.append(NONE)
+
+        elif value is True or value is False:
+
+            self.buffer.append(TRUE if value else FALSE)
+
+        elif isinstance(value, int):
+
+            self.buffer.append(INT)
+            self.int(value)
+
+        elif isinstance(value, float):
+
+            self.buffer.append(FLOAT)
+            self.buffer += double.pack(value)
+
+        elif isinstance(value, str):
+
+            self.buffer.append(STRING)
+            self.string(value)
+
+        elif isinstance(value, (list, tuple)):
+
+            self.buffer.append(LIST)
+            self.uint(len(value))
+
+            for item in value:
+                self.value(item)
+
+        elif isinstance(value, dict):
+
+            self.buffer.append(DICT)
+            self.uint(len(value))
+
+            for (key, item) in value.items():
+
+                self.value(key)
+                self.value(item)
+
+        else:
+
+            raise TypeError("Can't pack a value of type {0}".format(type(value).__name__))
+
+
+class Reader:
+    """
+    Unpacks objects packed by a Writer.
+    """
+
+    def __init__(self, data: bytes):
+
+        if len(data) == 0 or data[0] not in READABLE_VERSIONS:
+            raise ValueError("Unknown packed format {0}".format(data[0] if len(data) > 0 else None))
+
+        self.data = data
+        self.version = data[0]  # Objects read the fields added in later versions only if they were written
+        self.position = 1
+        self._strings: List[str] = []  # The strings read so far, by index
+
+    def uint(self) -> int:
+
+        data = self.data
+        byte = data[self.position]
+
+        self.position += 1
+
+        if byte < 0x80:  # The usual case
+            return byte
+
+        n = byte & 0x7F
+        shift = 7
+
+        while True:
+
+            byte = data[self.position]
+
+            self.position += 1
+
+            n |= (byte & 0x7F) << shift
+
+            if byte < 0x80:
+                return n
+
+            shift += 7
+
+    def int(self) -> int:
+
+        n = self.uint()
+
+        return n >> 1 if n & 1 == 0 else -((n + 1) >> 1)
+
+    def string(self) -> str:
+
+        index = self.uint()
+
+        if index > 0:
+            return self._strings[index - 1]
+
+        length = self.uint()
+        s = self.data[self.position:self.position + length].decode("utf-8")
+
+        self.position += length
+        self._strings.append(s)
+
+        return s
+
+    def identifier(self) -> str:
+
+        origin = self.string()
+        sequence = self.uint()
+
+        return origin if sequence == 0 else origin + ":" + str(sequence - 1)
+
+    def value(self) -> Any:
+
+        tag = self.data[self.position]
+
+        self.position += 1
+
+        if tag == NONE:
+            return None
+
+        if tag == FALSE:
+            return False
+
+        if tag == TRUE:
+            return True
+
+        if tag == INT:
+            return self.int()
+
+        if tag == FLOAT:
+
+            value, = double.unpack_from(self.data, self.position)
+
+            self.position += double.size
+
+            return value
+
+        if tag == STRING:
+            return self.string()
+
+        if tag == LIST:
+            return [self.value() for _ in range(self.uint())]
+
+        if tag == DICT:
+
+            result = {}
+
+            for _ in range(self.uint()):
+
+                key = self.value()
+                result[key] = self.value()
+
+            return result
+
+        raise ValueError("Unknown value tag {0}".format(tag))
+
+
+def pack(obj: Any) -> bytes:
+    """
+    :param obj: An object with a write(writer) method
+    :return: The object, packed
+    """
+
+    writer = Writer()
+
+    obj.write(writer)
+
+    return bytes(writer.buffer)
+
+
+def unpack(read: Callable[[Reader], Any], data: bytes) -> Any:
+    """
+    :param read: The read(reader) method of the packed object's class
+    :param data: The packed object
+    :return: The object
+    """
+
+    return read(Reader(data))
+
+
+def register(cls: type) -> None:
+    """
+    Registers a class with Pyro's serializers, so that it is sent packed. The class must have write(writer) and static
+    read(reader) methods. Objects sent as dicts by to_dict, as they were before they were packed, can still be received.
+    :param cls: The class
+    :return: None
+    """
+
+    name = cls.__name__
+
+    def to_dict(obj: Any) -> Dict:
+
+        return {"__class__": name, "packed": pack(obj)}
+
+    def from_dict(classname: str, dict: Dict) -> Any:
+
+        if "packed" not in dict:
+            return cls.from_dict(classname, dict)
+
+        return unpack(cls.read, serpent.tobytes(dict["packed"]))  # Serpent sends bytes as base64
+
+    SerializerBase.register_class_to_dict(cls, to_dict)
+    SerializerBase.register_dict_to_class(name, from_dict)